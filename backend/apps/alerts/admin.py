@@ -1,22 +1,25 @@
 from django.contrib import admin
+from apps.dashboard.cache import invalidate_summary
 from .models import Alert
 
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
-    list_display = ('alert_type', 'severity', 'src_ip', 'dst_ip', 'status', 'timestamp', 'created_at')
+    list_display = ('alert_type', 'severity', 'src_ip', 'dst_ip', 'status', 'occurrences', 'timestamp', 'created_at')
     list_filter = ('alert_type', 'severity', 'status', 'timestamp')
     search_fields = ('message', 'src_ip', 'dst_ip')
-    readonly_fields = ('created_at', 'resolved_at')
+    readonly_fields = ('created_at', 'resolved_at', 'occurrences', 'first_seen', 'last_seen')
     date_hierarchy = 'timestamp'
     actions = ['mark_as_resolved', 'mark_as_ignored']
     
     def mark_as_resolved(self, request, queryset):
         queryset.update(status='resolved')
+        invalidate_summary()
     mark_as_resolved.short_description = 'Mark selected alerts as resolved'
     
     def mark_as_ignored(self, request, queryset):
         queryset.update(status='ignored')
+        invalidate_summary()
     mark_as_ignored.short_description = 'Mark selected alerts as ignored'
 
 
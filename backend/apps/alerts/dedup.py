@@ -0,0 +1,332 @@
+"""
+Alert deduplication.
+
+Alerts with the same ``(alert_type, src_ip, dst_ip)`` whose timestamps are
+less than ``ALERT_DEDUP_WINDOW_SECONDS`` from the first one's are folded
+into it: instead of a new row, the first alert's ``occurrences`` goes up
+and ``first_seen``/``last_seen`` widen. ``AlertViewSet.create`` and the
+streaming detectors both save alerts through ``record_alerts``.
+
+Folding is done in memory, against the alerts this process saved or
+looked up; on a miss, open alerts of the window are fetched from the
+database, so workers also fold into each other's alerts. Repeats are not
+written one by one: the increments are summed per alert and written in a
+single UPDATE every ``ALERT_DEDUP_FLUSH_SECONDS``, as soon as
+``ALERT_DEDUP_FLUSH_COUNT`` are pending, and when the process exits. A
+window of 0 turns folding off.
+
+Resolving an alert makes the resolving worker forget it at once; the others
+notice at their next flush, which checks the status of every alert it
+writes to. Repeats they folded in after the alert was resolved are saved as
+a new alert rather than added to the resolved one.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest, Least
+
+from apps.dashboard.cache import invalidate_summary
+
+from .models import Alert
+from .signals import alerts_created
+
+logger = logging.getLogger(__name__)
+
+# Alerts per UPDATE statement when flushing
+FLUSH_CHUNK_SIZE = 500
+
+
+def _key(alert):
+    return alert.alert_type, alert.src_ip, alert.dst_ip or None
+
+
+def _per_alert(chunk, value, output_field=None):
+    """``CASE id WHEN ... THEN value(entry)`` over ``[alert, count, first, last]`` entries."""
+    return Case(
+        *[When(pk=entry[0].pk, then=Value(value(entry))) for entry in chunk],
+        output_field=output_field,
+    )
+
+
+def _merge(table, key, alert, count, first, last):
+    entry = table.get(key)
+    if entry is None:
+        table[key] = [alert, count, first, last]
+    else:
+        entry[1] += count
+        entry[2] = min(entry[2], first)
+        entry[3] = max(entry[3], last)
+
+
+def _reopen(alert, count, first, last):
+    """A new alert for repeats of ``alert`` seen after it was resolved."""
+    return Alert(
+        alert_type=alert.alert_type, severity=alert.severity, src_ip=alert.src_ip, dst_ip=alert.dst_ip,
+        message=alert.message, metadata=alert.metadata, timestamp=first,
+        occurrences=count, first_seen=first, last_seen=last,
+    )
+
+
+class AlertDeduplicator:
+    """
+    Per-process fold table: ``key -> alert`` for the alerts whose window is
+    still open (at most ``max_keys``, oldest dropped first), and the pending
+    counter increments per alert.
+
+    The lock only guards this in-memory state; lookups, inserts and flushes
+    run outside it, so concurrent callers are not serialized behind the
+    database.
+    """
+
+    def __init__(self, window_seconds, flush_seconds, flush_count, max_keys):
+        self.window = timedelta(seconds=window_seconds)
+        self.flush_seconds = flush_seconds
+        self.flush_count = flush_count
+        self.max_keys = max_keys
+        # key -> alert, oldest first
+        self.alerts = {}
+        # pk -> [alert, repeats not written yet, their first and last timestamps]
+        self._pending = {}
+        self._pending_count = 0
+        # id(alert) -> same, for repeats of alerts another call is still inserting
+        self._unsaved = {}
+        self._latest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def record(self, alerts):
+        """
+        Save unsaved ``alerts``, folding repeats into earlier alerts.
+
+        Returns one alert per input: the input itself when it was saved as a
+        new alert, otherwise the earlier alert it was folded into (with
+        ``occurrences`` and ``first_seen``/``last_seen`` updated in memory).
+        An input's own ``occurrences`` (1 unless set) is what it adds.
+        """
+        if not alerts:
+            return []
+        for alert in alerts:
+            alert.first_seen = alert.first_seen or alert.timestamp
+            alert.last_seen = alert.last_seen or alert.timestamp
+        if self.window:
+            with self._lock:
+                missing = [alert for alert in alerts if self._find(alert) is None]
+            candidates = self._load(missing) if missing else []
+            with self._lock:
+                for alert in candidates:
+                    self.alerts.setdefault(_key(alert), alert)
+                targets, created = self._fold(alerts)
+                pending = self._pending_count
+        else:
+            targets = created = alerts
+            pending = 0
+        if created:
+            self._insert(created)
+            pending = self._pending_count
+        if pending >= self.flush_count:
+            self.flush()
+        elif pending:
+            self._schedule_flush()
+        return targets
+
+    def _find(self, alert):
+        target = self.alerts.get(_key(alert))
+        if target is not None and abs(alert.timestamp - target.first_seen) < self.window:
+            return target
+        return None
+
+    def _fold(self, alerts):
+        """Fold ``alerts`` into the table; returns the targets and the alerts to insert."""
+        targets, created, own = [], [], set()
+        for alert in alerts:
+            target = self._find(alert)
+            if target is None:
+                # Inserted by record(); later repeats in this batch fold into it
+                key = _key(alert)
+                self.alerts.pop(key, None)
+                self.alerts[key] = alert
+                own.add(id(alert))
+                created.append(alert)
+                targets.append(alert)
+                continue
+            if target.pk is None and id(target) not in own:
+                # Its insert is in flight elsewhere; applied once it has a key
+                _merge(self._unsaved, id(target), target, alert.occurrences, alert.first_seen, alert.last_seen)
+            else:
+                target.occurrences += alert.occurrences
+                target.first_seen = min(target.first_seen, alert.first_seen)
+                target.last_seen = max(target.last_seen, alert.last_seen)
+                # Alerts inserted by this same call are written with their count
+                if target.pk is not None:
+                    self._add_pending(target, alert.occurrences, alert.first_seen, alert.last_seen)
+            targets.append(target)
+        latest = max(alert.timestamp for alert in alerts)
+        self._latest = latest if self._latest is None else max(self._latest, latest)
+        self._expire()
+        return targets, created
+
+    def _add_pending(self, alert, count, first, last):
+        _merge(self._pending, alert.pk, alert, count, first, last)
+        self._pending_count += count
+
+    def _insert(self, created):
+        try:
+            Alert.objects.bulk_create(created)
+        except Exception:
+            with self._lock:
+                for alert in created:
+                    if self.alerts.get(_key(alert)) is alert:
+                        del self.alerts[_key(alert)]
+                    self._unsaved.pop(id(alert), None)
+            raise
+        with self._lock:
+            for alert in created:
+                waiting = self._unsaved.pop(id(alert), None)
+                if waiting is not None:
+                    _, count, first, last = waiting
+                    alert.occurrences += count
+                    alert.first_seen = min(alert.first_seen, first)
+                    alert.last_seen = max(alert.last_seen, last)
+                    self._add_pending(alert, count, first, last)
+        # bulk_create sends no post_save for the dashboard summary
+        invalidate_summary()
+        alerts_created.send(sender=Alert, alerts=created)
+
+    def _load(self, alerts):
+        """Open alerts, saved by any process, whose window covers ``alerts``."""
+        earliest = min(alert.timestamp for alert in alerts) - self.window
+        latest = max(alert.timestamp for alert in alerts) + self.window
+        keys = {_key(alert) for alert in alerts}
+        candidates = Alert.objects.filter(
+            status='open',
+            alert_type__in={key[0] for key in keys},
+            src_ip__in={key[1] for key in keys},
+            first_seen__gt=earliest,
+            first_seen__lt=latest,
+        ).order_by('first_seen')
+        return [alert for alert in candidates if _key(alert) in keys]
+
+    def _expire(self):
+        alerts = self.alerts
+        cutoff = self._latest - self.window
+        while alerts:
+            key = next(iter(alerts))
+            if alerts[key].first_seen > cutoff and len(alerts) <= self.max_keys:
+                return
+            del alerts[key]
+
+    def forget(self, alert):
+        """Stop folding into ``alert`` (it was resolved or ignored)."""
+        with self._lock:
+            key = _key(alert)
+            if self.alerts.get(key) is not None and self.alerts[key].pk == alert.pk:
+                del self.alerts[key]
+
+    def flush(self):
+        """
+        Write pending counter increments; returns the number of alerts updated.
+
+        Alerts closed meanwhile, possibly by another worker, are forgotten.
+        Repeats seen only after one was resolved become a new alert instead.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending = list(self._pending.values())
+            self._pending = {}
+            self._pending_count = 0
+        reopened = []
+        for start in range(0, len(pending), FLUSH_CHUNK_SIZE):
+            chunk = pending[start:start + FLUSH_CHUNK_SIZE]
+            closed = dict(
+                Alert.objects.filter(pk__in=[alert.pk for alert, *_ in chunk])
+                .exclude(status='open').values_list('pk', 'resolved_at')
+            )
+            if closed:
+                kept = []
+                for entry in chunk:
+                    alert, count, first, last = entry
+                    if alert.pk in closed:
+                        self.forget(alert)
+                        resolved_at = closed[alert.pk]
+                        if resolved_at is not None and first > resolved_at:
+                            reopened.append(_reopen(alert, count, first, last))
+                            continue
+                    kept.append(entry)
+                chunk = kept
+            if chunk:
+                Alert.objects.filter(pk__in=[entry[0].pk for entry in chunk]).update(
+                    occurrences=F('occurrences') + _per_alert(chunk, lambda entry: entry[1], PositiveIntegerField()),
+                    first_seen=Least('first_seen', _per_alert(chunk, lambda entry: entry[2])),
+                    last_seen=Greatest('last_seen', _per_alert(chunk, lambda entry: entry[3])),
+                )
+        if reopened:
+            self.record(reopened)
+        return len(pending)
+
+    def _schedule_flush(self):
+        with self._lock:
+            if self._timer is None and self._pending_count:
+                self._timer = threading.Timer(self.flush_seconds, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Writing alert occurrence counters failed')
+        finally:
+            connection.close()
+
+    def close(self):
+        """Cancel the timer and write what is pending (at process exit)."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Writing alert occurrence counters failed')
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator():
+    """This process's deduplicator, created on first use and flushed at exit."""
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                _deduplicator = AlertDeduplicator(
+                    window_seconds=settings.ALERT_DEDUP_WINDOW_SECONDS,
+                    flush_seconds=settings.ALERT_DEDUP_FLUSH_SECONDS,
+                    flush_count=settings.ALERT_DEDUP_FLUSH_COUNT,
+                    max_keys=settings.ALERT_DEDUP_MAX_KEYS,
+                )
+    return _deduplicator
+
+
+def reset_deduplicator():
+    """Drop the fold table and anything pending (tests, or after changing the settings)."""
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is not None and _deduplicator._timer is not None:
+            _deduplicator._timer.cancel()
+        _deduplicator = None
+
+
+@atexit.register
+def _close_deduplicator():
+    if _deduplicator is not None:
+        _deduplicator.close()
+
+
+def record_alerts(alerts):
+    """Save ``alerts`` through this process's deduplicator; see ``AlertDeduplicator.record``."""
+    return get_deduplicator().record(alerts)
@@ -0,0 +1,569 @@
+"""
+Streaming detectors fed from log ingestion.
+
+``observe_logs`` is called by ``apps.logs.ingestion.save_logs`` with every
+saved batch. Each detector keeps bounded in-memory state and returns
+unsaved ``Alert`` objects, which are saved together (repeats are folded by
+``apps.alerts.dedup``) and the new ones broadcast to the ``alerts`` group.
+Thresholds come from the ``SystemSettings`` snapshot
+(``apps.settings.snapshot``), taken once per batch. State is per process: with several workers, each one sees (and
+judges) its own share of the traffic.
+"""
+import math
+import threading
+from array import array
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # the packet size detector falls back to plain Python
+    np = None
+
+from apps.dashboard.metrics import timed_publish
+from apps.settings.snapshot import get_settings
+
+from .dedup import record_alerts
+from .models import Alert
+from .serializers import AlertSerializer
+
+
+def _touch(seen, key, now, cutoff):
+    """
+    Mark ``key`` as seen at ``now`` and drop entries last seen before
+    ``cutoff``. ``seen`` is kept in last-seen order, so those are at the front.
+    Returns the dropped keys.
+    """
+    seen.pop(key, None)
+    seen[key] = now
+    expired = []
+    while True:
+        oldest = next(iter(seen))
+        if seen[oldest] >= cutoff:
+            return expired
+        del seen[oldest]
+        expired.append(oldest)
+
+
+class _ScanState:
+    __slots__ = ('ports', 'hosts', 'last_seen', 'quiet_until')
+
+    def __init__(self):
+        # port -> last seen, and port -> {host: last seen}, both in last-seen order
+        self.ports = {}
+        self.hosts = {}
+        self.last_seen = 0.0
+        self.quiet_until = 0.0
+
+
+class PortScanDetector:
+    """
+    Per-source sliding windows of distinct destination ports and, per port,
+    distinct destination hosts.
+
+    A source that reaches ``port_scan_limit`` distinct ports (a port scan) or
+    that many hosts on one port (a host sweep) within
+    ``monitoring_window_minutes`` raises one ``port_scan`` alert, then stays
+    quiet for a window. Each source holds at most ``limit`` ports with at
+    most ``limit`` hosts each, sources idle for a window are dropped, and at
+    most ``max_sources`` sources are tracked (least recently active go
+    first). Logs without a destination port (``raw_json.dst_port``) are not
+    considered.
+    """
+    alert_type = 'port_scan'
+
+    def __init__(self, max_sources=None):
+        self.max_sources = max_sources or settings.DETECTOR_MAX_SOURCES
+        # Least recently active first
+        self.sources = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Sources currently tracked."""
+        return len(self.sources)
+
+    def observe(self, logs, system):
+        """Feed a batch of logs; returns unsaved alerts."""
+        limit = system.port_scan_limit
+        window_seconds = system.monitoring_window_minutes * 60
+        alerts = []
+        latest = 0.0
+        with self._lock:
+            sources = self.sources
+            for log in logs:
+                port = log.dst_port
+                if port is None:
+                    continue
+                now = log.timestamp.timestamp()
+                latest = max(latest, now)
+                state = sources.pop(log.src_ip, None) or _ScanState()
+                sources[log.src_ip] = state
+                state.last_seen = now
+                if now < state.quiet_until:
+                    continue
+
+                cutoff = now - window_seconds
+                for stale in _touch(state.ports, port, now, cutoff):
+                    del state.hosts[stale]
+                hosts = state.hosts.setdefault(port, {})
+                _touch(hosts, log.dst_ip, now, cutoff)
+
+                if len(state.ports) >= limit or len(hosts) >= limit:
+                    alerts.append(self._alert(log, state, port, len(state.ports) >= limit, window_seconds))
+                    state.ports, state.hosts = {}, {}
+                    state.quiet_until = now + window_seconds
+            self._evict(latest - window_seconds)
+        return alerts
+
+    def _evict(self, cutoff):
+        sources = self.sources
+        while sources:
+            oldest = next(iter(sources))
+            if sources[oldest].last_seen >= cutoff and len(sources) <= self.max_sources:
+                return
+            del sources[oldest]
+
+    def _alert(self, log, state, port, port_scan, window_seconds):
+        minutes = round(window_seconds / 60)
+        hosts = state.hosts[port]
+        if port_scan:
+            message = f'Port scan from {log.src_ip}: {len(state.ports)} ports in {minutes} min'
+            # A single target host is named; a scan spread over hosts is not
+            targets = {host for seen in state.hosts.values() for host in seen}
+            dst_ip = log.dst_ip if len(targets) == 1 else None
+        else:
+            message = f'Host sweep from {log.src_ip}: {len(hosts)} hosts on port {port} in {minutes} min'
+            dst_ip = None
+        return Alert(
+            alert_type=self.alert_type,
+            severity='high',
+            src_ip=log.src_ip,
+            dst_ip=dst_ip,
+            message=message,
+            timestamp=log.timestamp,
+            metadata={
+                'detector': 'port_scan',
+                'ports': len(state.ports),
+                'hosts_on_port': len(hosts),
+                'port': port,
+                'sample_ports': sorted(state.ports)[:20],
+                'window_minutes': minutes,
+            },
+        )
+
+
+class _HeavyHitter:
+    __slots__ = ('counts', 'quiet_until')
+
+    def __init__(self, buckets):
+        # Exact requests per sketch bucket, aligned with RateDetector slots
+        self.counts = [0] * buckets
+        self.quiet_until = 0.0
+
+
+class RateDetector:
+    """
+    Per-source request rate against ``suspicious_traffic_threshold``
+    (requests per minute, averaged over ``monitoring_window_minutes``).
+
+    Counts go into a sliding count-min sketch: ``BUCKETS`` sketches of
+    ``depth`` x ``width`` counters, one per slice of the window, plus their
+    running sum, so the memory used does not depend on how many sources are
+    seen. The sketch can only overestimate. A source whose estimate passes
+    half the window's limit moves into a table of at most ``max_sources``
+    heavy hitters (the lowest count is evicted when full), seeded with its
+    estimate per bucket and counted exactly from then on; only these counts
+    raise ``suspicious_traffic`` alerts: ``high`` at twice the limit,
+    ``medium`` below that. Each source alerts at most once per window.
+    """
+    alert_type = 'suspicious_traffic'
+    BUCKETS = 12
+
+    def __init__(self, max_sources=None, width=None, depth=None):
+        self.max_sources = max_sources or settings.DETECTOR_HEAVY_HITTERS
+        self.width = width or settings.DETECTOR_SKETCH_WIDTH
+        self.depth = depth or settings.DETECTOR_SKETCH_DEPTH
+        self.heavy = {}
+        self._window = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Sources currently counted exactly."""
+        return len(self.heavy)
+
+    def _reset(self, window_seconds):
+        size = self.width * self.depth
+        self._window = window_seconds
+        self._bucket_seconds = window_seconds / self.BUCKETS
+        self._slots = [array('q', bytes(8 * size)) for _ in range(self.BUCKETS)]
+        self._slot_events = [0] * self.BUCKETS
+        self._total = array('q', bytes(8 * size))
+        self._latest = None
+        self.heavy = {}
+
+    def _slot(self, epoch):
+        """Ring index for bucket ``epoch``, expiring older buckets; None if outside the window."""
+        if self._latest is None:
+            self._latest = epoch
+        elif epoch > self._latest:
+            for stale in range(max(self._latest + 1, epoch - self.BUCKETS + 1), epoch + 1):
+                self._clear(stale % self.BUCKETS)
+            self._latest = epoch
+        elif epoch <= self._latest - self.BUCKETS:
+            return None
+        return epoch % self.BUCKETS
+
+    def _clear(self, index):
+        if self._slot_events[index]:
+            slot, total = self._slots[index], self._total
+            for position, count in enumerate(slot):
+                if count:
+                    total[position] -= count
+            self._slots[index] = array('q', bytes(len(slot) * 8))
+            self._slot_events[index] = 0
+        for src in list(self.heavy):
+            counts = self.heavy[src].counts
+            counts[index] = 0
+            if not any(counts):
+                del self.heavy[src]
+
+    def _positions(self, src):
+        # Double hashing: row r uses h1 + r * h2
+        digest = hash(src)
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def _add(self, index, positions, count):
+        """Add ``count`` requests to bucket ``index`` and return the estimated window total."""
+        slot, total = self._slots[index], self._total
+        estimate = None
+        for position in positions:
+            slot[position] += count
+            value = total[position] = total[position] + count
+            if estimate is None or value < estimate:
+                estimate = value
+        self._slot_events[index] += count
+        return estimate
+
+    def _promote(self, src, positions):
+        """Count ``src`` exactly from now on, starting from its per-bucket estimates."""
+        heavy = self.heavy
+        if len(heavy) >= self.max_sources:
+            del heavy[min(heavy, key=lambda key: sum(heavy[key].counts))]
+        entry = heavy[src] = _HeavyHitter(self.BUCKETS)
+        for index, slot in enumerate(self._slots):
+            if self._slot_events[index]:
+                entry.counts[index] = min(slot[position] for position in positions)
+        return entry
+
+    def observe(self, logs, system):
+        """Feed a batch of logs; returns unsaved alerts."""
+        window_seconds = system.monitoring_window_minutes * 60
+        limit = system.suspicious_traffic_threshold * system.monitoring_window_minutes
+        alerts = []
+        with self._lock:
+            if window_seconds != self._window:
+                self._reset(window_seconds)
+            bucket_seconds = self._bucket_seconds
+            # Aggregate the batch first: one sketch update per source and bucket
+            counts = {}
+            latest = {}
+            for log in logs:
+                key = (int(log.timestamp.timestamp() // bucket_seconds), log.src_ip)
+                counts[key] = counts.get(key, 0) + 1
+                latest[log.src_ip] = log
+
+            heavy = self.heavy
+            promote_at = limit / 2
+            for (epoch, src), count in sorted(counts.items()):
+                index = self._slot(epoch)
+                if index is None:
+                    continue
+                entry = heavy.get(src)
+                positions = self._positions(src)
+                estimate = self._add(index, positions, count)
+                if entry is not None:
+                    entry.counts[index] += count
+                elif estimate >= promote_at:
+                    self._promote(src, positions)
+
+            for src, log in latest.items():
+                entry = heavy.get(src)
+                if entry is None:
+                    continue
+                requests = sum(entry.counts)
+                now = log.timestamp.timestamp()
+                if requests >= limit and now >= entry.quiet_until:
+                    alerts.append(self._alert(log, requests, limit, system))
+                    entry.quiet_until = now + window_seconds
+        return alerts
+
+    def _alert(self, log, requests, limit, system):
+        minutes = system.monitoring_window_minutes
+        rate = requests / minutes
+        return Alert(
+            alert_type=self.alert_type,
+            severity='high' if requests >= 2 * limit else 'medium',
+            src_ip=log.src_ip,
+            message=(
+                f'Suspicious traffic from {log.src_ip}: {rate:.0f} requests/min over {minutes} min '
+                f'(threshold {system.suspicious_traffic_threshold})'
+            ),
+            timestamp=log.timestamp,
+            metadata={
+                'detector': 'rate',
+                'requests': requests,
+                'requests_per_minute': round(rate, 1),
+                'threshold': system.suspicious_traffic_threshold,
+                'window_minutes': minutes,
+            },
+        )
+
+
+class PacketSizeDetector:
+    """
+    Packet sizes against ``packet_size_threshold`` and per-source baselines.
+
+    A packet is an outlier when it is at least ``packet_size_threshold``
+    bytes (``medium`` alert), or when its source has ``MIN_SAMPLES`` earlier
+    packets and it exceeds their exponentially weighted mean by
+    ``DEVIATIONS`` standard deviations (``low`` alert; the deviation is at
+    least ``STD_FLOOR`` of the mean, so very regular sources are not flagged
+    for a few bytes). Each source gets at most one ``suspicious_traffic``
+    alert per window, for its largest outlier.
+
+    A batch is checked against the baselines as they were before it, and
+    its other packets then update them in one step per source: ``k``
+    packets with mean ``m`` move the baseline as ``k`` EWMA steps of ``m``.
+    With NumPy the whole batch is checked with array operations, otherwise
+    (and for tiny batches, where that is faster) packet by packet; both give
+    the same results. At most ``max_sources`` baselines are kept, least
+    recently active sources are dropped first.
+    """
+    alert_type = 'suspicious_traffic'
+    ALPHA = 0.05
+    DEVIATIONS = 4.0
+    STD_FLOOR = 0.1
+    MIN_SAMPLES = 20
+    # Below this many logs the per-packet loop beats array setup
+    MIN_VECTOR_BATCH = 32
+
+    def __init__(self, max_sources=None, vectorized=None):
+        self.max_sources = max_sources or settings.DETECTOR_MAX_SOURCES
+        self.vectorized = np is not None if vectorized is None else vectorized
+        # src -> slot in the baseline arrays, least recently active first
+        self.slots = {}
+        self._free = list(range(self.max_sources - 1, -1, -1))
+        if self.vectorized:
+            self._mean, self._square, self._count = (np.zeros(self.max_sources) for _ in range(3))
+        else:
+            self._mean, self._square, self._count = ([0.0] * self.max_sources for _ in range(3))
+        self._quiet_until = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Sources with a baseline."""
+        return len(self.slots)
+
+    def _slot(self, src):
+        slots = self.slots
+        slot = slots.pop(src, None)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                evicted = next(iter(slots))
+                slot = slots.pop(evicted)
+                self._quiet_until.pop(evicted, None)
+            self._mean[slot] = self._square[slot] = self._count[slot] = 0.0
+        slots[src] = slot
+        return slot
+
+    def observe(self, logs, system):
+        """Feed a batch of logs; returns unsaved alerts."""
+        if not logs:
+            return []
+        threshold = system.packet_size_threshold
+        # Batch-local source codes
+        codes = {}
+        batch_codes = [codes.setdefault(log.src_ip, len(codes)) for log in logs]
+        if len(codes) > self.max_sources:
+            # Every source in a batch needs its own slot
+            middle = len(logs) // 2
+            return self.observe(logs[:middle], system) + self.observe(logs[middle:], system)
+        with self._lock:
+            slots = [self._slot(src) for src in codes]
+            if self.vectorized and len(logs) >= self.MIN_VECTOR_BATCH:
+                outliers = self._check_numpy(logs, batch_codes, slots, threshold)
+            else:
+                outliers = self._check_python(logs, batch_codes, slots, threshold)
+            return self._alerts(logs, outliers, system)
+
+    def _check_numpy(self, logs, batch_codes, slots, threshold):
+        count = len(logs)
+        sizes = np.fromiter((log.packet_size for log in logs), dtype=np.float64, count=count)
+        codes = np.array(batch_codes, dtype=np.intp)
+        slots = np.array(slots, dtype=np.intp)
+        per_log = slots[codes]
+
+        mean = self._mean[per_log]
+        std = np.sqrt(np.maximum(self._square[per_log] - mean * mean, 0.0))
+        std = np.maximum(std, mean * self.STD_FLOOR)
+        oversized = sizes >= threshold
+        unusual = (self._count[per_log] >= self.MIN_SAMPLES) & (sizes > mean + self.DEVIATIONS * std)
+        flagged = oversized | unusual
+
+        normal = ~flagged
+        weights = np.bincount(codes, weights=normal.astype(np.float64), minlength=len(slots))
+        sums = np.bincount(codes, weights=np.where(normal, sizes, 0.0), minlength=len(slots))
+        squares = np.bincount(codes, weights=np.where(normal, sizes * sizes, 0.0), minlength=len(slots))
+        seen = weights > 0
+        slots, weights, sums, squares = slots[seen], weights[seen], sums[seen], squares[seen]
+        # k steps of the same value: the old baseline keeps (1 - alpha) ** k of its weight
+        keep = np.where(self._count[slots] > 0, (1 - self.ALPHA) ** weights, 0.0)
+        self._mean[slots] = keep * self._mean[slots] + (1 - keep) * (sums / weights)
+        self._square[slots] = keep * self._square[slots] + (1 - keep) * (squares / weights)
+        self._count[slots] += weights
+
+        return [
+            (int(index), bool(oversized[index]), float(mean[index]), float(std[index]))
+            for index in np.flatnonzero(flagged)
+        ]
+
+    def _check_python(self, logs, batch_codes, slots, threshold):
+        baselines = []
+        for slot in slots:
+            mean = float(self._mean[slot])
+            std = max(math.sqrt(max(float(self._square[slot]) - mean * mean, 0.0)), mean * self.STD_FLOOR)
+            baselines.append((mean, std, self._count[slot] >= self.MIN_SAMPLES))
+        totals = [[0, 0.0, 0.0] for _ in slots]
+
+        outliers = []
+        for index, (log, code) in enumerate(zip(logs, batch_codes)):
+            size = float(log.packet_size)
+            mean, std, known = baselines[code]
+            oversized = size >= threshold
+            if oversized or (known and size > mean + self.DEVIATIONS * std):
+                outliers.append((index, oversized, mean, std))
+                continue
+            total = totals[code]
+            total[0] += 1
+            total[1] += size
+            total[2] += size * size
+
+        for slot, (weight, size_sum, square_sum) in zip(slots, totals):
+            if not weight:
+                continue
+            keep = (1 - self.ALPHA) ** weight if self._count[slot] > 0 else 0.0
+            self._mean[slot] = keep * self._mean[slot] + (1 - keep) * (size_sum / weight)
+            self._square[slot] = keep * self._square[slot] + (1 - keep) * (square_sum / weight)
+            self._count[slot] += weight
+        return outliers
+
+    def _alerts(self, logs, outliers, system):
+        """One alert per source for its largest outlier, unless alerted within the window."""
+        largest = {}
+        counts = {}
+        for outlier in outliers:
+            log = logs[outlier[0]]
+            counts[log.src_ip] = counts.get(log.src_ip, 0) + 1
+            current = largest.get(log.src_ip)
+            if current is None or log.packet_size > logs[current[0]].packet_size:
+                largest[log.src_ip] = outlier
+        window_seconds = system.monitoring_window_minutes * 60
+        alerts = []
+        for src, (index, oversized, mean, std) in largest.items():
+            log = logs[index]
+            now = log.timestamp.timestamp()
+            if now < self._quiet_until.get(src, 0.0):
+                continue
+            self._quiet_until[src] = now + window_seconds
+            if oversized:
+                message = (
+                    f'Oversized packet from {src}: {log.packet_size} bytes '
+                    f'(threshold {system.packet_size_threshold})'
+                )
+            else:
+                message = (
+                    f'Unusual packet size from {src}: {log.packet_size} bytes '
+                    f'(baseline {mean:.0f} +/- {std:.0f})'
+                )
+            alerts.append(Alert(
+                alert_type=self.alert_type,
+                severity='medium' if oversized else 'low',
+                src_ip=src,
+                dst_ip=log.dst_ip,
+                message=message,
+                timestamp=log.timestamp,
+                metadata={
+                    'detector': 'packet_size',
+                    'packet_size': log.packet_size,
+                    'threshold': system.packet_size_threshold,
+                    'baseline_mean': round(mean, 1),
+                    'baseline_std': round(std, 1),
+                    'outliers': counts[src],
+                },
+            ))
+        return alerts
+
+
+DETECTORS = {
+    'port_scan': PortScanDetector,
+    'rate': RateDetector,
+    'packet_size': PacketSizeDetector,
+}
+_detectors = None
+_detectors_lock = threading.Lock()
+
+
+def get_detectors():
+    """The process-wide detector instances, created on first use."""
+    global _detectors
+    if _detectors is None:
+        with _detectors_lock:
+            if _detectors is None:
+                _detectors = [detector() for detector in DETECTORS.values()]
+    return _detectors
+
+
+def reset_detectors():
+    """Drop all detector state (tests, or after changing detector settings)."""
+    global _detectors
+    with _detectors_lock:
+        _detectors = None
+
+
+def save_alerts(alerts, broadcast=True):
+    """
+    Save detector alerts through the deduplicator and publish the new ones
+    (repeats only update counters) as one event.
+    """
+    if not alerts:
+        return []
+    targets = record_alerts(alerts)
+    created = [alert for alert, target in zip(alerts, targets) if alert is target]
+    channel_layer = get_channel_layer()
+    if broadcast and created and channel_layer:
+        with timed_publish('alerts'):
+            async_to_sync(channel_layer.group_send)(
+                'alerts',
+                {
+                    'type': 'alert_batch',
+                    'messages': AlertSerializer(created, many=True).data
+                }
+            )
+    return created
+
+
+def observe_logs(logs, broadcast=True):
+    """Run a saved batch through the detectors and save whatever they raise."""
+    if not logs or not settings.LOG_DETECTORS_ENABLED:
+        return []
+    system = get_settings()
+    alerts = []
+    for detector in get_detectors():
+        alerts.extend(detector.observe(logs, system))
+    return save_alerts(alerts, broadcast=broadcast)
@@ -0,0 +1,110 @@
+"""
+Measure streaming detector throughput on synthetic traffic.
+
+    python manage.py benchmark_detectors --events 500000 --sources 20000 --scanners 50
+
+Logs are built in memory (nothing is written to the database) with
+increasing timestamps: ordinary hosts each talk to a few servers on a handful
+of service ports, scanners walk through ports or sweep hosts. Thresholds are
+the ``SystemSettings`` defaults.
+"""
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.alerts.detectors import DETECTORS, PacketSizeDetector, np
+from apps.logs.models import NetworkLog
+from apps.settings.models import SystemSettings
+
+SERVICE_PORTS = (80, 443, 443, 443, 53, 53, 22, 8080, 123, 3306)
+PROTOCOLS = ('TCP', 'TCP', 'TCP', 'UDP', 'HTTPS')
+
+
+def synthetic_logs(events, sources, scanners, rate, seed=0):
+    """``events`` unsaved logs, ``rate`` per simulated second, about 1% from scanners."""
+    rng = random.Random(seed)
+    start = timezone.now() - timedelta(seconds=events / rate)
+    hosts = [f'10.{index // 65536}.{index // 256 % 256}.{index % 256}' for index in range(sources)]
+    servers = [f'192.168.1.{index}' for index in range(1, 51)]
+    attackers = [f'203.0.113.{index % 256}' if index < 256 else f'198.51.{index // 256}.{index % 256}'
+                 for index in range(scanners)]
+    next_port = [1] * scanners
+    logs = []
+    for index in range(events):
+        timestamp = start + timedelta(seconds=index / rate)
+        if scanners and rng.random() < 0.01:
+            scanner = rng.randrange(scanners)
+            if scanner % 2:
+                # Host sweep: one port across the subnet
+                src, dst, port = attackers[scanner], f'192.168.2.{rng.randrange(1, 255)}', 445
+            else:
+                src, dst, port = attackers[scanner], servers[scanner % len(servers)], next_port[scanner]
+                next_port[scanner] = next_port[scanner] % 65535 + 1
+        else:
+            # Skewed towards a few busy hosts, each talking to a few servers
+            host = int(rng.random() ** 3 * sources)
+            src = hosts[host]
+            dst, port = servers[(host + rng.randrange(4)) % len(servers)], rng.choice(SERVICE_PORTS)
+        logs.append(NetworkLog(
+            timestamp=timestamp,
+            src_ip=src,
+            dst_ip=dst,
+            proto=rng.choice(PROTOCOLS),
+            packet_size=40 + int(rng.random() ** 2 * 1460),
+            action='allow',
+            raw_json={'dst_port': port},
+        ))
+    return logs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the streaming alert detectors (events per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--detector', choices=sorted(DETECTORS), action='append',
+                            help='Detector to run (repeatable; default: all)')
+        parser.add_argument('--events', type=int, default=200000, help='Synthetic logs to feed')
+        parser.add_argument('--sources', type=int, default=5000, help='Ordinary source hosts')
+        parser.add_argument('--scanners', type=int, default=20, help='Scanning source hosts')
+        parser.add_argument('--rate', type=float, default=2000, help='Logs per simulated second')
+        parser.add_argument('--batch', type=int, default=500, help='Logs per observed batch')
+        parser.add_argument('--max-sources', type=int, help='Override DETECTOR_MAX_SOURCES')
+        parser.add_argument('--memory', action='store_true', help='Also report traced memory (slower)')
+        parser.add_argument('--baseline', action='store_true',
+                            help='Also run the packet size detector without NumPy, for comparison')
+
+    def handle(self, *args, **options):
+        system = SystemSettings()
+        logs = synthetic_logs(options['events'], options['sources'], options['scanners'], options['rate'])
+        batch = options['batch']
+        self.stdout.write(
+            f"{len(logs):,} logs, {options['sources']:,} hosts, {options['scanners']} scanners, "
+            f"batches of {batch}"
+        )
+        self.stdout.write(f"{'detector':<20}{'events/s':>12}{'us/event':>10}{'alerts':>8}{'tracked':>9}  memory")
+
+        runs = [(name, DETECTORS[name]) for name in options['detector'] or sorted(DETECTORS)]
+        if options['baseline'] and np is not None and PacketSizeDetector in dict(runs).values():
+            runs.append(('packet_size (python)', lambda max_sources: PacketSizeDetector(max_sources, vectorized=False)))
+
+        for name, factory in runs:
+            if options['memory']:
+                tracemalloc.start()
+            detector = factory(max_sources=options['max_sources'])
+            alerts = 0
+            started = time.perf_counter()
+            for offset in range(0, len(logs), batch):
+                alerts += len(detector.observe(logs[offset:offset + batch], system))
+            elapsed = time.perf_counter() - started
+            memory = ''
+            if options['memory']:
+                memory = f'{tracemalloc.get_traced_memory()[0] / 1024 / 1024:.1f} MB'
+                tracemalloc.stop()
+            self.stdout.write(
+                f'{name:<20}{len(logs) / elapsed:>12,.0f}{elapsed / len(logs) * 1e6:>10.2f}'
+                f'{alerts:>8}{len(detector):>9}  {memory}'
+            )
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("alerts", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="alert",
+            name="alerts_timesta_67be6b_idx",
+        ),
+        migrations.AddIndex(
+            model_name="alert",
+            index=models.Index(fields=["timestamp", "id"], name="alerts_timestamp_id_idx"),
+        ),
+    ]
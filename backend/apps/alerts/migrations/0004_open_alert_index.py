@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("alerts", "0003_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="alert",
+            name="alert_type",
+            field=models.CharField(
+                choices=[
+                    ("port_scan", "Port Scan"),
+                    ("brute_force", "Brute Force"),
+                    ("ddos", "DDoS Attack"),
+                    ("malware", "Malware Detection"),
+                    ("suspicious_traffic", "Suspicious Traffic"),
+                    ("unauthorized_access", "Unauthorized Access"),
+                    ("other", "Other"),
+                ],
+                max_length=50,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="alert",
+            name="severity",
+            field=models.CharField(
+                choices=[
+                    ("low", "Low"),
+                    ("medium", "Medium"),
+                    ("high", "High"),
+                    ("critical", "Critical"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="alert",
+            name="status",
+            field=models.CharField(
+                choices=[("open", "Open"), ("resolved", "Resolved"), ("ignored", "Ignored")],
+                default="open",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="alert",
+            name="timestamp",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="alert",
+            index=models.Index(
+                condition=models.Q(("status", "open")),
+                fields=["severity", "-timestamp"],
+                name="alerts_open_severity_ts_idx",
+            ),
+        ),
+    ]
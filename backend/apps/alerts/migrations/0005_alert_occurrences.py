@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_seen(apps, schema_editor):
+    # Existing alerts are single occurrences
+    Alert = apps.get_model("alerts", "Alert")
+    Alert.objects.update(first_seen=F("timestamp"), last_seen=F("timestamp"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("alerts", "0004_open_alert_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alert",
+            name="first_seen",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="alert",
+            name="last_seen",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="alert",
+            name="occurrences",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(backfill_seen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+"""
+Give ``alerts.occurrences`` a database default.
+
+``AddField`` only sets the default while adding the column, so raw INSERTs
+that leave ``occurrences`` out (bulk loads, ``benchmark_queries --generate``)
+would fail the NOT NULL constraint.
+"""
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("alerts", "0005_alert_occurrences"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "ALTER TABLE alerts ALTER COLUMN occurrences SET DEFAULT 1",
+            "ALTER TABLE alerts ALTER COLUMN occurrences DROP DEFAULT",
+        ),
+    ]
@@ -31,17 +31,21 @@ class Alert(models.Model):
         ('ignored', 'Ignored'),
     ]
     
-    alert_type = models.CharField(max_length=50, choices=ALERT_TYPE_CHOICES, db_index=True)
-    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, db_index=True)
+    alert_type = models.CharField(max_length=50, choices=ALERT_TYPE_CHOICES)
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES)
     src_ip = models.GenericIPAddressField(db_index=True)
     dst_ip = models.GenericIPAddressField(null=True, blank=True, db_index=True)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     message = models.TextField()
     metadata = models.JSONField(null=True, blank=True, help_text='Additional alert metadata')
     resolved_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='resolved_alerts')
     resolved_at = models.DateTimeField(null=True, blank=True)
-    timestamp = models.DateTimeField(db_index=True)
+    timestamp = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Repeats folded into this alert by apps.alerts.dedup
+    occurrences = models.PositiveIntegerField(default=1)
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'alerts'
@@ -49,7 +53,15 @@ class Alert(models.Model):
         indexes = [
             models.Index(fields=['status', 'severity']),
             models.Index(fields=['alert_type']),
-            models.Index(fields=['timestamp']),
+            # Keyset pagination order (see apps.logs.pagination)
+            models.Index(fields=['timestamp', 'id'], name='alerts_timestamp_id_idx'),
+            # Open alerts by severity, newest first; resolved alerts are most
+            # of the table and never read through this path
+            models.Index(
+                fields=['severity', '-timestamp'],
+                condition=models.Q(status='open'),
+                name='alerts_open_severity_ts_idx',
+            ),
         ]
     
     def __str__(self):
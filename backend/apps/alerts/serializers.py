@@ -9,7 +9,7 @@ class AlertSerializer(serializers.ModelSerializer):
     class Meta:
         model = Alert
         fields = '__all__'
-        read_only_fields = ('created_at', 'resolved_by', 'resolved_at')
+        read_only_fields = ('created_at', 'resolved_by', 'resolved_at', 'occurrences', 'first_seen', 'last_seen')
     
     def validate(self, data):
         if 'timestamp' not in data:
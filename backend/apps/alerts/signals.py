@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent with ``alerts`` (a list) once new alerts are saved, bulk inserts included
+alerts_created = Signal()
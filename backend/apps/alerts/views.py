@@ -5,8 +5,11 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.utils import timezone
 from .models import Alert
+from .dedup import get_deduplicator, record_alerts
 from .serializers import AlertSerializer
 from apps.authentication.permissions import IsAdminOrReadOnly
+from apps.dashboard.metrics import timed_publish
+from apps.logs.pagination import TimestampKeysetPagination
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
@@ -23,25 +26,38 @@ class AlertViewSet(viewsets.ModelViewSet):
     search_fields = ['message', 'src_ip', 'dst_ip']
     ordering_fields = ['timestamp', 'created_at', 'severity']
     ordering = ['-timestamp']
+    pagination_class = TimestampKeysetPagination
+    
+    def perform_create(self, serializer):
+        """
+        Save through the deduplicator. Returns False, with the earlier alert
+        as ``serializer.instance``, when the alert was folded into it.
+        """
+        alert = Alert(**serializer.validated_data)
+        serializer.instance = record_alerts([alert])[0]
+        return serializer.instance is alert
     
     def create(self, request, *args, **kwargs):
         """
-        Create a new alert and broadcast it via WebSocket.
+        Create a new alert and broadcast it via WebSocket. A repeat of a
+        recent alert is folded into it instead (200 with the earlier alert).
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        if not self.perform_create(serializer):
+            return Response(serializer.data, status=status.HTTP_200_OK)
         
         # Broadcast to WebSocket clients
         channel_layer = get_channel_layer()
         if channel_layer:
-            async_to_sync(channel_layer.group_send)(
-                'alerts',
-                {
-                    'type': 'alert_message',
-                    'message': serializer.data
-                }
-            )
+            with timed_publish('alerts'):
+                async_to_sync(channel_layer.group_send)(
+                    'alerts',
+                    {
+                        'type': 'alert_message',
+                        'message': serializer.data
+                    }
+                )
         
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -55,7 +71,9 @@ class AlertViewSet(viewsets.ModelViewSet):
         alert.status = 'resolved'
         alert.resolved_by = request.user
         alert.resolved_at = timezone.now()
-        alert.save()
+        # occurrences/first_seen/last_seen belong to apps.alerts.dedup
+        alert.save(update_fields=['status', 'resolved_by', 'resolved_at'])
+        get_deduplicator().forget(alert)
         
         serializer = self.get_serializer(alert)
         return Response(serializer.data, status=status.HTTP_200_OK)
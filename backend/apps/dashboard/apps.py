@@ -1,9 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.dashboard'
 
+    def ready(self):
+        from apps.alerts.models import Alert
+        from apps.firewall.models import FirewallRule
+        from .cache import invalidate_summary
+
+        # New, resolved and deleted alerts and any rule change alter the summary
+        for model in (Alert, FirewallRule):
+            post_save.connect(invalidate_summary, sender=model, dispatch_uid=f'dashboard-summary-{model.__name__}-save')
+            post_delete.connect(invalidate_summary, sender=model, dispatch_uid=f'dashboard-summary-{model.__name__}-delete')
+
 
 
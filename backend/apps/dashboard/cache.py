@@ -0,0 +1,75 @@
+"""
+Shared cache for the dashboard summary.
+
+Every open dashboard polls ``/api/dashboard/summary/``; the payload is
+computed once and served from the cache for ``DASHBOARD_SUMMARY_TTL``
+seconds. Alert and firewall rule writes drop it early (see ``apps.py``).
+
+Concurrent misses are collapsed: threads of one worker queue on a local
+lock, and across workers only the one that wins ``cache.add`` on the lock
+key recomputes while the others serve the previous payload (or wait for
+the new one if there is none). The lock holds a random token and is only
+released by the worker whose token it still is.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+SUMMARY_KEY = 'dashboard:summary'
+STALE_KEY = 'dashboard:summary:stale'
+LOCK_KEY = 'dashboard:summary:lock'
+POLL_SECONDS = 0.05
+
+_local_lock = threading.Lock()
+
+
+def get_summary(compute):
+    """Return the cached summary, calling ``compute()`` at most once per miss."""
+    payload = cache.get(SUMMARY_KEY)
+    if payload is not None:
+        return payload
+    with _local_lock:
+        payload = cache.get(SUMMARY_KEY)
+        if payload is None:
+            payload = _recompute(compute)
+    return payload
+
+
+def _recompute(compute):
+    lock_seconds = settings.DASHBOARD_SUMMARY_LOCK_SECONDS
+    token = uuid.uuid4().hex
+    locked = cache.add(LOCK_KEY, token, lock_seconds)
+    if not locked:
+        # Another worker is recomputing
+        payload = cache.get(STALE_KEY)
+        if payload is not None:
+            return payload
+        deadline = time.monotonic() + lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            payload = cache.get(SUMMARY_KEY)
+            if payload is not None:
+                return payload
+        # The lock holder died or is too slow; compute here, taking the lock
+        # if it has expired, but never releasing someone else's
+        locked = cache.add(LOCK_KEY, token, lock_seconds)
+    try:
+        payload = compute()
+        cache.set(SUMMARY_KEY, payload, settings.DASHBOARD_SUMMARY_TTL)
+        cache.set(STALE_KEY, payload, settings.DASHBOARD_SUMMARY_STALE_SECONDS)
+    finally:
+        if locked and cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+    return payload
+
+
+def invalidate_summary(**kwargs):
+    """
+    Drop the cached summary once the current transaction commits, so the
+    next poll sees the write. Usable directly as a signal receiver.
+    """
+    transaction.on_commit(lambda: cache.delete(SUMMARY_KEY))
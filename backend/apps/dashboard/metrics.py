@@ -0,0 +1,223 @@
+"""
+In-process request and publish metrics, exposed in the Prometheus text
+format on ``/api/metrics/``.
+
+``MetricsMiddleware`` times every request and counts the queries it runs
+and the time spent in them through ``connection.execute_wrapper``;
+``timed_publish()`` wraps channel layer ``group_send`` calls. Metrics are
+kept per worker process, so scrape each worker (or put them behind a
+sticky target) when running several.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Gauge:
+    """Current value keyed by label values."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += hits
+                yield (
+                    f'{self.name}_bucket',
+                    _format_labels(self.labels + ('le',), labels + (bound if bound == '+Inf' else float(bound),)),
+                    cumulative,
+                )
+            yield f'{self.name}_count', _format_labels(self.labels, labels), cumulative
+            yield f'{self.name}_sum', _format_labels(self.labels, labels), series[-1]
+
+
+REQUESTS = Counter('secupi_http_requests_total', 'HTTP requests by view and status.', ('method', 'view', 'status'))
+REQUEST_SECONDS = Histogram('secupi_http_request_duration_seconds', 'HTTP request latency.', ('method', 'view'))
+REQUEST_QUERIES = Histogram(
+    'secupi_http_request_db_queries', 'Database queries per request.', ('view',), buckets=QUERY_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram('secupi_http_request_db_seconds', 'Time spent in the database per request.', ('view',))
+PUBLISH_SECONDS = Histogram('secupi_channel_publish_seconds', 'Channel layer group_send latency.', ('group',))
+AUTO_BLOCKED = Counter('secupi_auto_blocked_addresses_total', 'Source addresses blocked by auto-blocking.')
+AUTO_BLOCK_RULES_SAVED = Counter(
+    'secupi_auto_block_rules_saved_total', 'Firewall rules avoided by merging auto-blocks into CIDRs.'
+)
+WRITE_BEHIND_QUEUE_DEPTH = Gauge('secupi_write_behind_queue_depth', 'Logs waiting in the write-behind queue.')
+WRITE_BEHIND_FLUSH_SECONDS = Histogram('secupi_write_behind_flush_seconds', 'Write-behind batch write latency.')
+WRITE_BEHIND_LOGS = Counter(
+    'secupi_write_behind_logs_total',
+    'Buffered logs by outcome (written, retried, dead_lettered, lost).',
+    ('outcome',),
+)
+
+REGISTRY = (
+    REQUESTS, REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, PUBLISH_SECONDS,
+    AUTO_BLOCKED, AUTO_BLOCK_RULES_SAVED,
+    WRITE_BEHIND_QUEUE_DEPTH, WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_LOGS,
+)
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed_publish(group):
+    """Record how long a channel layer publish to ``group`` takes."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PUBLISH_SECONDS.observe(time.perf_counter() - started, group)
+
+
+class QueryTimer:
+    """``execute_wrapper`` that counts queries and the time spent running them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _view_label(request):
+    # URL names keep the label set bounded; unmatched paths share one label
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """Time each request and the queries it runs."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = _view_label(request)
+        REQUESTS.inc(request.method, view, str(response.status_code))
+        REQUEST_SECONDS.observe(elapsed, request.method, view)
+        REQUEST_QUERIES.observe(timer.queries, view)
+        REQUEST_DB_SECONDS.observe(timer.seconds, view)
+        return response
@@ -1,9 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class FirewallConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.firewall'
 
+    def ready(self):
+        from apps.alerts.signals import alerts_created
+        from .autoblock import offer_alerts
+        from .device_table import record_change
+        from .matcher import invalidate_matcher
+        from .models import FirewallRule
 
-
+        post_save.connect(invalidate_matcher, sender=FirewallRule, dispatch_uid='firewall-matcher-save')
+        post_delete.connect(invalidate_matcher, sender=FirewallRule, dispatch_uid='firewall-matcher-delete')
+        # Every change bumps the device rule table version
+        post_save.connect(record_change, sender=FirewallRule, dispatch_uid='firewall-table-save')
+        post_delete.connect(record_change, sender=FirewallRule, dispatch_uid='firewall-table-delete')
+        # auto_block_suspicious_ip
+        alerts_created.connect(offer_alerts, dispatch_uid='firewall-auto-block')
@@ -0,0 +1,206 @@
+"""
+Automatic blocking of suspicious sources.
+
+With ``SystemSettings.auto_block_suspicious_ip`` on, the source addresses of
+new high and critical alerts are collected for
+``AUTO_BLOCK_DEBOUNCE_SECONDS`` and then blocked together: the new
+addresses and the existing auto-block rules are collapsed into the fewest
+CIDRs covering exactly the same addresses, and the auto-block rules are
+rewritten to match in one transaction. Rules are saved and deleted one by
+one, so the matcher, the dashboard and the device rule table see every
+change.
+
+Auto-block rules are active block rules named ``Auto-block <cidr>`` for all
+traffic from ``<cidr>``. Sources already blocked for all traffic by another
+active block/drop rule, or trusted by an active allow rule for all traffic
+from a specific source, are left alone.
+"""
+import ipaddress
+import logging
+import threading
+import zlib
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.dashboard.metrics import AUTO_BLOCK_RULES_SAVED, AUTO_BLOCKED
+from apps.settings.snapshot import get_settings
+
+from .matcher import parse_network
+from .models import FirewallRule
+
+logger = logging.getLogger(__name__)
+
+AUTO_BLOCK_PREFIX = 'Auto-block '
+SEVERITIES = ('high', 'critical')
+LOCK_KEY = zlib.crc32(b'firewall-auto-block')
+
+
+def _all_traffic(rule):
+    return rule.dst.strip() == '*' and rule.proto.strip() == '*' and rule.port.strip() == '*'
+
+
+def _covers(network, address):
+    return network is None or (network.version == address.version and address.subnet_of(network))
+
+
+def block_addresses(addresses):
+    """
+    Block ``addresses`` (strings), merged with the existing auto-block rules.
+
+    Returns a report: ``addresses`` newly blocked, ``skipped`` (invalid,
+    already blocked or trusted), auto-block ``rules_before``/``rules_after``,
+    ``created``/``updated``/``deleted`` rows, and ``rules_saved``: how many
+    fewer rules there are than with one rule per blocked address.
+    """
+    networks = set()
+    for address in addresses:
+        try:
+            networks.add(ipaddress.ip_network(address))
+        except ValueError:
+            continue
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # One merge at a time across workers
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+        auto, blocked, trusted = [], [], []
+        for rule in FirewallRule.objects.filter(is_active=True).order_by('id'):
+            try:
+                network = parse_network(rule.src)
+            except ValueError:
+                continue
+            if rule.name.startswith(AUTO_BLOCK_PREFIX) and rule.action == 'block' and network is not None:
+                auto.append((rule, network))
+            elif not _all_traffic(rule):
+                continue
+            elif rule.action in ('block', 'drop'):
+                blocked.append(network)
+            elif network is not None:
+                trusted.append(network)
+        covering = blocked + trusted + [network for _, network in auto]
+        new = [
+            address for address in networks
+            if not any(_covers(network, address) for network in covering)
+        ]
+        report = {
+            'addresses': len(new),
+            'skipped': len(set(addresses)) - len(new),
+            'rules_before': len(auto),
+            'rules_after': len(auto),
+            'created': 0,
+            'updated': 0,
+            'deleted': 0,
+            'rules_saved': 0,
+        }
+        if not new:
+            return report
+
+        current = [network for _, network in auto] + new
+        merged = {
+            str(cidr)
+            for version in (4, 6)
+            for cidr in ipaddress.collapse_addresses(network for network in current if network.version == version)
+        }
+        kept, spare = set(), []
+        for rule, network in auto:
+            if str(network) in merged and str(network) not in kept:
+                kept.add(str(network))
+            else:
+                spare.append(rule)
+        # Rows that no longer match a CIDR are reused before new ones are created
+        for cidr in sorted(merged - kept):
+            rule = spare.pop() if spare else None
+            if rule is None:
+                rule = FirewallRule(dst='*', proto='*', port='*', action='block')
+                report['created'] += 1
+            else:
+                report['updated'] += 1
+            rule.name = f'{AUTO_BLOCK_PREFIX}{cidr}'
+            rule.src = cidr
+            rule.save()
+        for rule in spare:
+            rule.delete()
+        report['deleted'] = len(spare)
+        report['rules_after'] = len(merged)
+        report['rules_saved'] = len(auto) + len(new) - len(merged)
+
+    AUTO_BLOCKED.inc(amount=report['addresses'])
+    AUTO_BLOCK_RULES_SAVED.inc(amount=report['rules_saved'])
+    logger.info(
+        'Auto-blocked %d addresses: %d auto-block rules -> %d (%d fewer than one rule per address)',
+        report['addresses'], report['rules_before'], report['rules_after'], report['rules_saved'],
+    )
+    return report
+
+
+class AutoBlocker:
+    """
+    Collects offending sources and blocks them ``debounce_seconds`` after
+    the first one, so a burst of alerts becomes one rule update.
+    """
+
+    def __init__(self, debounce_seconds):
+        self.debounce_seconds = debounce_seconds
+        self.pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def offer(self, alerts):
+        """Queue the sources of the high and critical ``alerts``."""
+        sources = {alert.src_ip for alert in alerts if alert.severity in SEVERITIES}
+        if not sources:
+            return
+        with self._lock:
+            self.pending |= sources
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce_seconds, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Block what is pending if auto-blocking is on; returns the report or ``None``."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self.pending = self.pending, set()
+        if not pending or not get_settings().auto_block_suspicious_ip:
+            return None
+        return block_addresses(pending)
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Auto-blocking suspicious sources failed')
+        finally:
+            connection.close()
+
+
+_blocker = None
+_blocker_lock = threading.Lock()
+
+
+def get_auto_blocker():
+    """This process's auto-blocker, created on first use."""
+    global _blocker
+    if _blocker is None:
+        with _blocker_lock:
+            if _blocker is None:
+                _blocker = AutoBlocker(settings.AUTO_BLOCK_DEBOUNCE_SECONDS)
+    return _blocker
+
+
+def reset_auto_blocker():
+    """Drop pending sources without blocking them (tests)."""
+    global _blocker
+    with _blocker_lock:
+        if _blocker is not None and _blocker._timer is not None:
+            _blocker._timer.cancel()
+        _blocker = None
+
+
+def offer_alerts(sender, alerts, **kwargs):
+    """``alerts_created`` receiver."""
+    get_auto_blocker().offer(alerts)
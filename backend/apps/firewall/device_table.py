@@ -0,0 +1,175 @@
+"""
+Compact binary rule table for ESP32 devices.
+
+Every rule save or delete appends a ``FirewallRuleChange``; its id is the
+table version, so versions only ever grow. On PostgreSQL the change is
+recorded under a transaction-scoped advisory lock, so ids are handed out in
+commit order: a change committed later never gets a lower version than one
+a device has already seen. Devices fetch the whole table once and then ask
+for the changes since the version they hold.
+
+All integers are big-endian. A table starts with a 26-byte header::
+
+    magic   4s  b'FWRT'
+    format  B   1
+    kind    B   0 = full table, 1 = delta
+    count   I   number of records
+    version Q   table version after applying this response
+    since   Q   version the delta applies to (0 for full tables)
+
+A full table lists rule records by descending rule id (newest first),
+which is the evaluation order: the first matching record wins. A delta lists
+``op`` (B: 1 = upsert, 2 = delete) followed by a rule record for upserts or
+just the rule id (I) for deletes; devices apply them and keep their table
+sorted by descending id. Rules that are inactive or cannot be parsed are
+left out of full tables and sent as deletes in deltas.
+
+A rule record::
+
+    id      I
+    action  B   0 = allow, 1 = block, 2 = drop
+    proto   B   IANA number: 6 = TCP, 17 = UDP, 1 = ICMP, 0 = any
+    src     address (below)
+    dst     address
+    nports  B   0 = any port
+    ports   nports x (low H, high H), inclusive
+
+An address is a family byte (0 = any, 4, 6); for 4 and 6 it is followed by
+the prefix length (B) and only the ceil(prefix / 8) leading bytes of the
+network address.
+
+The encoded full table is cached per process and rebuilt only when the
+version changes; deltas are built from the change history, which keeps the
+last ``FIREWALL_TABLE_HISTORY`` changes. Older versions get a full table.
+"""
+import struct
+import threading
+import zlib
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .matcher import parse_network, parse_ports
+from .models import FirewallRule, FirewallRuleChange
+
+MAGIC = b'FWRT'
+FORMAT = 1
+FULL, DELTA = 0, 1
+UPSERT, DELETE = 1, 2
+HEADER = struct.Struct('>4sBBIQQ')
+RECORD = struct.Struct('>IBB')
+PORT_RANGE = struct.Struct('>HH')
+ACTIONS = {'allow': 0, 'block': 1, 'drop': 2}
+PROTOCOLS = {'*': 0, 'ICMP': 1, 'TCP': 6, 'UDP': 17}
+CONTENT_TYPE = 'application/octet-stream'
+LOCK_KEY = zlib.crc32(b'firewall-rule-changes')
+
+_full = None
+_lock = threading.Lock()
+
+
+def record_change(sender, instance, **kwargs):
+    """Signal receiver: log a rule save (``created`` in kwargs) or deletion."""
+    op = 'upsert' if 'created' in kwargs else 'delete'
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Held until the outermost transaction commits, so a concurrent
+            # change waits and takes a higher id only after this one is visible
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+        change = FirewallRuleChange.objects.create(rule_id=instance.pk, op=op)
+        FirewallRuleChange.objects.filter(id__lte=change.pk - settings.FIREWALL_TABLE_HISTORY).delete()
+
+
+def current_version():
+    return FirewallRuleChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def _pack_address(network):
+    if network is None:
+        return b'\x00'
+    length = network.prefixlen
+    return bytes((network.version, length)) + network.network_address.packed[:(length + 7) // 8]
+
+
+def encode_rule(rule):
+    """A rule record, or None for rules devices should not hold."""
+    if not rule.is_active:
+        return None
+    try:
+        src, dst, ports = parse_network(rule.src), parse_network(rule.dst), parse_ports(rule.port)
+    except ValueError:
+        return None
+    ports = ports or []
+    if len(ports) > 255:
+        return None
+    return b''.join((
+        RECORD.pack(rule.pk, ACTIONS[rule.action], PROTOCOLS.get(rule.proto, 0)),
+        _pack_address(src),
+        _pack_address(dst),
+        bytes((len(ports),)),
+        b''.join(PORT_RANGE.pack(low, high) for low, high in ports),
+    ))
+
+
+RULE_FIELDS = ('id', 'src', 'dst', 'proto', 'port', 'action', 'is_active')
+
+
+def encode_full(version):
+    rules = FirewallRule.objects.filter(is_active=True).only(*RULE_FIELDS).order_by('-id')
+    records = [record for record in map(encode_rule, rules) if record is not None]
+    return HEADER.pack(MAGIC, FORMAT, FULL, len(records), version, 0) + b''.join(records)
+
+
+def encode_delta(since, version):
+    """Changes in ``(since, version]``, one entry per rule, or None if history is missing."""
+    oldest = FirewallRuleChange.objects.aggregate(oldest=Min('id'))['oldest']
+    if oldest is None or since < oldest - 1:
+        return None
+    latest = {}
+    for rule_id, op in FirewallRuleChange.objects.filter(id__gt=since, id__lte=version).values_list('rule_id', 'op'):
+        latest[rule_id] = op
+    upserted = [rule_id for rule_id, op in latest.items() if op == 'upsert']
+    upserts = {rule.pk: rule for rule in FirewallRule.objects.only(*RULE_FIELDS).filter(pk__in=upserted)}
+
+    entries = []
+    for rule_id in sorted(latest, reverse=True):
+        record = encode_rule(upserts[rule_id]) if rule_id in upserts else None
+        if record is None:
+            entries.append(bytes((DELETE,)) + struct.pack('>I', rule_id))
+        else:
+            entries.append(bytes((UPSERT,)) + record)
+    return HEADER.pack(MAGIC, FORMAT, DELTA, len(entries), version, since) + b''.join(entries)
+
+
+def full_table(version):
+    """The encoded full table at ``version``, built once per version per process."""
+    global _full
+    cached = _full
+    if cached is None or cached[0] != version:
+        with _lock:
+            if _full is None or _full[0] != version:
+                _full = (version, encode_full(version))
+            cached = _full
+    return cached[1]
+
+
+def etag(version):
+    return f'"fw-{version}"'
+
+
+def get_table(since=None):
+    """
+    ``(version, body)`` for a device at version ``since``: a delta when the
+    history covers it, otherwise the full table. ``body`` is None when the
+    device is already current.
+    """
+    version = current_version()
+    if since is not None and since == version:
+        return version, None
+    if since is not None and 0 <= since < version:
+        delta = encode_delta(since, version)
+        if delta is not None:
+            return version, delta
+    return version, full_table(version)
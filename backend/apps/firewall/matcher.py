@@ -0,0 +1,286 @@
+"""
+Compiled firewall rule matcher.
+
+All active ``FirewallRule`` rows are compiled into one lookup structure,
+split by protocol. Within a protocol, source and destination prefixes are
+kept as one hash table per prefix length (a level-compressed prefix trie)
+and ports as sorted interval boundaries. Each lookup yields a bitmask of
+candidate rules, with bit ``i`` standing for the ``i``-th rule in priority
+order; the first match is the lowest bit set in ``src & dst & port``.
+
+Priority is the order the rules API lists them: newest first. ``HTTP`` and
+``HTTPS`` traffic is matched as TCP; other protocols only match ``*`` rules.
+A tuple without a port only matches rules whose port is ``*``.
+
+``get_matcher()`` keeps one compiled matcher per process and rebuilds it
+when the rule count or the latest ``updated_at`` changes (checked at most
+every ``FIREWALL_MATCHER_RECHECK_SECONDS``, and right away after a rule is
+saved or deleted in this process).
+"""
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import FirewallRule
+
+logger = logging.getLogger(__name__)
+
+MatchedRule = namedtuple('MatchedRule', ('id', 'name', 'action'))
+
+PROTOCOLS = ('TCP', 'UDP', 'ICMP')
+PROTO_ALIASES = {'HTTP': 'TCP', 'HTTPS': 'TCP'}
+ANY_PROTO = '*'
+MAX_PORT = 65535
+# Parsed addresses kept per process; traffic repeats the same hosts heavily
+ADDRESS_CACHE_SIZE = 65536
+_addresses = {}
+
+
+def parse_address(value):
+    """``(version, integer)`` for an IPv4/IPv6 address string; ValueError otherwise."""
+    parsed = _addresses.get(value)
+    if parsed is not None:
+        return parsed
+    try:
+        parsed = 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+    except (OSError, TypeError):
+        try:
+            parsed = 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, value), 'big')
+        except (OSError, TypeError):
+            raise ValueError(f'Invalid IP address: {value!r}')
+    if len(_addresses) >= ADDRESS_CACHE_SIZE:
+        _addresses.clear()
+    _addresses[value] = parsed
+    return parsed
+
+
+def parse_network(value):
+    """``None`` for ``*`` (any address), otherwise an ``ip_network``; ValueError if invalid."""
+    value = (value or '').strip()
+    if value in ('', '*'):
+        return None
+    return ipaddress.ip_network(value, strict=False)
+
+
+def parse_ports(value):
+    """
+    ``None`` for ``*`` (any port), otherwise a list of inclusive ``(low, high)``
+    ranges from ``80``, ``8000-8080`` or comma-separated combinations of them.
+    """
+    value = (value or '').strip()
+    if value in ('', '*'):
+        return None
+    ranges = []
+    for part in value.split(','):
+        low, _, high = part.strip().partition('-')
+        low = int(low)
+        high = int(high) if high else low
+        if not 0 <= low <= high <= MAX_PORT:
+            raise ValueError(f'Invalid port range: {part.strip()!r}')
+        ranges.append((low, high))
+    return ranges
+
+
+class _PrefixTable:
+    """Prefix-length levels of one address family: ``[(shift, {network >> shift: mask})]``."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self._levels = {}
+
+    def add(self, network, bit):
+        length = 0 if network is None else network.prefixlen
+        shift = self.bits - length
+        key = 0 if network is None else int(network.network_address) >> shift
+        table = self._levels.setdefault(shift, {})
+        table[key] = table.get(key, 0) | bit
+
+    def levels(self):
+        return tuple(sorted(self._levels.items()))
+
+
+def _lookup(levels, address):
+    mask = 0
+    for shift, table in levels:
+        mask |= table.get(address >> shift, 0)
+    return mask
+
+
+class _PortIndex:
+    """Sorted interval boundaries with the mask of rules covering each interval."""
+
+    def __init__(self, entries):
+        # entries: (ranges or None, bit)
+        self.any_port = 0
+        events = {}
+        for ranges, bit in entries:
+            if ranges is None:
+                self.any_port |= bit
+                continue
+            for low, high in ranges:
+                events.setdefault(low, []).append((bit, 1))
+                events.setdefault(high + 1, []).append((bit, -1))
+
+        self.starts = [0]
+        self.masks = [self.any_port]
+        coverage = {}
+        mask = self.any_port
+        for point in sorted(events):
+            for bit, delta in events[point]:
+                before = coverage.get(bit, 0)
+                coverage[bit] = before + delta
+                if before == 0 or coverage[bit] == 0:
+                    mask = (mask | bit) if coverage[bit] else (mask & ~bit)
+            if point == self.starts[-1]:
+                self.masks[-1] = mask
+            else:
+                self.starts.append(point)
+                self.masks.append(mask)
+
+    def lookup(self, port):
+        if port is None:
+            return self.any_port
+        if not 0 <= port <= MAX_PORT:
+            return 0
+        return self.masks[bisect_right(self.starts, port) - 1]
+
+
+class _ProtocolTable:
+    def __init__(self, entries):
+        # entries: (src network, dst network, ports, bit)
+        sources = {4: _PrefixTable(32), 6: _PrefixTable(128)}
+        destinations = {4: _PrefixTable(32), 6: _PrefixTable(128)}
+        for src, dst, _, bit in entries:
+            for table, network in ((sources, src), (destinations, dst)):
+                if network is None:
+                    table[4].add(None, bit)
+                    table[6].add(None, bit)
+                else:
+                    table[network.version].add(network, bit)
+        self.src = {version: table.levels() for version, table in sources.items()}
+        self.dst = {version: table.levels() for version, table in destinations.items()}
+        self.ports = _PortIndex((ports, bit) for _, _, ports, bit in entries)
+
+
+class RuleMatcher:
+    """Immutable compiled form of a list of rules, highest priority first."""
+
+    def __init__(self, rules, signature=None):
+        self.signature = signature
+        self.rules = []
+        self.skipped = []
+        by_proto = {proto: [] for proto in PROTOCOLS + (ANY_PROTO,)}
+        for rule in rules:
+            try:
+                entry = (parse_network(rule.src), parse_network(rule.dst), parse_ports(rule.port))
+            except ValueError as exc:
+                logger.warning('Skipping firewall rule %s (%s): %s', rule.pk, rule.name, exc)
+                self.skipped.append(rule.pk)
+                continue
+            bit = 1 << len(self.rules)
+            self.rules.append(MatchedRule(rule.pk, rule.name, rule.action))
+            targets = PROTOCOLS + (ANY_PROTO,) if rule.proto == ANY_PROTO else (rule.proto,)
+            for proto in targets:
+                by_proto.setdefault(proto, []).append(entry + (bit,))
+        self._tables = {proto: _ProtocolTable(entries) for proto, entries in by_proto.items()}
+
+    def match(self, src, dst, proto, port=None):
+        """
+        The first ``MatchedRule`` for the tuple, or None. ``src`` and ``dst``
+        are address strings; ValueError if either is not a valid IP.
+        """
+        table = self._tables.get(PROTO_ALIASES.get(proto, proto)) or self._tables[ANY_PROTO]
+        src_version, src_address = _addresses.get(src) or parse_address(src)
+        dst_version, dst_address = _addresses.get(dst) or parse_address(dst)
+        mask = _lookup(table.src[src_version], src_address)
+        if mask:
+            mask &= _lookup(table.dst[dst_version], dst_address)
+            if mask:
+                mask &= table.ports.lookup(port)
+        if not mask:
+            return None
+        return self.rules[(mask & -mask).bit_length() - 1]
+
+    def match_many(self, tuples):
+        """
+        ``match`` over an iterable of ``(src, dst, proto, port)`` tuples.
+        Source, destination and port masks are computed once per distinct
+        value in the batch, so a batch costs little more than its distinct
+        hosts and ports.
+        """
+        tables = self._tables
+        rules = self.rules
+        sources = {}
+        destinations = {}
+        ports = {}
+        results = []
+        for src, dst, proto, port in tuples:
+            proto = PROTO_ALIASES.get(proto, proto)
+            if proto not in tables:
+                proto = ANY_PROTO
+            key = (proto, src)
+            mask = sources.get(key)
+            if mask is None:
+                version, address = parse_address(src)
+                mask = sources[key] = _lookup(tables[proto].src[version], address)
+            if mask:
+                key = (proto, dst)
+                dst_mask = destinations.get(key)
+                if dst_mask is None:
+                    version, address = parse_address(dst)
+                    dst_mask = destinations[key] = _lookup(tables[proto].dst[version], address)
+                mask &= dst_mask
+            if mask:
+                key = (proto, port)
+                port_mask = ports.get(key)
+                if port_mask is None:
+                    port_mask = ports[key] = tables[proto].ports.lookup(port)
+                mask &= port_mask
+            results.append(rules[(mask & -mask).bit_length() - 1] if mask else None)
+        return results
+
+
+def active_rules():
+    """Active rules in priority order."""
+    return FirewallRule.objects.filter(is_active=True).order_by('-created_at', '-id')
+
+
+def rules_signature():
+    """Changes whenever a rule is added, edited (``updated_at``) or deleted."""
+    state = FirewallRule.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return state['count'], state['updated']
+
+
+_matcher = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_matcher():
+    """The process-wide compiled matcher, rebuilt when the rules changed."""
+    global _matcher, _checked_at
+    now = time.monotonic()
+    if _matcher is not None and now - _checked_at < settings.FIREWALL_MATCHER_RECHECK_SECONDS:
+        return _matcher
+    with _lock:
+        if _matcher is None or now - _checked_at >= settings.FIREWALL_MATCHER_RECHECK_SECONDS:
+            # Signature first: a rule changed while compiling only causes one more rebuild
+            signature = rules_signature()
+            if _matcher is None or _matcher.signature != signature:
+                rules = active_rules().only('id', 'name', 'src', 'dst', 'proto', 'port', 'action')
+                _matcher = RuleMatcher(rules, signature=signature)
+            _checked_at = now
+    return _matcher
+
+
+def invalidate_matcher(**kwargs):
+    """Signal receiver: re-check the rules on the next ``get_matcher()``."""
+    global _checked_at
+    _checked_at = 0.0
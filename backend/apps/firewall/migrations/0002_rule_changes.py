@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+def seed_changes(apps, schema_editor):
+    # Existing rules become version 1..n so deltas from version 0 include them
+    FirewallRule = apps.get_model("firewall", "FirewallRule")
+    FirewallRuleChange = apps.get_model("firewall", "FirewallRuleChange")
+    FirewallRuleChange.objects.bulk_create(
+        FirewallRuleChange(rule_id=pk, op="upsert")
+        for pk in FirewallRule.objects.order_by("id").values_list("id", flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("firewall", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FirewallRuleChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("rule_id", models.BigIntegerField()),
+                (
+                    "op",
+                    models.CharField(
+                        choices=[("upsert", "Upsert"), ("delete", "Delete")], max_length=10
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "firewall_rule_changes",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
@@ -40,4 +40,25 @@ class FirewallRule(models.Model):
         return f"{self.name} ({self.src} -> {self.dst})"
 
 
-
+class FirewallRuleChange(models.Model):
+    """
+    Append-only record of rule saves and deletions. Ids double as the
+    monotonic version of the device rule table (see apps.firewall.device_table),
+    so devices can ask for the changes since the version they hold.
+    """
+    OP_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    ]
+    
+    # Not a foreign key: the row must outlive the rule it records
+    rule_id = models.BigIntegerField()
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'firewall_rule_changes'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"v{self.pk}: {self.op} rule {self.rule_id}"
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .matcher import parse_network, parse_ports
 from .models import FirewallRule
 from apps.authentication.serializers import UserSerializer
 
@@ -10,6 +11,34 @@ class FirewallRuleSerializer(serializers.ModelSerializer):
         model = FirewallRule
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at', 'created_by')
+    
+    def _validate_network(self, value):
+        try:
+            parse_network(value)
+        except ValueError:
+            raise serializers.ValidationError('Enter an IP address, a CIDR block or *.')
+        return value.strip()
+    
+    def validate_src(self, value):
+        return self._validate_network(value)
+    
+    def validate_dst(self, value):
+        return self._validate_network(value)
+    
+    def validate_port(self, value):
+        try:
+            parse_ports(value)
+        except ValueError:
+            raise serializers.ValidationError('Enter a port, a range such as 8000-8080, a comma-separated list or *.')
+        return value.strip()
+
+
+class RuleEvaluationSerializer(serializers.Serializer):
+    """One ``(src, dst, proto, port)`` tuple for the evaluate endpoint."""
+    src = serializers.IPAddressField()
+    dst = serializers.IPAddressField()
+    proto = serializers.CharField(max_length=10)
+    port = serializers.IntegerField(min_value=0, max_value=65535, required=False, allow_null=True)
 
 
 
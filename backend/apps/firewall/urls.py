@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FirewallRuleViewSet
+from .views import FirewallRuleViewSet, device_rules
 
 router = DefaultRouter()
 router.register(r'rules', FirewallRuleViewSet, basename='firewall-rules')
 
 urlpatterns = [
+    path('device/rules/', device_rules, name='firewall-device-rules'),
     path('', include(router.urls)),
 ]
 
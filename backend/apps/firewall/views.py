@@ -1,10 +1,14 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework import serializers, viewsets, status
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.conf import settings
+from django.http import HttpResponse
 from .models import FirewallRule
-from .serializers import FirewallRuleSerializer
+from .serializers import FirewallRuleSerializer, RuleEvaluationSerializer
+from .matcher import get_matcher
+from . import device_table
 from apps.authentication.permissions import IsAdmin
 
 
@@ -24,6 +28,73 @@ class FirewallRuleViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+    
+    @action(detail=False, methods=['post'])
+    def evaluate(self, request):
+        """
+        Evaluate a JSON array of ``{src, dst, proto, port}`` tuples against the
+        active rules. Each result is the first matching rule (or null), in
+        input order; invalid items are reported by their index.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a JSON array of {src, dst, proto, port} objects.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_size = settings.FIREWALL_EVALUATE_MAX_BATCH_SIZE
+        if len(items) > max_size:
+            return Response(
+                {'detail': f'Batch too large; send at most {max_size} tuples per request.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        serializer = RuleEvaluationSerializer()
+        matcher = get_matcher()
+        results = []
+        errors = []
+        for index, item in enumerate(items):
+            try:
+                data = serializer.run_validation(item)
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+                results.append(None)
+                continue
+            rule = matcher.match(data['src'], data['dst'], data['proto'].upper(), data.get('port'))
+            results.append(
+                {'rule': rule.id, 'name': rule.name, 'action': rule.action} if rule
+                else {'rule': None, 'name': None, 'action': None}
+            )
+        return Response({
+            'results': results,
+            'rejected': len(errors),
+            'errors': errors,
+        })
 
 
+@api_view(['GET'])
+def device_rules(request):
+    """
+    Binary rule table for ESP32 devices (format in apps.firewall.device_table).
 
+    ``?since=<version>`` returns only the changes after that version when
+    they are still known, otherwise the full table. A device that is
+    current, by ``since`` or by ``If-None-Match``, gets ``304 Not Modified``.
+    """
+    since = request.query_params.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'detail': 'since must be an integer version.'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    version, body = device_table.get_table(since)
+    tag = device_table.etag(version)
+    if body is None or tag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(body, content_type=device_table.CONTENT_TYPE)
+    response['ETag'] = tag
+    response['X-Rule-Table-Version'] = str(version)
+    response['Cache-Control'] = 'no-cache'
+    return response
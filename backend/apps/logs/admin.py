@@ -1,5 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import NetworkLog
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(NetworkLog)
@@ -8,7 +9,18 @@ class NetworkLogAdmin(admin.ModelAdmin):
     list_filter = ('proto', 'action', 'timestamp')
     search_fields = ('src_ip', 'dst_ip')
     readonly_fields = ('created_at',)
-    date_hierarchy = 'timestamp'
-
-
+    # Planner estimates instead of COUNT(*) on large tables; no date_hierarchy,
+    # which scans the whole table for its date links
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None and changelist.paginator.count_estimated:
+            self.message_user(
+                request,
+                f'About {changelist.result_count:,} logs: this count is a planner estimate, not exact.',
+                messages.INFO,
+            )
+        return response
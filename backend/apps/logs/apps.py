@@ -1,9 +1,26 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class LogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.logs'
+    
+    def ready(self):
+        # Background jobs start with the first request so management
+        # commands (migrate, shell, ...) never spawn them.
+        request_started.connect(start_background_jobs, dispatch_uid='logs-background-jobs')
+
+
+def start_background_jobs(**kwargs):
+    from django.conf import settings
+    from django.db import connection
+    from .maintenance import schedule
+    from .partitions import maintain_partitions
+    
+    request_started.disconnect(dispatch_uid='logs-background-jobs')
+    if settings.LOG_PARTITION_MAINTENANCE_MINUTES > 0 and connection.vendor == 'postgresql':
+        schedule('log-partitions', maintain_partitions, settings.LOG_PARTITION_MAINTENANCE_MINUTES * 60)
 
 
 
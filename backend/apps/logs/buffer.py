@@ -0,0 +1,279 @@
+"""
+Write-behind buffer for log ingestion.
+
+Validated logs are queued in a bounded per-process queue and written by a
+background thread in batches of ``batch_size`` rows or every ``flush_ms``
+milliseconds, whichever comes first. Requests only pay for validation and
+an enqueue, not for the database commit.
+
+A batch whose write fails is retried ``LOG_WRITE_BEHIND_RETRIES`` times
+with growing pauses (the queue fills meanwhile, so ingestion gets 503s
+instead of piling up logs). After that it is appended as NDJSON to a
+per-process file in ``LOG_WRITE_BEHIND_DEAD_LETTER_DIR``, which
+``manage.py load_logs`` can replay. Queue depth, flush latency and
+outcomes are exported on ``/api/metrics``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from apps.alerts.detectors import observe_logs
+from apps.dashboard.metrics import (
+    WRITE_BEHIND_FLUSH_SECONDS,
+    WRITE_BEHIND_LOGS,
+    WRITE_BEHIND_QUEUE_DEPTH,
+)
+
+from .ingestion import broadcast_logs, save_logs
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_FIELDS = ('src_ip', 'dst_ip', 'proto', 'packet_size', 'action', 'raw_json')
+
+
+class WriteBehindBuffer:
+    """
+    Bounded queue drained by a single flusher thread.
+
+    ``writer`` is called with a list of items from the flusher thread and
+    must write all of them or none, since a failed batch is retried up to
+    ``retries`` times (after ``retry_ms``, doubling) and then handed to
+    ``dead_letter``, if given.
+    """
+    POLL_SECONDS = 0.05
+
+    def __init__(self, writer, max_size=50000, batch_size=1000, flush_ms=200,
+                 retries=0, retry_ms=500, dead_letter=None):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.retries = retries
+        self.retry_interval = retry_ms / 1000
+        self.dead_letter = dead_letter
+        self._queue = queue.Queue(maxsize=max_size)
+        self._put_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'written': 0,
+            'retried': 0,
+            'failed': 0,
+            'dead_lettered': 0,
+            'lost': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'last_flush_seconds': 0.0,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='log-write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def offer(self, items):
+        """
+        Queue all of ``items`` or none of them.
+
+        Returns False when the queue does not have room, so callers can apply
+        backpressure instead of blocking the request.
+        """
+        with self._put_lock:
+            if self._stopping.is_set() or self._queue.qsize() + len(items) > self.max_size:
+                with self._stats_lock:
+                    self._stats['rejected'] += len(items)
+                return False
+            for item in items:
+                self._queue.put_nowait(item)
+            WRITE_BEHIND_QUEUE_DEPTH.set(self._queue.qsize())
+        with self._stats_lock:
+            self._stats['enqueued'] += len(items)
+        return True
+
+    def close(self, timeout=10):
+        """
+        Stop accepting items and wait for the flusher to drain the queue.
+        """
+        with self._put_lock:
+            self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            # Never started: drain synchronously so nothing is lost
+            self._drain()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['capacity'] = self.max_size
+        stats['flush_seconds_avg'] = (
+            stats['flush_seconds_total'] / stats['flushes'] if stats['flushes'] else 0.0
+        )
+        return stats
+
+    def _next_batch(self):
+        """
+        Wait for the first item, then collect until the batch is full or the
+        flush interval since that first item has elapsed. Waits are sliced so
+        ``close()`` is noticed promptly.
+        """
+        try:
+            batch = [self._queue.get(timeout=self.POLL_SECONDS)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, self.POLL_SECONDS)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _write(self, batch):
+        WRITE_BEHIND_QUEUE_DEPTH.set(self._queue.qsize())
+        for attempt in range(self.retries + 1):
+            if self._flush(batch):
+                self._count('written', len(batch))
+                return
+            if attempt < self.retries:
+                self._count('retried', len(batch))
+                time.sleep(self.retry_interval * 2 ** attempt)
+
+        self._count('failed', len(batch))
+        if self.dead_letter is None:
+            self._count('lost', len(batch))
+            return
+        try:
+            self.dead_letter(batch)
+        except Exception:
+            logger.exception('Dead-lettering %d logs failed; they are lost', len(batch))
+            self._count('lost', len(batch))
+        else:
+            self._count('dead_lettered', len(batch))
+
+    def _flush(self, batch):
+        """One write attempt; returns whether it succeeded."""
+        started = time.perf_counter()
+        try:
+            self.writer(batch)
+            return True
+        except Exception:
+            logger.exception('Write-behind flush of %d logs failed', len(batch))
+            return False
+        finally:
+            elapsed = time.perf_counter() - started
+            WRITE_BEHIND_FLUSH_SECONDS.observe(elapsed)
+            with self._stats_lock:
+                self._stats['flushes'] += 1
+                self._stats['flush_seconds_total'] += elapsed
+                self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], elapsed)
+                self._stats['last_flush_seconds'] = elapsed
+
+    def _count(self, outcome, amount):
+        with self._stats_lock:
+            self._stats[outcome] += amount
+        if outcome != 'failed':
+            WRITE_BEHIND_LOGS.inc(outcome, amount=amount)
+
+    def _drain(self, batch=None):
+        batch = batch or []
+        while True:
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+            batch = []
+
+    def _run(self):
+        batch = []
+        try:
+            while not self._stopping.is_set():
+                batch = self._next_batch()
+                if batch and not self._stopping.is_set():
+                    self._write(batch)
+                    batch = []
+            # Top up a batch interrupted by close() before writing it
+            self._drain(batch)
+        finally:
+            connection.close()
+
+
+def write_logs(instances):
+    """
+    Writer of the process buffer. Only the insert may fail the batch: once
+    it has committed, a failing broadcast or detector is logged instead, so
+    a retry never inserts the logs twice.
+    """
+    created = save_logs(instances, broadcast=False, detect=False)
+    try:
+        broadcast_logs(created)
+        observe_logs(created)
+    except Exception:
+        logger.exception('Publishing %d buffered logs failed', len(created))
+
+
+def dead_letter_logs(instances):
+    """Append ``instances`` as NDJSON to this process's dead-letter file."""
+    directory = settings.LOG_WRITE_BEHIND_DEAD_LETTER_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'network_logs-{os.getpid()}.ndjson')
+    lines = []
+    for log in instances:
+        # Full-precision timestamp, so replayed logs match the originals
+        row = {'timestamp': log.timestamp.isoformat()}
+        row.update((field, getattr(log, field)) for field in DEAD_LETTER_FIELDS)
+        lines.append(json.dumps(row))
+    with open(path, 'a', encoding='utf-8') as out:
+        out.write('\n'.join(lines) + '\n')
+    logger.warning('Wrote %d unsaved logs to %s', len(instances), path)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return this process's write-behind buffer, starting it on first use.
+    The buffer is drained when the worker shuts down.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    writer=write_logs,
+                    max_size=settings.LOG_WRITE_BEHIND_QUEUE_SIZE,
+                    batch_size=settings.LOG_WRITE_BEHIND_BATCH_SIZE,
+                    flush_ms=settings.LOG_WRITE_BEHIND_FLUSH_MS,
+                    retries=settings.LOG_WRITE_BEHIND_RETRIES,
+                    retry_ms=settings.LOG_WRITE_BEHIND_RETRY_MS,
+                    dead_letter=dead_letter_logs,
+                ).start()
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def buffer_stats():
+    """Stats for this process's buffer, or None if it was never started."""
+    return _buffer.stats() if _buffer is not None else None
@@ -1,13 +1,105 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .subscriptions import LogFilter
+
+
+def _query_int(params, name, default, lower, upper):
+    try:
+        value = int(params[name][0])
+    except (KeyError, ValueError):
+        return default
+    return max(lower, min(value, upper))
+
+
+class CoalescingMixin:
+    """
+    Optional per-connection coalescing of outgoing events.
+
+    Clients opt in on connect with ``?coalesce_ms=250`` (and optionally
+    ``&coalesce_max=500``). Events are then buffered and sent as one
+    ``{'type': <batch_type>, 'data': [...]}`` frame every ``coalesce_ms``
+    milliseconds or every ``coalesce_max`` events, whichever comes first.
+    Without ``coalesce_ms`` every event is sent as soon as it arrives.
+    """
+    item_type = None
+    batch_type = None
+    
+    def setup_coalescing(self):
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.coalesce_ms = _query_int(
+            params, 'coalesce_ms', settings.WS_COALESCE_DEFAULT_MS, 0, settings.WS_COALESCE_MAX_MS
+        )
+        self.coalesce_max = _query_int(
+            params, 'coalesce_max', settings.WS_COALESCE_MAX_EVENTS, 1, settings.WS_COALESCE_MAX_EVENTS
+        )
+        self._pending = []
+        self._flush_task = None
+    
+    async def send_items(self, items, batched=False):
+        """
+        Send (or buffer) events. ``batched`` items always go out as an array frame.
+        """
+        if not self.coalesce_ms:
+            if batched:
+                await self._send_frame(self.batch_type, items)
+            else:
+                for item in items:
+                    await self._send_frame(self.item_type, item)
+            return
+        
+        self._pending.extend(items)
+        if len(self._pending) >= self.coalesce_max:
+            await self.flush_pending()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+    
+    async def flush_pending(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.coalesce_max):
+            await self._send_frame(self.batch_type, pending[start:start + self.coalesce_max])
+    
+    def stop_coalescing(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending = []
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.coalesce_ms / 1000)
+        # Clear first so flush_pending() does not cancel the running task
+        self._flush_task = None
+        await self.flush_pending()
+    
+    async def _send_frame(self, frame_type, data):
+        await self.send(text_data=json.dumps({
+            'type': frame_type,
+            'data': data
+        }))
+
 
-class LogConsumer(AsyncWebsocketConsumer):
+class LogConsumer(CoalescingMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time log updates.
+    
+    Clients can narrow the stream by sending
+    ``{"type": "subscribe", "filters": {...}}`` (see ``LogFilter``);
+    ``{"type": "unsubscribe"}`` goes back to receiving everything.
     """
+    item_type = 'log'
+    batch_type = 'logs'
+    
     async def connect(self):
         self.group_name = 'logs'
+        self.log_filter = None
+        self.setup_coalescing()
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
@@ -15,28 +107,65 @@ class LogConsumer(AsyncWebsocketConsumer):
         await self.accept()
     
     async def disconnect(self, close_code):
+        self.stop_coalescing()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
     
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Handle subscription changes sent by the client.
+        """
+        try:
+            message = json.loads(text_data or '')
+        except ValueError:
+            await self._send_frame('error', {'detail': 'Messages must be JSON'})
+            return
+        
+        message_type = message.get('type') if isinstance(message, dict) else None
+        if message_type == 'unsubscribe':
+            self.log_filter = None
+            await self._send_frame('subscribed', {})
+        elif message_type == 'subscribe':
+            try:
+                log_filter = LogFilter.compile(message.get('filters', {}))
+            except ValueError as exc:
+                await self._send_frame('error', {'detail': str(exc)})
+                return
+            self.log_filter = None if log_filter.is_empty() else log_filter
+            await self._send_frame('subscribed', log_filter.describe())
+        else:
+            await self._send_frame('error', {'detail': 'Unknown message type'})
+    
     async def log_message(self, event):
         """
         Receive message from room group and send to WebSocket.
         """
-        message = event['message']
-        await self.send(text_data=json.dumps({
-            'type': 'log',
-            'data': message
-        }))
+        if self.log_filter is None or self.log_filter.matches(event['message']):
+            await self.send_items([event['message']])
+    
+    async def log_batch(self, event):
+        """
+        Receive a batch of logs from room group and send it as one frame.
+        """
+        messages = event['messages']
+        if self.log_filter is not None:
+            messages = [message for message in messages if self.log_filter.matches(message)]
+        if messages:
+            await self.send_items(messages, batched=True)
 
 
-class AlertConsumer(AsyncWebsocketConsumer):
+class AlertConsumer(CoalescingMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time alert updates.
     """
+    item_type = 'alert'
+    batch_type = 'alerts'
+    
     async def connect(self):
         self.group_name = 'alerts'
+        self.setup_coalescing()
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
@@ -44,6 +173,7 @@ class AlertConsumer(AsyncWebsocketConsumer):
         await self.accept()
     
     async def disconnect(self, close_code):
+        self.stop_coalescing()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
@@ -53,11 +183,10 @@ class AlertConsumer(AsyncWebsocketConsumer):
         """
         Receive message from room group and send to WebSocket.
         """
-        message = event['message']
-        await self.send(text_data=json.dumps({
-            'type': 'alert',
-            'data': message
-        }))
-
-
-
+        await self.send_items([event['message']])
+    
+    async def alert_batch(self, event):
+        """
+        Receive a batch of alerts from room group and send it as one frame.
+        """
+        await self.send_items(event['messages'], batched=True)
@@ -0,0 +1,227 @@
+"""
+Bulk ingestion helpers for network logs.
+
+Validation, persistence and WebSocket broadcast are kept separate so the
+batch endpoint, the NDJSON stream and any other bulk path can share them.
+"""
+import csv
+import json
+import logging
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from apps.alerts.detectors import observe_logs
+from apps.dashboard.metrics import timed_publish
+from apps.firewall.matcher import get_matcher
+from apps.settings.snapshot import get_settings
+
+from . import rollups
+from .models import NetworkLog
+from .serializers import NetworkLogSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def validate_logs(items, start=0):
+    """
+    Validate raw log dicts with a single serializer instance.
+
+    Returns ``(instances, errors)``: unsaved NetworkLog objects for the valid
+    items and ``{'index': ..., 'errors': ...}`` entries for the rejected ones.
+    Indexes are numbered from ``start``.
+    """
+    serializer = NetworkLogSerializer()
+    instances = []
+    errors = []
+    for index, item in enumerate(items, start):
+        try:
+            data = serializer.run_validation(item)
+        except serializers.ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+            continue
+        instances.append(NetworkLog(**data))
+    return instances, errors
+
+
+# SystemSettings.default_action values as log actions
+DEFAULT_ACTION_DECISIONS = {'allow': 'allow', 'deny': 'block'}
+
+
+def evaluate_rules(instances):
+    """
+    Set ``rule_action`` and ``matched_rule`` on each log: the first matching
+    active firewall rule, or ``SystemSettings.default_action`` when none
+    matches. The whole batch goes through one ``match_many`` call against
+    the cached matcher and the settings snapshot.
+    """
+    if not instances:
+        return instances
+    default = DEFAULT_ACTION_DECISIONS.get(get_settings().default_action, 'allow')
+    matches = get_matcher().match_many(
+        (log.src_ip, log.dst_ip, log.proto, log.dst_port) for log in instances
+    )
+    for log, rule in zip(instances, matches):
+        if rule is None:
+            log.rule_action, log.matched_rule_id = default, None
+        else:
+            log.rule_action, log.matched_rule_id = rule.action, rule.id
+    return instances
+
+
+def save_logs(instances, broadcast=True, backend=None, detect=True):
+    """
+    Insert validated logs in one round trip, add them to the traffic
+    rollups in the same transaction and publish them as one event.
+
+    ``backend`` is ``'orm'`` (bulk INSERT) or ``'copy'`` (PostgreSQL COPY) and
+    defaults to ``settings.LOG_INGEST_BACKEND``. With
+    ``LOG_INGEST_EVALUATE_RULES`` the batch goes through ``evaluate_rules``
+    first. Saved logs are then fed to the streaming detectors
+    (``apps.alerts.detectors``) unless ``detect`` is false, as for archive
+    imports whose traffic is not live.
+    """
+    if not instances:
+        return []
+    backend = backend or settings.LOG_INGEST_BACKEND
+    if settings.LOG_INGEST_EVALUATE_RULES:
+        evaluate_rules(instances)
+    with transaction.atomic():
+        if backend == 'copy' and connection.vendor == 'postgresql':
+            created = copy_logs(instances)
+        else:
+            created = NetworkLog.objects.bulk_create(instances)
+        rollups.record(created)
+    if broadcast:
+        broadcast_logs(created)
+    if detect:
+        observe_logs(created, broadcast=broadcast)
+    return created
+
+
+COPY_COLUMNS = (
+    'id', 'timestamp', 'src_ip', 'dst_ip', 'proto', 'packet_size', 'action', 'raw_json',
+    'rule_action', 'matched_rule_id', 'created_at',
+)
+
+
+def copy_logs(instances):
+    """
+    Insert logs through PostgreSQL ``COPY FROM STDIN``.
+
+    Primary keys are reserved from the table's sequence first, so the
+    instances come back with ids set, just like ``bulk_create``.
+    """
+    table = NetworkLog._meta.db_table
+    now = timezone.now()
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [table, 'id', len(instances)]
+        )
+        for log, (pk,) in zip(instances, cursor.fetchall()):
+            log.pk = pk
+            log.created_at = now
+            writer.writerow([
+                pk,
+                log.timestamp.isoformat(),
+                log.src_ip,
+                log.dst_ip,
+                log.proto,
+                log.packet_size,
+                log.action,
+                # Unquoted empty CSV fields are loaded as NULL
+                None if log.raw_json is None else json.dumps(log.raw_json),
+                log.rule_action,
+                log.matched_rule_id,
+                now.isoformat(),
+            ])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+    for log in instances:
+        log._state.adding = False
+        log._state.db = connection.alias
+    return instances
+
+
+def broadcast_logs(logs):
+    """
+    Send a batch of logs to WebSocket clients as a single ``log_batch`` event.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer and logs:
+        with timed_publish('logs'):
+            async_to_sync(channel_layer.group_send)(
+                'logs',
+                {
+                    'type': 'log_batch',
+                    'messages': NetworkLogSerializer(logs, many=True).data
+                }
+            )
+
+
+def ingest_ndjson(stream, batch_size, max_errors=1000):
+    """
+    Read newline-delimited JSON logs from ``stream`` and save them in
+    micro-batches of ``batch_size`` rows, so memory stays bounded no matter
+    how long the upload is.
+
+    Rejected lines are reported by their 1-based line number (at most
+    ``max_errors`` of them); ``last_line`` is the last line consumed. If
+    saving a batch or reading the stream fails part way, the result covers
+    only the batches already committed, ``last_line`` is the last line of
+    those and ``error`` says what went wrong, so the sender can resume from
+    ``last_line + 1`` without duplicating rows.
+    """
+    result = {'accepted': 0, 'rejected': 0, 'errors': [], 'last_line': 0}
+    items = []
+    line_numbers = []
+    # Rejections since the last commit; reported only once it succeeds
+    pending = []
+
+    def flush(line_number):
+        instances, errors = validate_logs(items)
+        for error in errors:
+            pending.append((line_numbers[error['index']], error['errors']))
+        result['accepted'] += len(save_logs(instances))
+        for rejected_line, detail in pending:
+            result['rejected'] += 1
+            if len(result['errors']) < max_errors:
+                result['errors'].append({'line': rejected_line, 'errors': detail})
+        result['last_line'] = line_number
+        items.clear()
+        line_numbers.clear()
+        pending.clear()
+
+    line_number = 0
+    try:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as exc:
+                pending.append((line_number, {'non_field_errors': [f'Invalid JSON: {exc}']}))
+                continue
+            items.append(item)
+            line_numbers.append(line_number)
+            if len(items) >= batch_size:
+                flush(line_number)
+        flush(line_number)
+    except Exception as exc:
+        logger.exception('NDJSON ingestion stopped after line %d', result['last_line'])
+        result['error'] = f'Ingestion stopped: {exc.__class__.__name__}; resend from line {result["last_line"] + 1}.'
+
+    result['errors_truncated'] = result['rejected'] > len(result['errors'])
+    return result
@@ -0,0 +1,73 @@
+"""
+In-process periodic maintenance jobs.
+
+Jobs run on a daemon thread in each web worker. On PostgreSQL a session
+advisory lock makes sure only one worker at a time actually does the work.
+"""
+import logging
+import threading
+import zlib
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Run ``func`` every ``interval`` seconds on a daemon thread.
+    """
+
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.lock_key = zlib.crc32(name.encode())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name=f'periodic-{self.name}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """Run the job unless another process holds its lock. Returns True if it ran."""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [self.lock_key])
+                if not cursor.fetchone()[0]:
+                    return False
+            try:
+                self.func()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [self.lock_key])
+            return True
+        self.func()
+        return True
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Periodic task %s failed', self.name)
+            finally:
+                connection.close()
+
+
+_tasks = {}
+_tasks_lock = threading.Lock()
+
+
+def schedule(name, func, interval):
+    """Start the named task once per process; later calls are no-ops."""
+    with _tasks_lock:
+        if name not in _tasks:
+            _tasks[name] = PeriodicTask(name, func, interval).start()
+        return _tasks[name]
@@ -0,0 +1,47 @@
+"""
+Rebuild traffic rollups from raw network logs.
+
+Usage:
+    python manage.py backfill_rollups               # everything
+    python manage.py backfill_rollups --days 7      # the last week
+    python manage.py backfill_rollups --since 2026-01-01 --until 2026-02-01
+"""
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.logs.rollups import backfill
+
+
+def _parse_moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date: {value}')
+        moment = datetime.combine(day, dt_time.min)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-minute and per-hour traffic rollups from network_logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days')
+        parser.add_argument('--since', help='Start date/time (ISO 8601)')
+        parser.add_argument('--until', help='End date/time (ISO 8601)')
+
+    def handle(self, *args, **options):
+        start = _parse_moment(options['since']) if options['since'] else None
+        end = _parse_moment(options['until']) if options['until'] else None
+        if options['days']:
+            start = timezone.now() - timedelta(days=options['days'])
+
+        started = time.monotonic()
+        written = backfill(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rollup bucket(s) in {time.monotonic() - started:.2f}s'
+        ))
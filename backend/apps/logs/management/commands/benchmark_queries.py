@@ -0,0 +1,263 @@
+"""
+Time the hot log and alert queries and show their plans.
+
+Run it against a scratch database before and after an index change, with
+the apps migrated back to just before the change for the first run:
+
+    python manage.py migrate logs 0004
+    python manage.py migrate alerts 0003
+    python manage.py benchmark_queries --generate 2000000 --output before.json
+    python manage.py migrate
+    python manage.py benchmark_queries --baseline before.json --explain
+
+Queries and generated rows only touch the columns of the initial schema
+(plus the NOT NULL alert columns when they exist), so it runs against
+every migration state. ``--generate`` appends a synthetic, append-only dataset (skewed source
+hosts, a realistic protocol and action mix, timestamps increasing with id)
+and VACUUM ANALYZEs it; do not use it on a production database.
+"""
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from apps.alerts.models import Alert
+from apps.logs.models import NetworkLog
+from apps.logs.partitions import ensure_partitions, is_partitioned
+
+
+# Columns present since the initial migrations; later ones may not exist yet
+LOG_COLUMNS = ('id', 'timestamp', 'src_ip', 'dst_ip', 'proto', 'packet_size', 'action', 'raw_json', 'created_at')
+ALERT_COLUMNS = (
+    'id', 'alert_type', 'severity', 'src_ip', 'dst_ip', 'status', 'message', 'metadata',
+    'resolved_by', 'resolved_at', 'timestamp', 'created_at',
+)
+
+
+def _queries(anchor, src_ip):
+    """(name, queryset) pairs mirroring the API and dashboard queries."""
+    hour = anchor - timedelta(hours=1)
+    logs = NetworkLog.objects.only(*LOG_COLUMNS)
+    alerts = Alert.objects.only(*ALERT_COLUMNS)
+    return [
+        ('latest_page', logs.order_by('-timestamp', '-id')[:50]),
+        ('recent_by_src_ip', logs.filter(src_ip=src_ip, timestamp__gte=hour).order_by('-timestamp')[:100]),
+        ('recent_by_proto', logs.filter(proto='ICMP', timestamp__gte=hour).order_by('-timestamp')[:100]),
+        ('src_ip_day_count', NetworkLog.objects.filter(src_ip=src_ip, timestamp__gte=anchor - timedelta(days=1))),
+        ('range_count', NetworkLog.objects.filter(
+            timestamp__gte=anchor - timedelta(days=3), timestamp__lt=anchor - timedelta(days=2)
+        )),
+        ('devices_online', NetworkLog.objects.filter(
+            timestamp__gte=anchor - timedelta(minutes=5)
+        ).values('src_ip').distinct()),
+        ('open_alerts_by_severity', alerts.filter(status='open', severity='high').order_by('-timestamp')[:50]),
+        ('open_alert_count', Alert.objects.filter(status='open')),
+    ]
+
+
+def _sql(queryset):
+    # Counting variants are measured as COUNT(*) the way the views run them
+    if queryset.query.low_mark or queryset.query.high_mark:
+        return queryset.query.sql_with_params()
+    if queryset.query.values_select:
+        inner, params = queryset.query.sql_with_params()
+        return f'SELECT count(*) FROM ({inner}) AS q', params
+    inner, params = queryset.order_by().values('pk').query.sql_with_params()
+    return f'SELECT count(*) FROM ({inner}) AS q', params
+
+
+def _plan_summary(plan, indexes=None, nodes=None):
+    """Scan node types and index names used anywhere in a JSON plan."""
+    indexes = set() if indexes is None else indexes
+    nodes = set() if nodes is None else nodes
+    nodes.add(plan['Node Type'])
+    if plan.get('Index Name'):
+        indexes.add(plan['Index Name'])
+    for child in plan.get('Plans', ()):
+        _plan_summary(child, indexes, nodes)
+    return indexes, nodes
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot network log and alert queries (EXPLAIN plans and timings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, default=0, help='Append this many synthetic logs first')
+        parser.add_argument('--days', type=int, default=7, help='Time span of the synthetic logs')
+        parser.add_argument('--hosts', type=int, default=2000, help='Distinct source hosts in the synthetic logs')
+        parser.add_argument('--runs', type=int, default=7, help='Timed runs per query (median is reported)')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN (ANALYZE, BUFFERS) for each query')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against results written earlier with --output')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('benchmark_queries needs PostgreSQL')
+        if options['generate']:
+            self._generate(options['generate'], options['days'], options['hosts'])
+
+        anchor = NetworkLog.objects.filter(timestamp__lte=timezone.now()).aggregate(latest=Max('timestamp'))['latest']
+        if anchor is None:
+            raise CommandError('network_logs is empty; use --generate')
+        # Filter on the busiest recent source, the case the dashboards drill into
+        busiest = NetworkLog.objects.filter(timestamp__gte=anchor - timedelta(hours=1)).values('src_ip').annotate(
+            rows=Count('id')
+        ).order_by('-rows').first()
+        parents = self._parent_indexes()
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['queries']
+
+        results = {'rows': NetworkLog.objects.count(), 'alerts': Alert.objects.count(), 'queries': {}}
+        self.stdout.write(f"{results['rows']:,} logs, {results['alerts']:,} alerts\n")
+        header = f"{'query':<26}{'median ms':>11}"
+        if baseline:
+            header += f"{'before ms':>11}{'speedup':>9}"
+        self.stdout.write(header + '  plan')
+
+        for name, queryset in _queries(anchor, busiest['src_ip']):
+            sql, params = _sql(queryset)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                timings = []
+                for _ in range(options['runs']):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            indexes, nodes = _plan_summary(plan[0]['Plan'])
+            indexes = {parents.get(index, index) for index in indexes}
+            median = statistics.median(timings)
+            results['queries'][name] = {
+                'median_ms': round(median, 3),
+                'indexes': sorted(indexes),
+                'nodes': sorted(nodes),
+                'shared_hit_blocks': plan[0]['Plan'].get('Shared Hit Blocks', 0),
+                'shared_read_blocks': plan[0]['Plan'].get('Shared Read Blocks', 0),
+            }
+            line = f'{name:<26}{median:>11.2f}'
+            if baseline:
+                before = baseline.get(name, {}).get('median_ms')
+                line += f'{before:>11.2f}{before / median:>8.1f}x' if before else f"{'-':>11}{'-':>9}"
+            scans = sorted(node for node in nodes if 'Scan' in node)
+            self.stdout.write(f"{line}  {', '.join(scans)} {', '.join(sorted(indexes))}")
+
+            if options['explain']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                    for (row,) in cursor.fetchall():
+                        self.stdout.write(f'    {row}')
+                self.stdout.write('')
+
+        results['index_sizes'] = self._index_sizes()
+        self.stdout.write('\nindex sizes:')
+        for index, size in results['index_sizes'].items():
+            self.stdout.write(f'  {index:<36}{size / 1024 / 1024:>9.1f} MB')
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+    def _generate(self, rows, days, hosts):
+        end = timezone.now()
+        start = end - timedelta(days=days)
+        if is_partitioned(connection):
+            ensure_partitions(now=start, ahead=days + 1)
+
+        self.stdout.write(f'Generating {rows:,} logs over {days} days...')
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            # pow(random(), 3) skews traffic towards a few busy hosts
+            cursor.execute(
+                f"""
+                INSERT INTO {NetworkLog._meta.db_table}
+                    (timestamp, src_ip, dst_ip, proto, packet_size, action, created_at)
+                SELECT
+                    %(start)s::timestamptz + (%(end)s::timestamptz - %(start)s::timestamptz) * g / %(rows)s,
+                    ('10.' || h / 65536 || '.' || h / 256 %% 256 || '.' || h %% 256)::inet,
+                    ('192.168.1.' || (1 + floor(random() * 254))::int)::inet,
+                    (ARRAY['TCP', 'TCP', 'TCP', 'TCP', 'UDP', 'UDP', 'HTTPS', 'HTTPS', 'HTTP', 'ICMP',
+                           'OTHER'])[1 + floor(random() * 11)::int],
+                    40 + floor(pow(random(), 2) * 1460)::int,
+                    CASE WHEN random() < 0.9 THEN 'allow' WHEN random() < 0.5 THEN 'block' ELSE 'drop' END,
+                    now()
+                FROM (
+                    SELECT g, floor(pow(random(), 3) * %(hosts)s)::int AS h
+                    FROM generate_series(1, %(rows)s) AS g
+                ) AS series
+                """,
+                {'start': start, 'end': end, 'rows': rows, 'hosts': hosts}
+            )
+            # About one alert per 50 logs, 5% of them still open; each seen once
+            # where the schema already counts occurrences
+            columns = {
+                column.name for column in
+                connection.introspection.get_table_description(cursor, Alert._meta.db_table)
+            }
+            seen_columns, seen_values = '', ''
+            if 'occurrences' in columns:
+                seen_columns, seen_values = ', occurrences, first_seen, last_seen', ', 1, stamp, stamp'
+            cursor.execute(
+                f"""
+                INSERT INTO {Alert._meta.db_table}
+                    (alert_type, severity, src_ip, status, message, timestamp, created_at{seen_columns})
+                SELECT
+                    (ARRAY['port_scan', 'brute_force', 'ddos', 'suspicious_traffic', 'other'])[1 + floor(random() * 5)::int],
+                    (ARRAY['low', 'medium', 'medium', 'high', 'critical'])[1 + floor(random() * 5)::int],
+                    ('10.0.' || (g %% 8) || '.' || (g %% 251))::inet,
+                    CASE WHEN random() < 0.05 THEN 'open' WHEN random() < 0.8 THEN 'resolved' ELSE 'ignored' END,
+                    'synthetic alert',
+                    stamp,
+                    now(){seen_values}
+                FROM (
+                    SELECT g, %(start)s::timestamptz + (%(end)s::timestamptz - %(start)s::timestamptz) * g / %(alerts)s
+                        AS stamp
+                    FROM generate_series(1, %(alerts)s) AS g
+                ) AS series
+                """,
+                {'start': start, 'end': end, 'alerts': max(rows // 50, 1)}
+            )
+            # VACUUM sets the visibility map, so index-only scans are measured fairly
+            cursor.execute(f'VACUUM ANALYZE {NetworkLog._meta.db_table}')
+            cursor.execute(f'VACUUM ANALYZE {Alert._meta.db_table}')
+        self.stdout.write(f'Generated in {time.perf_counter() - started:.1f}s\n')
+
+    def _parent_indexes(self):
+        """Map partition index names to the index declared on the parent table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname, parent.relname FROM pg_inherits i '
+                'JOIN pg_class child ON child.oid = i.inhrelid '
+                'JOIN pg_class parent ON parent.oid = i.inhparent '
+                "WHERE child.relkind = 'i'"
+            )
+            return dict(cursor.fetchall())
+
+    def _index_sizes(self):
+        with connection.cursor() as cursor:
+            # Partitioned indexes have no storage of their own; add up their partitions
+            cursor.execute(
+                """
+                SELECT parent.relname, sum(pg_relation_size(leaf.relid))
+                FROM pg_class parent
+                JOIN pg_index i ON i.indexrelid = parent.oid
+                JOIN pg_class tbl ON tbl.oid = i.indrelid
+                CROSS JOIN LATERAL pg_partition_tree(parent.oid) AS leaf
+                WHERE tbl.relname IN (%s, %s) AND leaf.isleaf
+                GROUP BY parent.relname
+                ORDER BY parent.relname
+                """,
+                [NetworkLog._meta.db_table, Alert._meta.db_table]
+            )
+            return {name: int(size) for name, size in cursor.fetchall()}
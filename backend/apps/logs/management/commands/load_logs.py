@@ -0,0 +1,165 @@
+"""
+Bulk-load network logs from NDJSON or CSV files.
+
+Usage:
+    python manage.py load_logs archive.ndjson.gz --batch-size 10000
+    python manage.py load_logs export.csv --benchmark --benchmark-output bench.json
+
+Imported traffic is historical, so it is not run through the streaming
+detectors: re-importing an archive raises no alerts (and blocks nobody).
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.alerts.dedup import reset_deduplicator
+from apps.alerts.detectors import reset_detectors
+from apps.firewall.autoblock import reset_auto_blocker
+from apps.logs.ingestion import validate_logs, save_logs
+
+# Column headers written by the settings export endpoint
+EXPORT_HEADERS = {
+    'Timestamp': 'timestamp',
+    'Source IP': 'src_ip',
+    'Destination IP': 'dst_ip',
+    'Protocol': 'proto',
+    'Packet Size': 'packet_size',
+    'Action': 'action',
+}
+
+
+class _Rollback(Exception):
+    """Raised to roll back benchmark inserts."""
+
+
+def _open_text(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _read_rows(path):
+    """Yield raw log dicts from an NDJSON or CSV file (optionally gzipped)."""
+    name = path[:-3] if path.endswith('.gz') else path
+    with _open_text(path) as handle:
+        if name.endswith('.csv'):
+            for row in csv.DictReader(handle):
+                yield {EXPORT_HEADERS.get(key, key): value for key, value in row.items()}
+        else:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Passed through as-is so validation rejects it with the rest
+                    yield line
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load network logs from NDJSON/CSV files using PostgreSQL COPY or ORM inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='NDJSON or CSV files (.gz allowed, - for stdin)')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.LOG_INGEST_COPY_BATCH_SIZE,
+            help='Rows validated and written per batch'
+        )
+        parser.add_argument(
+            '--backend', choices=['copy', 'orm'], default='copy',
+            help='Write path: COPY FROM STDIN (default) or ORM bulk_create'
+        )
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help='Time COPY against ORM inserts on the input and roll both back'
+        )
+        parser.add_argument(
+            '--benchmark-rows', type=int, default=50000,
+            help='Maximum rows used for --benchmark'
+        )
+        parser.add_argument('--benchmark-output', help='Write benchmark results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['benchmark']:
+            return self._benchmark(options)
+
+        loaded = rejected = 0
+        started = time.perf_counter()
+        for path in options['paths']:
+            row = 1
+            for batch in _batches(_read_rows(path), options['batch_size']):
+                instances, errors = validate_logs(batch, start=row)
+                loaded += len(save_logs(
+                    instances, broadcast=False, backend=options['backend'], detect=False
+                ))
+                rejected += len(errors)
+                for error in errors:
+                    self.stderr.write(f"{path}: row {error['index']}: {error['errors']}")
+                row += len(batch)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {loaded} logs ({rejected} rejected) in {elapsed:.2f}s '
+            f'[{options["backend"]}, {loaded / elapsed if elapsed else 0:.0f} rows/s]'
+        ))
+
+    def _benchmark(self, options):
+        rows = []
+        for path in options['paths']:
+            rows.extend(islice(_read_rows(path), options['benchmark_rows'] - len(rows)))
+        results = {'batch_size': options['batch_size'], 'backends': {}}
+        for backend in ('orm', 'copy'):
+            # Validate outside the timed section so only the write path is measured
+            instances, _ = validate_logs(rows)
+            if not instances:
+                raise CommandError('No valid rows to benchmark')
+            results['rows'] = len(instances)
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    for batch in _batches(instances, options['batch_size']):
+                        # Detector cost would skew the write path comparison
+                        save_logs(batch, broadcast=False, backend=backend, detect=False)
+                    raise _Rollback
+            except _Rollback:
+                pass
+            elapsed = time.perf_counter() - started
+            # In-process state must not point at rolled-back rows
+            reset_detectors()
+            reset_deduplicator()
+            reset_auto_blocker()
+            results['backends'][backend] = {
+                'seconds': round(elapsed, 4),
+                'rows_per_second': round(len(instances) / elapsed),
+            }
+            self.stdout.write(f'{backend:>5}: {elapsed:.3f}s  {len(instances) / elapsed:,.0f} rows/s')
+
+        speedup = results['backends']['orm']['seconds'] / results['backends']['copy']['seconds']
+        results['copy_speedup'] = round(speedup, 2)
+        self.stdout.write(self.style.SUCCESS(f'COPY is {speedup:.1f}x the ORM insert rate on {len(instances)} rows'))
+
+        if options['benchmark_output']:
+            with open(options['benchmark_output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
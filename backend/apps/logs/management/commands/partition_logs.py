@@ -0,0 +1,65 @@
+"""
+Maintain the time partitions of network_logs.
+
+Usage:
+    python manage.py partition_logs                 # create upcoming partitions
+    python manage.py partition_logs --drop-expired  # also drop partitions past log_retention_days
+    python manage.py partition_logs --list
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.logs.partitions import (
+    INTERVALS,
+    drop_expired_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+)
+from apps.settings.models import SystemSettings
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming network_logs partitions and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=settings.LOG_PARTITION_PREMAKE,
+            help='Number of future periods to create partitions for'
+        )
+        parser.add_argument(
+            '--interval', choices=INTERVALS, default=settings.LOG_PARTITION_INTERVAL,
+            help='Partition width for newly created partitions'
+        )
+        parser.add_argument(
+            '--drop-expired', action='store_true',
+            help='Detach and drop partitions older than log_retention_days'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be dropped')
+        parser.add_argument('--list', action='store_true', help='List partitions and exit')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('network_logs is not a partitioned table (PostgreSQL migration not applied?)')
+
+        if options['list']:
+            for name, start, end in list_partitions():
+                self.stdout.write(f'{name}  {start:%Y-%m-%d %H:%M} -> {end:%Y-%m-%d %H:%M}')
+            return
+
+        if not options['dry_run']:
+            created = ensure_partitions(ahead=options['ahead'], interval=options['interval'])
+            self.stdout.write(self.style.SUCCESS(f'Created {len(created)} partition(s): {", ".join(created) or "-"}'))
+
+        if options['drop_expired']:
+            retention_days = SystemSettings.load().log_retention_days
+            cutoff = timezone.now() - timedelta(days=retention_days)
+            dropped, partition_rows, deleted = drop_expired_partitions(cutoff, dry_run=options['dry_run'])
+            verb = 'Would drop' if options['dry_run'] else 'Dropped'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {len(dropped)} partition(s) older than {retention_days} days '
+                f'({", ".join(dropped) or "-"}, {partition_rows} row(s)) and {deleted} row(s) from the default partition'
+            ))
@@ -0,0 +1,33 @@
+"""
+Convert network_logs into a table range-partitioned by timestamp.
+
+PostgreSQL only; the model state does not change (Django still treats ``id``
+as the primary key, the database key becomes ``(id, timestamp)``).
+"""
+from django.conf import settings
+from django.db import migrations
+
+from apps.logs.partitions import partition_table, unpartition_table
+
+
+def forwards(apps, schema_editor):
+    partition_table(
+        schema_editor.connection,
+        interval=settings.LOG_PARTITION_INTERVAL,
+        ahead=settings.LOG_PARTITION_PREMAKE,
+        initial_days=settings.LOG_PARTITION_INITIAL_DAYS,
+    )
+
+
+def backwards(apps, schema_editor):
+    unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("logs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("logs", "0002_partition_network_logs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrafficRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("minute", "Minute"), ("hour", "Hour")], max_length=10
+                    ),
+                ),
+                ("bucket", models.DateTimeField(help_text="Start of the minute or hour (UTC)")),
+                (
+                    "proto",
+                    models.CharField(
+                        choices=[
+                            ("TCP", "TCP"),
+                            ("UDP", "UDP"),
+                            ("ICMP", "ICMP"),
+                            ("HTTP", "HTTP"),
+                            ("HTTPS", "HTTPS"),
+                            ("OTHER", "OTHER"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("allow", "Allow"), ("block", "Block"), ("drop", "Drop")],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+                ("bytes", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "db_table": "traffic_rollups",
+                "ordering": ["-bucket"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="trafficrollup",
+            constraint=models.UniqueConstraint(
+                fields=("granularity", "bucket", "proto", "action"),
+                name="traffic_rollup_bucket_unique",
+            ),
+        ),
+    ]
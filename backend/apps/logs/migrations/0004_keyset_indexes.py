@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("logs", "0003_traffic_rollups"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="networklog",
+            name="network_log_timesta_bb9a45_idx",
+        ),
+        migrations.AddIndex(
+            model_name="networklog",
+            index=models.Index(fields=["timestamp", "id"], name="network_logs_timestamp_id_idx"),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:53
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("logs", "0004_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="networklog",
+            name="network_log_src_ip_b70823_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="networklog",
+            name="network_log_dst_ip_984acb_idx",
+        ),
+        migrations.AlterField(
+            model_name="networklog",
+            name="dst_ip",
+            field=models.GenericIPAddressField(),
+        ),
+        migrations.AlterField(
+            model_name="networklog",
+            name="src_ip",
+            field=models.GenericIPAddressField(),
+        ),
+        migrations.AlterField(
+            model_name="networklog",
+            name="timestamp",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="networklog",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["timestamp"], name="network_logs_timestamp_brin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networklog",
+            index=models.Index(fields=["src_ip", "timestamp"], name="network_logs_src_ip_ts_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="networklog",
+            index=models.Index(fields=["dst_ip", "timestamp"], name="network_logs_dst_ip_ts_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="networklog",
+            index=models.Index(fields=["proto", "timestamp"], name="network_logs_proto_ts_idx"),
+        ),
+    ]
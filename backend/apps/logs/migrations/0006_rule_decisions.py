@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("firewall", "0001_initial"),
+        ("logs", "0005_time_series_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networklog",
+            name="matched_rule",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="firewall.firewallrule",
+            ),
+        ),
+        migrations.AddField(
+            model_name="networklog",
+            name="rule_action",
+            field=models.CharField(
+                blank=True,
+                choices=[("allow", "Allow"), ("block", "Block"), ("drop", "Drop")],
+                help_text="Action the dashboard rules (or the default action) decided at ingestion",
+                max_length=10,
+                null=True,
+            ),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -23,26 +24,85 @@ class NetworkLog(models.Model):
         ('drop', 'Drop'),
     ]
     
-    timestamp = models.DateTimeField(db_index=True)
-    src_ip = models.GenericIPAddressField(db_index=True)
-    dst_ip = models.GenericIPAddressField(db_index=True)
+    timestamp = models.DateTimeField()
+    src_ip = models.GenericIPAddressField()
+    dst_ip = models.GenericIPAddressField()
     proto = models.CharField(max_length=10, choices=PROTO_CHOICES)
     packet_size = models.IntegerField()
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     raw_json = models.JSONField(null=True, blank=True, help_text='Additional raw log data')
+    # Set when LOG_INGEST_EVALUATE_RULES is on (see apps.logs.ingestion.evaluate_rules)
+    rule_action = models.CharField(
+        max_length=10, choices=ACTION_CHOICES, null=True, blank=True,
+        help_text='Action the dashboard rules (or the default action) decided at ingestion'
+    )
+    matched_rule = models.ForeignKey(
+        'firewall.FirewallRule', null=True, blank=True, related_name='+',
+        # No constraint or index: inserts stay cheap and deleting a rule never touches logs
+        on_delete=models.DO_NOTHING, db_constraint=False, db_index=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'network_logs'
         ordering = ['-timestamp', '-created_at']
         indexes = [
-            models.Index(fields=['timestamp']),
-            models.Index(fields=['src_ip']),
-            models.Index(fields=['dst_ip']),
+            # Rows arrive in timestamp order, so a BRIN index answers time
+            # range scans (exports, rollup backfills, retention) at a tiny size
+            BrinIndex(fields=['timestamp'], name='network_logs_timestamp_brin'),
+            # Keyset pagination order (see apps.logs.pagination)
+            models.Index(fields=['timestamp', 'id'], name='network_logs_timestamp_id_idx'),
+            # "Recent traffic from/to/over X" filters
+            models.Index(fields=['src_ip', 'timestamp'], name='network_logs_src_ip_ts_idx'),
+            models.Index(fields=['dst_ip', 'timestamp'], name='network_logs_dst_ip_ts_idx'),
+            models.Index(fields=['proto', 'timestamp'], name='network_logs_proto_ts_idx'),
         ]
     
     def __str__(self):
         return f"{self.src_ip} -> {self.dst_ip} ({self.proto}) - {self.action}"
+    
+    @property
+    def dst_port(self):
+        """Destination port from ``raw_json`` (``dst_port`` or ``port``), when the agent sent one."""
+        if isinstance(self.raw_json, dict):
+            port = self.raw_json.get('dst_port', self.raw_json.get('port'))
+            if isinstance(port, int) and not isinstance(port, bool):
+                return port
+            if isinstance(port, str) and port.isdigit():
+                return int(port)
+        return None
+
+
+class TrafficRollup(models.Model):
+    """
+    Pre-aggregated traffic per time bucket, protocol and action.
+    Kept up to date as logs are ingested (see apps.logs.rollups), so
+    dashboards read a handful of buckets instead of scanning raw logs.
+    """
+    GRANULARITY_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+    ]
+    
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField(help_text='Start of the minute or hour (UTC)')
+    proto = models.CharField(max_length=10, choices=NetworkLog.PROTO_CHOICES)
+    action = models.CharField(max_length=10, choices=NetworkLog.ACTION_CHOICES)
+    count = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'traffic_rollups'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket', 'proto', 'action'],
+                name='traffic_rollup_bucket_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket:%Y-%m-%d %H:%M} {self.proto}/{self.action}: {self.count}"
 
 
 
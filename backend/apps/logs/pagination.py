@@ -0,0 +1,210 @@
+"""
+Keyset (cursor) pagination on ``(timestamp, id)``.
+
+Pages are selected with ``(timestamp, id) < (last timestamp, last id)``
+against the composite ``(timestamp, id)`` index instead of OFFSET, and no
+COUNT is run, so every page costs about the same as the first. Cursors are
+opaque base64 tokens carried in the ``next`` / ``previous`` links.
+
+Requests that pass ``?page=`` or order by something other than timestamp
+fall back to page-number pagination, so existing clients keep working.
+That fallback (and the admin changelist) counts with PostgreSQL planner
+estimates once results reach ``ESTIMATED_COUNT_THRESHOLD`` rows, and says
+so with ``count_estimated``.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    PostgreSQL's row estimate for ``queryset``, or None when there is none
+    (other databases, never-analyzed tables).
+
+    Unfiltered querysets read ``reltuples`` of the table and its partitions;
+    filtered ones take the top-level row estimate from EXPLAIN.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                # After ANALYZE a partitioned parent also holds the total; count the partitions only
+                "SELECT sum(c.reltuples) FILTER (WHERE c.reltuples >= 0) FROM pg_class c "
+                "WHERE (c.oid = %s::regclass AND c.relkind <> 'p') "
+                "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                [queryset.model._meta.db_table] * 2
+            )
+            estimate = cursor.fetchone()[0]
+        else:
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]['Plan']['Plan Rows']
+    return None if estimate is None else int(estimate)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reports the planner's estimate as ``count`` when it is at
+    least ``ESTIMATED_COUNT_THRESHOLD`` rows; smaller results are counted
+    exactly. ``count_estimated`` tells which one was used.
+    """
+    count_estimated = False
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= settings.ESTIMATED_COUNT_THRESHOLD:
+                self.count_estimated = True
+                return estimate
+        return Paginator.count.func(self)
+
+
+class EstimatedCountPageNumberPagination(PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_estimated', self.page.paginator.count_estimated),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_estimated'] = {'type': 'boolean'}
+        return response_schema
+
+
+class TimestampKeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    fallback_class = EstimatedCountPageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        first = ordering[0] if ordering else None
+        if self.fallback_class.page_query_param in request.query_params or first not in ('timestamp', '-timestamp'):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.descending = first == '-timestamp'
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        backwards = cursor is not None and cursor['reverse']
+
+        # Walk the index in the requested direction; backwards pages read the
+        # opposite way from the cursor and are flipped afterwards
+        descending = self.descending != backwards
+        sign = '-' if descending else ''
+        queryset = queryset.order_by(f'{sign}timestamp', f'{sign}id')
+        if cursor is not None:
+            queryset = self._beyond(queryset, cursor['timestamp'], cursor['id'], descending)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if backwards:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = results
+        return results
+
+    def _beyond(self, queryset, timestamp, pk, descending):
+        """Rows strictly after ``(timestamp, pk)`` in the given direction."""
+        if descending:
+            return queryset.filter(timestamp__lte=timestamp).filter(Q(timestamp__lt=timestamp) | Q(id__lt=pk))
+        return queryset.filter(timestamp__gte=timestamp).filter(Q(timestamp__gt=timestamp) | Q(id__gt=pk))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            cursor = {
+                'timestamp': parse_datetime(data['t']),
+                'id': int(data['i']),
+                'reverse': bool(data.get('r')),
+                'descending': bool(data['d']),
+            }
+        except (binascii.Error, TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['timestamp'] is None or cursor['descending'] != self.descending:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, item, reverse):
+        data = {'t': item.timestamp.isoformat(), 'i': item.pk, 'd': int(self.descending)}
+        if reverse:
+            data['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.fallback_class.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Stepped past the end: the previous page is simply the first one
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
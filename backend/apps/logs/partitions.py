@@ -0,0 +1,288 @@
+"""
+Native PostgreSQL range partitioning of ``network_logs`` by timestamp.
+
+The table is split into day or week partitions named
+``network_logs_pYYYYMMDD`` (after the first day they cover) plus a
+``network_logs_default`` partition that catches rows outside every range,
+e.g. archives loaded after their partitions were dropped. Retention drops
+whole partitions instead of running DELETEs.
+
+Everything here is a no-op on databases other than PostgreSQL.
+"""
+import re
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.utils.dateparse import parse_datetime
+
+TABLE = 'network_logs'
+DEFAULT_PARTITION = f'{TABLE}_default'
+INTERVALS = ('day', 'week')
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def is_partitioned(connection=default_connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt '
+            'JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid))',
+            [TABLE]
+        )
+        return cursor.fetchone()[0]
+
+
+def period_start(moment, interval):
+    """Start (UTC midnight, Monday for weeks) of the period containing ``moment``."""
+    day = moment.astimezone(dt_timezone.utc).date()
+    if interval == 'week':
+        day -= timedelta(days=day.weekday())
+    return datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def period_end(start, interval):
+    return start + (timedelta(weeks=1) if interval == 'week' else timedelta(days=1))
+
+
+def partition_name(start):
+    return f'{TABLE}_p{start:%Y%m%d}'
+
+
+def list_partitions(connection=default_connection):
+    """
+    Return ``(name, start, end)`` for every range partition, oldest first.
+    The default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s AND pg_table_is_visible(p.oid)',
+            [TABLE]
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound or '')
+        if match:
+            partitions.append((name, parse_datetime(match.group(1)), parse_datetime(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(start, end, connection=default_connection):
+    """
+    Create and attach the partition for ``[start, end)``.
+
+    Rows for that range that already landed in the default partition are
+    moved into the new partition first, otherwise ATTACH would fail.
+    """
+    name = partition_name(start)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+    return name
+
+
+def ensure_partitions(now=None, ahead=None, interval=None, connection=default_connection):
+    """
+    Make sure the current period and the next ``ahead`` periods have
+    partitions. Returns the names of the partitions created.
+    """
+    if not is_partitioned(connection):
+        return []
+    now = now or datetime.now(dt_timezone.utc)
+    ahead = settings.LOG_PARTITION_PREMAKE if ahead is None else ahead
+    interval = interval or settings.LOG_PARTITION_INTERVAL
+
+    existing = list_partitions(connection)
+    created = []
+    start = period_start(now, interval)
+    for _ in range(ahead + 1):
+        end = period_end(start, interval)
+        # Skip ranges already covered, even if by partitions of another interval
+        if not any(p_start < end and start < p_end for _, p_start, p_end in existing):
+            created.append(create_partition(start, end, connection))
+        start = end
+    return created
+
+
+def drop_expired_partitions(cutoff, dry_run=False, batch_size=None, sleep_seconds=None,
+                            connection=default_connection):
+    """
+    Detach and drop every partition that ends at or before ``cutoff`` and
+    delete older rows from the default partition, ``batch_size`` rows per
+    statement with a pause between batches (``RETENTION_BATCH_SIZE`` and
+    ``RETENTION_BATCH_SLEEP_SECONDS`` by default).
+
+    Returns ``(dropped partition names, rows in them, rows deleted from the
+    default partition)``; with ``dry_run`` nothing is dropped and the counts
+    are what would go.
+    """
+    if not is_partitioned(connection):
+        return [], 0, 0
+    expired = [name for name, _, end in list_partitions(connection) if end <= cutoff]
+    if dry_run:
+        with connection.cursor() as cursor:
+            partition_rows = 0
+            for name in expired:
+                cursor.execute(f'SELECT count(*) FROM {name}')
+                partition_rows += cursor.fetchone()[0]
+            cursor.execute(f'SELECT count(*) FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s', [cutoff])
+            return expired, partition_rows, cursor.fetchone()[0]
+
+    partition_rows = 0
+    for name in expired:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            # Detached and locked, so the count is exactly what gets dropped
+            cursor.execute(f'SELECT count(*) FROM {name}')
+            partition_rows += cursor.fetchone()[0]
+            cursor.execute(f'DROP TABLE {name}')
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    sleep_seconds = settings.RETENTION_BATCH_SLEEP_SECONDS if sleep_seconds is None else sleep_seconds
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {DEFAULT_PARTITION} WHERE ctid = ANY(ARRAY('
+                f'SELECT ctid FROM {DEFAULT_PARTITION} WHERE "timestamp" < %s LIMIT %s))',
+                [cutoff, batch_size]
+            )
+            rows = cursor.rowcount
+        deleted += rows
+        if rows < batch_size:
+            return expired, partition_rows, deleted
+        time.sleep(sleep_seconds)
+
+
+def maintain_partitions():
+    """
+    Periodic job: create upcoming partitions and drop the ones that fall
+    outside ``SystemSettings.log_retention_days``.
+    """
+    from apps.settings.models import SystemSettings
+
+    ensure_partitions()
+    retention_days = SystemSettings.load().log_retention_days
+    drop_expired_partitions(datetime.now(dt_timezone.utc) - timedelta(days=retention_days))
+
+
+def _index_definitions(cursor, table):
+    """CREATE INDEX statements for every non-primary-key index on ``table``."""
+    cursor.execute(
+        'SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i '
+        'JOIN pg_class c ON c.oid = i.indrelid '
+        'WHERE c.relname = %s AND pg_table_is_visible(c.oid) AND NOT i.indisprimary',
+        [table]
+    )
+    # Partitioned parents report "ON ONLY"; plain CREATE INDEX cascades to partitions
+    return [definition.replace(' ON ONLY ', ' ON ') for (definition,) in cursor.fetchall()]
+
+
+def _swap_in_copy(cursor, create_sql, primary_key):
+    """
+    Rename ``network_logs`` aside and create its replacement from
+    ``create_sql`` (which may reference the old table as ``{old}``), keeping
+    the id sequence position. Returns the old table name and its index
+    definitions; the caller copies rows, drops the old table and re-creates
+    the indexes.
+    """
+    old = f'{TABLE}_old'
+    indexes = _index_definitions(cursor, TABLE)
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [old]
+    )
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {constraint} TO {old}_pkey')
+
+    cursor.execute(create_sql.format(old=old))
+    cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY ({primary_key})')
+    cursor.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'", [old]
+    )
+    if cursor.fetchone()[0]:
+        # Identity columns get a fresh sequence; continue after the existing ids
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"COALESCE((SELECT max(id) FROM {old}), 0) + 1, false)",
+            [TABLE]
+        )
+    else:
+        # serial column: hand the shared sequence over before the old table goes
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id')
+    return old, indexes
+
+
+def partition_table(connection, interval, ahead, initial_days):
+    """
+    Convert the plain ``network_logs`` table into a partitioned one.
+
+    Range partitions are created from ``initial_days`` back (or the oldest
+    row, if newer) up to ``ahead`` periods in the future; older rows go to
+    the default partition.
+    """
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return
+    now = datetime.now(dt_timezone.utc)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min("timestamp") FROM {TABLE}')
+        oldest = cursor.fetchone()[0] or now
+        old, indexes = _swap_in_copy(
+            cursor,
+            f'CREATE TABLE {TABLE} (LIKE {{old}} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ("timestamp")',
+            'id, "timestamp"',
+        )
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+
+        start = period_start(max(oldest, now - timedelta(days=initial_days)), interval)
+        horizon = period_end(period_start(now, interval), interval)
+        for _ in range(ahead):
+            horizon = period_end(horizon, interval)
+        while start < horizon:
+            end = period_end(start, interval)
+            cursor.execute(
+                f'CREATE TABLE {partition_name(start)} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [start, end]
+            )
+            start = end
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def unpartition_table(connection):
+    """Fold a partitioned ``network_logs`` back into a single plain table."""
+    if not is_partitioned(connection):
+        return
+    with connection.cursor() as cursor:
+        old, indexes = _swap_in_copy(
+            cursor,
+            f'CREATE TABLE {TABLE} (LIKE {{old}} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)',
+            'id',
+        )
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+        cursor.execute(f'DROP TABLE {old} CASCADE')
+        for definition in indexes:
+            cursor.execute(definition)
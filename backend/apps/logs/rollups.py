@@ -0,0 +1,175 @@
+"""
+Incrementally maintained traffic rollups.
+
+Every ingestion path calls ``record()`` with the logs it just saved; counts
+and bytes are added to per-minute and per-hour ``TrafficRollup`` buckets
+with one upsert. The log API's updates and deletes call ``forget()`` for
+the old rows, in the same transaction. ``window()`` answers time-range questions from the
+buckets, using hours for whole hours and minutes at the edges, so the cost
+follows the number of buckets in the window rather than the number of logs.
+
+Logs written any other way (``NetworkLog.objects.create``, the admin, raw
+SQL) and logs deleted outside retention and the API are not reflected
+until ``backfill()`` (``manage.py backfill_rollups``) rebuilds the range.
+Retention drops minute buckets with the logs but keeps hour buckets, so
+long-range totals still count purged logs (see ``includes_purged()``).
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import NetworkLog, TrafficRollup
+
+GRANULARITIES = ('minute', 'hour')
+
+
+def floor_minute(moment):
+    return moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+
+
+def floor_hour(moment):
+    return floor_minute(moment).replace(minute=0)
+
+
+def _upsert(counters, additive):
+    """
+    Write ``{(granularity, bucket, proto, action): [count, bytes]}``.
+
+    ``additive`` adds to existing buckets (ingestion); otherwise buckets
+    are overwritten (backfill). Keys are written in sorted order so
+    concurrent writers lock rows in the same order.
+    """
+    if not counters:
+        return
+    table = TrafficRollup._meta.db_table
+    if additive:
+        update = f'count = {table}.count + EXCLUDED.count, bytes = {table}.bytes + EXCLUDED.bytes'
+    else:
+        update = 'count = EXCLUDED.count, bytes = EXCLUDED.bytes'
+    rows = sorted(counters.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            params = []
+            for (granularity, bucket, proto, action), (count, size) in chunk:
+                params.extend([
+                    granularity, connection.ops.adapt_datetimefield_value(bucket), proto, action, count, size
+                ])
+            cursor.execute(
+                f'INSERT INTO {table} (granularity, bucket, proto, action, count, bytes) VALUES '
+                + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+                + f' ON CONFLICT (granularity, bucket, proto, action) DO UPDATE SET {update}',
+                params
+            )
+
+
+def _counters(logs, sign):
+    counters = defaultdict(lambda: [0, 0])
+    for log in logs:
+        minute = floor_minute(log.timestamp)
+        for key in (
+            ('minute', minute, log.proto, log.action),
+            ('hour', minute.replace(minute=0), log.proto, log.action),
+        ):
+            counter = counters[key]
+            counter[0] += sign
+            counter[1] += sign * log.packet_size
+    return counters
+
+
+def record(logs):
+    """Add freshly saved logs to their minute and hour buckets."""
+    _upsert(_counters(logs, 1), additive=True)
+
+
+def forget(logs):
+    """Take logs about to be changed or deleted out of their buckets."""
+    counters = _counters(logs, -1)
+    _upsert(counters, additive=True)
+    # Buckets emptied (or never built, if the logs predate the rollups)
+    TrafficRollup.objects.filter(
+        bucket__in={bucket for _, bucket, _, _ in counters}, count__lte=0
+    ).delete()
+
+
+def includes_purged(buckets):
+    """
+    Whether ``buckets`` (from ``window()``) include hours before the oldest
+    remaining log, i.e. counts of logs since purged by retention.
+    """
+    oldest = NetworkLog.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None:
+        return buckets.exists()
+    return buckets.filter(bucket__lt=floor_hour(oldest)).exists()
+
+
+def backfill(start=None, end=None):
+    """
+    Rebuild the buckets between ``start`` and ``end`` from raw logs, one day
+    at a time. The range is widened to whole hours so every bucket written
+    is complete, and each day's buckets are replaced in one transaction, so
+    buckets whose logs were deleted go away too. Nothing before the oldest
+    log is touched: hourly rollups outlive the logs they were built from.
+    Returns the number of buckets written.
+    """
+    bounds = NetworkLog.objects.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+    if bounds['first'] is None:
+        return 0
+    last = max(
+        bounds['last'], TrafficRollup.objects.aggregate(last=Max('bucket'))['last'] or bounds['last']
+    )
+    start = floor_hour(max(start, bounds['first']) if start else bounds['first'])
+    end = floor_hour(min(end, last) if end else last) + timedelta(hours=1)
+
+    written = 0
+    while start < end:
+        chunk_end = min(start + timedelta(days=1), end)
+        logs = NetworkLog.objects.filter(timestamp__gte=start, timestamp__lt=chunk_end)
+        counters = {}
+        for granularity in GRANULARITIES:
+            rows = (
+                logs.annotate(bucket=Trunc('timestamp', granularity, tzinfo=dt_timezone.utc))
+                .values('bucket', 'proto', 'action')
+                .annotate(count=Count('id'), bytes=Sum('packet_size'))
+                .order_by()
+            )
+            for row in rows:
+                counters[(granularity, row['bucket'], row['proto'], row['action'])] = [row['count'], row['bytes']]
+        with transaction.atomic():
+            TrafficRollup.objects.filter(bucket__gte=start, bucket__lt=chunk_end).delete()
+            _upsert(counters, additive=False)
+        written += len(counters)
+        start = chunk_end
+    return written
+
+
+def window(start=None, end=None):
+    """
+    Rollup rows covering ``[start, end)`` at minute precision.
+
+    Whole hours are read from hour buckets and the partial hours at either
+    end from minute buckets, so no log is counted twice.
+    """
+    end = floor_minute(end or timezone.now()) + timedelta(minutes=1)
+    last_hour = floor_hour(end)
+    if start is None:
+        return TrafficRollup.objects.filter(
+            Q(granularity='hour', bucket__lt=last_hour)
+            | Q(granularity='minute', bucket__gte=last_hour, bucket__lt=end)
+        )
+
+    start = floor_minute(start)
+    first_hour = floor_hour(start)
+    if first_hour < start:
+        first_hour += timedelta(hours=1)
+    if first_hour >= last_hour:
+        return TrafficRollup.objects.filter(granularity='minute', bucket__gte=start, bucket__lt=end)
+    return TrafficRollup.objects.filter(
+        Q(granularity='hour', bucket__gte=first_hour, bucket__lt=last_hour)
+        | Q(granularity='minute', bucket__gte=start, bucket__lt=first_hour)
+        | Q(granularity='minute', bucket__gte=last_hour, bucket__lt=end)
+    )
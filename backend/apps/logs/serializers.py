@@ -6,7 +6,7 @@ class NetworkLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = NetworkLog
         fields = '__all__'
-        read_only_fields = ('created_at',)
+        read_only_fields = ('created_at', 'rule_action', 'matched_rule')
     
     def validate(self, data):
         # Ensure timestamp is provided
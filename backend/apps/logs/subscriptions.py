@@ -0,0 +1,145 @@
+"""
+Server-side filters for the live log stream.
+
+A client sends ``{"type": "subscribe", "filters": {...}}`` on ``ws/logs/``.
+The filters are compiled once per connection into a ``LogFilter`` whose
+``matches()`` is then run on every event before it is serialized.
+"""
+import ipaddress
+
+from .models import NetworkLog
+
+PROTOCOLS = {choice for choice, _ in NetworkLog.PROTO_CHOICES}
+ACTIONS = {choice for choice, _ in NetworkLog.ACTION_CHOICES}
+
+
+def _choice_set(value, allowed, name):
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(item, str) for item in values):
+        raise ValueError(f'{name} must be a string or a non-empty list of strings')
+    unknown = set(values) - allowed
+    if unknown:
+        raise ValueError(f'Unknown {name}: {", ".join(sorted(map(str, unknown)))}')
+    return frozenset(values)
+
+
+def _ip(value, name):
+    if not isinstance(value, str):
+        raise ValueError(f'{name} must be an IP address')
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        raise ValueError(f'{name} must be an IP address')
+
+
+def _networks(value, name):
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(item, str) for item in values):
+        raise ValueError(f'{name} must be a CIDR string or a non-empty list of strings')
+    try:
+        return tuple(ipaddress.ip_network(cidr, strict=False) for cidr in values)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must contain valid CIDRs')
+
+
+class LogFilter:
+    """
+    Compiled subscription filter. Every given criterion must match.
+
+    Supported keys: ``proto`` and ``action`` (value or list), ``src_ip`` and
+    ``dst_ip`` (exact address), ``cidr`` (either end inside any of the
+    networks), ``src_cidr``/``dst_cidr`` and ``min_packet_size``.
+    """
+    __slots__ = ('proto', 'action', 'src_ip', 'dst_ip', 'cidr', 'src_cidr', 'dst_cidr', 'min_packet_size')
+
+    def __init__(self, proto=None, action=None, src_ip=None, dst_ip=None,
+                 cidr=None, src_cidr=None, dst_cidr=None, min_packet_size=None):
+        self.proto = proto
+        self.action = action
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.cidr = cidr
+        self.src_cidr = src_cidr
+        self.dst_cidr = dst_cidr
+        self.min_packet_size = min_packet_size
+
+    @classmethod
+    def compile(cls, filters):
+        """
+        Build a filter from a client's subscription dict.
+        Raises ValueError with a client-facing message on bad input.
+        """
+        if not isinstance(filters, dict):
+            raise ValueError('filters must be an object')
+        unknown = set(filters) - set(cls.__slots__)
+        if unknown:
+            raise ValueError(f'Unknown filters: {", ".join(sorted(unknown))}')
+
+        # Empty values ("" from a cleared form field) mean "no filter"
+        filters = {key: value for key, value in filters.items() if value not in (None, '', [])}
+        compiled = {}
+        if 'proto' in filters:
+            compiled['proto'] = _choice_set(filters['proto'], PROTOCOLS, 'proto')
+        if 'action' in filters:
+            compiled['action'] = _choice_set(filters['action'], ACTIONS, 'action')
+        for key in ('src_ip', 'dst_ip'):
+            if key in filters:
+                compiled[key] = _ip(filters[key], key)
+        for key in ('cidr', 'src_cidr', 'dst_cidr'):
+            if key in filters:
+                compiled[key] = _networks(filters[key], key)
+        if 'min_packet_size' in filters:
+            try:
+                compiled['min_packet_size'] = int(filters['min_packet_size'])
+            except (TypeError, ValueError):
+                raise ValueError('min_packet_size must be an integer')
+        return cls(**compiled)
+
+    def is_empty(self):
+        return all(getattr(self, name) is None for name in self.__slots__)
+
+    def describe(self):
+        """JSON-friendly view of the compiled filter, echoed back to the client."""
+        described = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if isinstance(value, frozenset):
+                value = sorted(value)
+            elif isinstance(value, tuple):
+                value = [str(network) for network in value]
+            described[name] = value
+        return described
+
+    def matches(self, log):
+        """Check a serialized log dict against every configured criterion."""
+        if self.proto is not None and log.get('proto') not in self.proto:
+            return False
+        if self.action is not None and log.get('action') not in self.action:
+            return False
+        if self.src_ip is not None and log.get('src_ip') != self.src_ip:
+            return False
+        if self.dst_ip is not None and log.get('dst_ip') != self.dst_ip:
+            return False
+        if self.min_packet_size is not None and (log.get('packet_size') or 0) < self.min_packet_size:
+            return False
+        if self.cidr is None and self.src_cidr is None and self.dst_cidr is None:
+            return True
+
+        try:
+            src = ipaddress.ip_address(log.get('src_ip'))
+            dst = ipaddress.ip_address(log.get('dst_ip'))
+        except ValueError:
+            return False
+        if self.src_cidr is not None and not _in_any(src, self.src_cidr):
+            return False
+        if self.dst_cidr is not None and not _in_any(dst, self.dst_cidr):
+            return False
+        if self.cidr is not None and not (_in_any(src, self.cidr) or _in_any(dst, self.cidr)):
+            return False
+        return True
+
+
+def _in_any(address, networks):
+    return any(address.version == network.version and address in network for network in networks)
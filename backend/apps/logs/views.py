@@ -1,15 +1,44 @@
+import copy
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.conf import settings
+from django.db import transaction
 from .models import NetworkLog
 from .serializers import NetworkLogSerializer
+from .ingestion import validate_logs, save_logs, ingest_ndjson, evaluate_rules
+from .buffer import get_buffer, buffer_stats
+from .pagination import TimestampKeysetPagination
+from . import rollups
+from apps.alerts.detectors import observe_logs
 from apps.authentication.permissions import IsAdminOrReadOnly
+from apps.dashboard.metrics import timed_publish
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 
+def _request_body_stream(request):
+    """
+    Return the raw request body as a readable stream, without buffering it.
+    """
+    django_request = request._request
+    if not django_request.META.get('CONTENT_LENGTH') and django_request.META.get('wsgi.input_terminated'):
+        # Chunked upload passed straight through by the server (e.g. gunicorn):
+        # Django only exposes a Content-Length bounded stream, so read the input directly.
+        return django_request.META['wsgi.input']
+    return django_request
+
+
+def _buffer_full_response():
+    return Response(
+        {'detail': 'Ingestion queue is full, retry shortly.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'}
+    )
+
+
 class NetworkLogViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing network logs.
@@ -22,6 +51,30 @@ class NetworkLogViewSet(viewsets.ModelViewSet):
     search_fields = ['src_ip', 'dst_ip']
     ordering_fields = ['timestamp', 'created_at', 'packet_size']
     ordering = ['-timestamp']
+    pagination_class = TimestampKeysetPagination
+    
+    def perform_create(self, serializer):
+        decision = {}
+        if settings.LOG_INGEST_EVALUATE_RULES:
+            log = evaluate_rules([NetworkLog(**serializer.validated_data)])[0]
+            decision = {'rule_action': log.rule_action, 'matched_rule_id': log.matched_rule_id}
+        with transaction.atomic():
+            log = serializer.save(**decision)
+            rollups.record([log])
+        observe_logs([log])
+    
+    def perform_update(self, serializer):
+        # save() changes the instance in place; keep the old values
+        old = copy.copy(serializer.instance)
+        with transaction.atomic():
+            rollups.forget([old])
+            log = serializer.save()
+            rollups.record([log])
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            rollups.forget([instance])
+            instance.delete()
     
     def create(self, request, *args, **kwargs):
         """
@@ -29,21 +82,102 @@ class NetworkLogViewSet(viewsets.ModelViewSet):
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        
+        if settings.LOG_INGEST_WRITE_BEHIND:
+            if not get_buffer().offer([NetworkLog(**serializer.validated_data)]):
+                return _buffer_full_response()
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        
         self.perform_create(serializer)
         
         # Broadcast to WebSocket clients
         channel_layer = get_channel_layer()
         if channel_layer:
-            async_to_sync(channel_layer.group_send)(
-                'logs',
-                {
-                    'type': 'log_message',
-                    'message': serializer.data
-                }
-            )
+            with timed_publish('logs'):
+                async_to_sync(channel_layer.group_send)(
+                    'logs',
+                    {
+                        'type': 'log_message',
+                        'message': serializer.data
+                    }
+                )
         
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Ingest a JSON array of logs with one bulk insert and one broadcast.
+        Invalid items are skipped and reported by their index in the array.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a JSON array of logs.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_size = settings.LOG_INGEST_MAX_BATCH_SIZE
+        if len(items) > max_size:
+            return Response(
+                {'detail': f'Batch too large; send at most {max_size} logs per request.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        instances, errors = validate_logs(items)
+        
+        if settings.LOG_INGEST_WRITE_BEHIND:
+            if not get_buffer().offer(instances):
+                return _buffer_full_response()
+            return Response({
+                'queued': len(instances),
+                'rejected': len(errors),
+                'errors': errors,
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        created = save_logs(instances)
+        
+        response_status = status.HTTP_400_BAD_REQUEST if errors and not created else status.HTTP_201_CREATED
+        return Response({
+            'created': len(created),
+            'rejected': len(errors),
+            'errors': errors,
+        }, status=response_status)
+    
+    @action(detail=False, methods=['post'])
+    def stream(self, request):
+        """
+        Ingest a (possibly chunked) application/x-ndjson upload line by line.
+        Rows are written in fixed-size micro-batches as the body arrives;
+        rejected rows are reported by line number so agents can resume.
+        A failed save or read answers 503 with the committed part of the
+        result and an ``error``.
+        """
+        if request.content_type.split(';')[0].strip() != 'application/x-ndjson':
+            return Response(
+                {'detail': 'Expected an application/x-ndjson body.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        
+        result = ingest_ndjson(
+            _request_body_stream(request),
+            batch_size=settings.LOG_INGEST_STREAM_BATCH_SIZE,
+            max_errors=settings.LOG_INGEST_STREAM_MAX_ERRORS,
+        )
+        if 'error' in result:
+            # Earlier micro-batches are committed; tell the agent where to resume
+            return Response(result, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(result, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'], url_path='ingest-stats')
+    def ingest_stats(self, request):
+        """
+        Write-behind queue depth and flush latency for this worker process.
+        """
+        return Response({
+            'write_behind': settings.LOG_INGEST_WRITE_BEHIND,
+            'buffer': buffer_stats(),
+        })
 
 
 
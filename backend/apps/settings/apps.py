@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.models.signals import post_save
 
 
 class SettingsConfig(AppConfig):
@@ -6,3 +8,21 @@ class SettingsConfig(AppConfig):
     name = 'apps.settings'
     label = 'system_settings'
     verbose_name = 'System Settings'
+
+    def ready(self):
+        from .models import SystemSettings
+        from .snapshot import settings_saved
+
+        post_save.connect(settings_saved, sender=SystemSettings, dispatch_uid='settings-snapshot')
+        # Started with the first request, like the log partition maintenance
+        request_started.connect(start_retention_job, dispatch_uid='settings-retention-job')
+
+
+def start_retention_job(**kwargs):
+    from django.conf import settings
+    from apps.logs.maintenance import schedule
+    from .retention import purge_expired
+
+    request_started.disconnect(dispatch_uid='settings-retention-job')
+    if settings.RETENTION_PURGE_MINUTES > 0:
+        schedule('retention-purge', purge_expired, settings.RETENTION_PURGE_MINUTES * 60)
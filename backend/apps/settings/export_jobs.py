@@ -0,0 +1,244 @@
+"""
+Background export jobs.
+
+A job's date range is split into ``EXPORT_JOB_WORKERS`` contiguous slices
+that are written in parallel by a per-process thread pool, each to its own
+part file, and then concatenated newest-first into
+``MEDIA_ROOT/exports/<token>/<filename>``. Gzip parts are independent gzip
+members, so the concatenation is itself a valid gzip file.
+
+Progress (rows and parts written) is stored on the ``ExportJob`` row as the
+parts advance, together with ``heartbeat_at``; while parts wait for a
+pool thread, the job's own thread keeps beating. Jobs run in the web
+worker that created them; a job whose worker dies stops beating (or never
+leaves ``queued``), and ``fail_stale_jobs`` (run whenever jobs are listed
+or fetched) marks it failed after ``EXPORT_JOB_STALE_SECONDS`` so it can
+be deleted and queued again. ``rows_total`` uses the planner estimate for large ranges, like the
+paginated log API.
+"""
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Q
+from django.utils import timezone
+
+from apps.alerts.models import Alert
+from apps.logs.models import NetworkLog
+from apps.logs.pagination import estimate_count
+
+from .exports import ALERT_EXPORT_FIELDS, LOG_EXPORT_FIELDS, encode_rows, export_filename, export_rows, gzip_chunks
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'exports'
+SOURCES = {
+    'logs': (NetworkLog, LOG_EXPORT_FIELDS, 'network_logs'),
+    'alerts': (Alert, ALERT_EXPORT_FIELDS, 'alerts'),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export-part')
+    return _pool
+
+
+def start_job(job):
+    """Run ``job`` on a background thread once the creating transaction commits."""
+    def launch():
+        threading.Thread(target=run_job, args=(job.pk,), name=f'export-job-{job.pk}', daemon=True).start()
+    transaction.on_commit(launch)
+
+
+def split_range(start, end, parts):
+    """
+    Split ``[start, end]`` into up to ``parts`` contiguous ``(lo, hi)``
+    slices, newest first. Every slice but the first is half-open.
+    """
+    step = (end - start) / parts
+    if not step:
+        return [(start, end)]
+    bounds = [start + step * index for index in range(parts)] + [end]
+    return [(bounds[index], bounds[index + 1]) for index in reversed(range(parts))]
+
+
+def _slice_queryset(queryset, lo, hi, newest):
+    queryset = queryset.filter(timestamp__gte=lo)
+    queryset = queryset.filter(timestamp__lte=hi) if newest else queryset.filter(timestamp__lt=hi)
+    return queryset.order_by('-timestamp', '-id')
+
+
+def _count(queryset):
+    """``(rows, estimated)``: the planner estimate for large ranges, else an exact count."""
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate >= settings.ESTIMATED_COUNT_THRESHOLD:
+        return estimate, True
+    return queryset.count(), False
+
+
+def _track_progress(rows, job_id, every):
+    """Pass rows through, adding to the job's ``rows_written`` every ``every`` rows."""
+    pending = 0
+    for row in rows:
+        yield row
+        pending += 1
+        if pending >= every:
+            ExportJob.objects.filter(pk=job_id).update(
+                rows_written=F('rows_written') + pending, heartbeat_at=timezone.now()
+            )
+            pending = 0
+    if pending:
+        ExportJob.objects.filter(pk=job_id).update(
+            rows_written=F('rows_written') + pending, heartbeat_at=timezone.now()
+        )
+
+
+def _write_part(job, queryset, fields, path, header):
+    try:
+        rows = _track_progress(export_rows(queryset, fields), job.pk, settings.EXPORT_CHUNK_SIZE)
+        chunks = encode_rows(rows, fields, job.file_format, header=header)
+        if job.compression:
+            chunks = gzip_chunks(chunks)
+        with open(path, 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+        ExportJob.objects.filter(pk=job.pk).update(parts_done=F('parts_done') + 1, heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_job(job_id):
+    """Build the export file for ``job_id``, recording progress and the outcome."""
+    job = ExportJob.objects.get(pk=job_id)
+    directory = None
+    try:
+        model, fields, basename = SOURCES[job.kind]
+        queryset = model.objects.all()
+        if job.start:
+            queryset = queryset.filter(timestamp__gte=job.start)
+        if job.end:
+            queryset = queryset.filter(timestamp__lte=job.end)
+
+        bounds = queryset.aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        slices = []
+        if bounds['first'] is not None:
+            slices = split_range(bounds['first'], bounds['last'], settings.EXPORT_JOB_WORKERS)
+        rows_total, estimated = _count(queryset)
+        relative = os.path.join(EXPORT_DIR, uuid.uuid4().hex, export_filename(basename, job.file_format, job.compression))
+        now = timezone.now()
+        # ``file`` is set now so a job failed as stale can have its parts removed
+        started = ExportJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running',
+            started_at=now,
+            heartbeat_at=now,
+            rows_total=rows_total,
+            rows_total_estimated=estimated,
+            parts_total=len(slices),
+            file=relative,
+        )
+        if not started:
+            # Failed as stale before this thread got to it
+            return
+
+        path = os.path.join(settings.MEDIA_ROOT, relative)
+        directory = os.path.dirname(path)
+        os.makedirs(directory)
+
+        part_paths = [f'{path}.part{index}' for index in range(len(slices))]
+        futures = [
+            _get_pool().submit(
+                _write_part, job, _slice_queryset(queryset, lo, hi, index == 0), fields, part_path, index == 0
+            )
+            for index, ((lo, hi), part_path) in enumerate(zip(slices, part_paths))
+        ]
+        _wait_beating(job.pk, futures)
+
+        with open(path, 'wb') as out:
+            if not slices:
+                for chunk in _empty_export(job, fields):
+                    out.write(chunk)
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(part_path)
+
+        finished = ExportJob.objects.filter(pk=job.pk, status='running').update(
+            status='done', size=os.path.getsize(path), finished_at=timezone.now()
+        )
+        if not finished:
+            # Failed as stale meanwhile; the result may already be half deleted
+            shutil.rmtree(directory, ignore_errors=True)
+    except Exception as exc:
+        logger.exception('Export job %s failed', job_id)
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+        ExportJob.objects.filter(pk=job.pk).update(status='failed', error=str(exc), finished_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def _wait_beating(job_id, futures):
+    """
+    Wait for the part ``futures``, refreshing the job's ``heartbeat_at``
+    meanwhile: parts queued behind other jobs' parts report no progress.
+    Raises the first part's exception.
+    """
+    interval = settings.EXPORT_JOB_STALE_SECONDS / 4
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=interval, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()
+        if pending:
+            ExportJob.objects.filter(pk=job_id, status='running').update(heartbeat_at=timezone.now())
+
+
+def fail_stale_jobs():
+    """
+    Mark running jobs without a heartbeat, and queued jobs not started, for
+    ``EXPORT_JOB_STALE_SECONDS`` as failed and remove their partial files.
+    Returns how many were failed.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.EXPORT_JOB_STALE_SECONDS)
+    stale = ExportJob.objects.filter(
+        Q(status='running', heartbeat_at__lt=cutoff) | Q(status='queued', created_at__lt=cutoff)
+    )
+    failed = 0
+    for job in stale:
+        if ExportJob.objects.filter(pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at).update(
+            status='failed', error='Export worker stopped responding', finished_at=now
+        ):
+            logger.warning(
+                'Export job %s (%s) made no progress since %s; marked failed',
+                job.pk, job.status, job.heartbeat_at or job.created_at,
+            )
+            delete_job_file(job)
+            failed += 1
+    return failed
+
+
+def _empty_export(job, fields):
+    """Header-only CSV (or empty NDJSON) for a range without rows."""
+    chunks = encode_rows([], fields, job.file_format)
+    return gzip_chunks(chunks) if job.compression else chunks
+
+
+def delete_job_file(job):
+    """Remove a job's export directory, if it has one."""
+    if job.file:
+        shutil.rmtree(os.path.dirname(os.path.join(settings.MEDIA_ROOT, job.file)), ignore_errors=True)
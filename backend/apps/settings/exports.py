@@ -0,0 +1,206 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with ``values_list().iterator(chunk_size)``, which uses a
+server-side cursor on PostgreSQL, and encoded into chunks of roughly
+``EXPORT_BUFFER_BYTES`` as they arrive, optionally gzip-compressed on the
+fly. Nothing holds more than one cursor chunk and one output chunk, so
+memory stays flat and the first bytes go out as soon as the first chunk is
+read. Finished export files (see ``export_jobs``) are served with
+``ranged_file_response`` so interrupted downloads can resume.
+"""
+import csv
+import json
+import os
+import re
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+FILE_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+COMPRESSIONS = ('gzip',)
+
+# (field, CSV header) pairs in export column order
+LOG_EXPORT_FIELDS = (
+    ('timestamp', 'Timestamp'),
+    ('src_ip', 'Source IP'),
+    ('dst_ip', 'Destination IP'),
+    ('proto', 'Protocol'),
+    ('packet_size', 'Packet Size'),
+    ('action', 'Action'),
+)
+ALERT_EXPORT_FIELDS = (
+    ('timestamp', 'Timestamp'),
+    ('alert_type', 'Type'),
+    ('severity', 'Severity'),
+    ('src_ip', 'Source IP'),
+    ('dst_ip', 'Destination IP'),
+    ('status', 'Status'),
+    ('message', 'Message'),
+)
+
+
+class _LineBuffer:
+    """File-like sink for ``csv.writer`` that hands back what was written."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def take(self):
+        value = ''.join(self.parts)
+        self.parts = []
+        return value
+
+
+def export_rows(queryset, fields, chunk_size=None):
+    """Yield value tuples for ``fields`` straight off a server-side cursor."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return queryset.values_list(*[name for name, _ in fields]).iterator(chunk_size=chunk_size)
+
+
+def encode_rows(rows, fields, file_format, header=True):
+    """
+    Encode value tuples as CSV or NDJSON, yielding ``bytes`` chunks of about
+    ``EXPORT_BUFFER_BYTES``. ``header`` controls the CSV header row.
+    """
+    limit = settings.EXPORT_BUFFER_BYTES
+    buffer = _LineBuffer()
+    pending = []
+    size = 0
+
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow([label for _, label in fields])
+            pending.append(buffer.take())
+
+        def encode(row):
+            writer.writerow(row)
+            return buffer.take()
+    else:
+        names = [name for name, _ in fields]
+
+        def encode(row):
+            record = {
+                name: value.isoformat() if isinstance(value, datetime) else value
+                for name, value in zip(names, row)
+            }
+            return json.dumps(record) + '\n'
+
+    for row in rows:
+        line = encode(row)
+        pending.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(pending).encode()
+            pending = []
+            size = 0
+    if pending:
+        yield ''.join(pending).encode()
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of ``bytes`` chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_filename(basename, file_format, compression=None):
+    filename = f'{basename}.{FILE_FORMATS[file_format][1]}'
+    return f'{filename}.gz' if compression else filename
+
+
+def export_content_type(file_format, compression=None):
+    return 'application/gzip' if compression else FILE_FORMATS[file_format][0]
+
+
+def streaming_export(queryset, fields, basename, file_format='csv', compression=None):
+    """``StreamingHttpResponse`` for ``queryset`` in the requested format."""
+    chunks = encode_rows(export_rows(queryset, fields), fields, file_format)
+    if compression:
+        chunks = gzip_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=export_content_type(file_format, compression))
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(basename, file_format, compression)}"'
+    )
+    # Let nginx pass chunks through instead of buffering the whole file
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _parse_range(header, size):
+    """
+    ``(first, last)`` byte offsets for a single-range ``Range`` header,
+    ``None`` to serve the whole file (absent, malformed or multi-range
+    headers) or ``False`` when the range cannot be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return False
+    return first, last
+
+
+def _read_span(path, first, length, block_size=65536):
+    with open(path, 'rb') as source:
+        source.seek(first)
+        while length > 0:
+            block = source.read(min(block_size, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+def ranged_file_response(request, path, filename, content_type, etag):
+    """
+    Serve ``path`` as an attachment, honouring single ``Range`` requests
+    (and ``If-Range`` against ``etag``) so clients can resume downloads.
+    """
+    size = os.path.getsize(path)
+    byte_range = None
+    if request.headers.get('If-Range', etag) == etag:
+        byte_range = _parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            _read_span(path, first, last - first + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = str(last - first + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
@@ -0,0 +1,47 @@
+"""
+Delete network logs and resolved alerts older than log_retention_days.
+
+Usage:
+    python manage.py purge_expired --dry-run
+    python manage.py purge_expired --batch-size 10000 --sleep 0.2
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.settings.retention import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Purge network logs and resolved alerts past the retention window in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+        parser.add_argument(
+            '--days', type=int,
+            help='Retention window in days (defaults to the log_retention_days setting)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE,
+            help='Rows deleted per statement'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.RETENTION_BATCH_SLEEP_SECONDS,
+            help='Seconds to pause between batches'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        report = purge_expired(
+            retention_days=options['days'],
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if report['dry_run'] else 'Removed'
+        partitions = report['log_partitions_dropped']
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['logs_deleted']} log(s), {len(partitions)} log partition(s) and "
+            f"{report['alerts_deleted']} resolved alert(s) older than {report['cutoff']} "
+            f"in {report['seconds']}s"
+        ))
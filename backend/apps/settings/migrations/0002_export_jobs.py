@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("system_settings", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("logs", "Network Logs"), ("alerts", "Alerts")], max_length=10
+                    ),
+                ),
+                (
+                    "file_format",
+                    models.CharField(
+                        choices=[("csv", "CSV"), ("ndjson", "NDJSON")], default="csv", max_length=10
+                    ),
+                ),
+                (
+                    "compression",
+                    models.CharField(
+                        blank=True,
+                        choices=[("", "None"), ("gzip", "Gzip")],
+                        default="",
+                        max_length=10,
+                    ),
+                ),
+                ("start", models.DateTimeField(blank=True, null=True)),
+                ("end", models.DateTimeField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("rows_total", models.BigIntegerField(default=0)),
+                ("rows_written", models.BigIntegerField(default=0)),
+                ("parts_total", models.IntegerField(default=0)),
+                ("parts_done", models.IntegerField(default=0)),
+                (
+                    "file",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Path relative to MEDIA_ROOT",
+                        max_length=255,
+                    ),
+                ),
+                ("size", models.BigIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="export_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "export_jobs",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("system_settings", "0002_export_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="systemsettings",
+            name="version",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bumped on every save; workers reload their settings snapshot when it changes",
+            ),
+        ),
+    ]
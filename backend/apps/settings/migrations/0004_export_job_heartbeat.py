@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("system_settings", "0003_settings_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Last progress update of a running job", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="rows_total_estimated",
+            field=models.BooleanField(default=False),
+        ),
+    ]
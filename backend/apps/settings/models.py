@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
 
 
 class SystemSettings(models.Model):
@@ -89,6 +92,11 @@ class SystemSettings(models.Model):
 
     # ── Metadata ──
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text='Bumped on every save; workers reload their settings snapshot when it changes'
+    )
 
     class Meta:
         db_table = 'system_settings'
@@ -99,9 +107,21 @@ class SystemSettings(models.Model):
         return 'System Settings'
 
     def save(self, *args, **kwargs):
-        """Enforce singleton: always use pk=1."""
+        """
+        Enforce singleton: always use pk=1. ``version`` is bumped in the
+        database, which locks the row until commit, so concurrent saves get
+        distinct versions in commit order.
+        """
         self.pk = 1
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            row = type(self).objects.filter(pk=1)
+            if kwargs.get('force_insert') or not row.update(version=models.F('version') + 1):
+                self.version = 1
+            else:
+                self.version = row.values_list('version', flat=True).get()
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
         """Prevent deletion of the singleton row."""
@@ -112,3 +132,71 @@ class SystemSettings(models.Model):
         """Load (or create) the singleton settings instance."""
         obj, _ = cls.objects.get_or_create(pk=1)
         return obj
+
+
+class ExportJob(models.Model):
+    """
+    A background CSV/NDJSON export of logs or alerts.
+
+    The file is written under ``MEDIA_ROOT/exports/`` by
+    ``apps.settings.export_jobs`` and downloaded through the API, which
+    supports HTTP Range requests so interrupted downloads can resume.
+    ``rows_total`` is a planner estimate for large ranges
+    (``rows_total_estimated``).
+    """
+    KIND_CHOICES = [
+        ('logs', 'Network Logs'),
+        ('alerts', 'Alerts'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    COMPRESSION_CHOICES = [
+        ('', 'None'),
+        ('gzip', 'Gzip'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, blank=True, default='')
+    start = models.DateTimeField(null=True, blank=True)
+    end = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    rows_total = models.BigIntegerField(default=0)
+    rows_total_estimated = models.BooleanField(default=False)
+    rows_written = models.BigIntegerField(default=0)
+    parts_total = models.IntegerField(default=0)
+    parts_done = models.IntegerField(default=0)
+    file = models.CharField(max_length=255, blank=True, default='', help_text='Path relative to MEDIA_ROOT')
+    size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, help_text='Last progress update of a running job'
+    )
+
+    class Meta:
+        db_table = 'export_jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.kind} export #{self.pk} ({self.status})'
+
+    @property
+    def progress(self):
+        """Fraction of rows written, between 0 and 1."""
+        if self.status == 'done':
+            return 1.0
+        if not self.rows_total:
+            return 0.0
+        return min(self.rows_written / self.rows_total, 1.0)
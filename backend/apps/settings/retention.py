@@ -0,0 +1,83 @@
+"""
+Retention engine driven by ``SystemSettings.log_retention_days``.
+
+Expired network logs and resolved alerts are deleted in bounded batches,
+oldest first along the timestamp index, with a pause between batches so no
+statement holds locks for long. When ``network_logs`` is partitioned,
+whole partitions are dropped first and only stragglers are deleted.
+Minute traffic rollups expire with the logs; hourly rollups are kept so
+long-range reports keep working.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.alerts.models import Alert
+from apps.logs.models import NetworkLog, TrafficRollup
+from apps.logs.partitions import drop_expired_partitions
+
+from .models import SystemSettings
+
+
+def _delete_in_batches(queryset, batch_size, sleep_seconds, order_by='timestamp'):
+    """
+    Delete ``queryset`` ``batch_size`` rows at a time, oldest ``order_by``
+    first; returns rows deleted.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by(order_by, 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+        time.sleep(sleep_seconds)
+
+
+def purge_expired(retention_days=None, batch_size=None, sleep_seconds=None, dry_run=False):
+    """
+    Remove logs and resolved alerts older than the retention window.
+
+    Returns a report dict with the cutoff, rows (and partitions) removed and
+    the time taken. With ``dry_run`` nothing is deleted and the counts are
+    what would be removed.
+    """
+    started = time.monotonic()
+    if retention_days is None:
+        retention_days = SystemSettings.load().log_retention_days
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    sleep_seconds = settings.RETENTION_BATCH_SLEEP_SECONDS if sleep_seconds is None else sleep_seconds
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    expired_logs = NetworkLog.objects.filter(timestamp__lt=cutoff)
+    expired_alerts = Alert.objects.filter(status='resolved', timestamp__lt=cutoff)
+    expired_rollups = TrafficRollup.objects.filter(granularity='minute', bucket__lt=cutoff)
+
+    dropped, partition_rows, default_rows = drop_expired_partitions(
+        cutoff, dry_run=dry_run, batch_size=batch_size, sleep_seconds=sleep_seconds
+    )
+    if dry_run:
+        logs_deleted = expired_logs.count()
+        alerts_deleted = expired_alerts.count()
+        rollups_deleted = expired_rollups.count()
+    else:
+        logs_deleted = partition_rows + default_rows
+        logs_deleted += _delete_in_batches(expired_logs, batch_size, sleep_seconds)
+        alerts_deleted = _delete_in_batches(expired_alerts, batch_size, sleep_seconds)
+        rollups_deleted = _delete_in_batches(expired_rollups, batch_size, sleep_seconds, order_by='bucket')
+
+    return {
+        'dry_run': dry_run,
+        'retention_days': retention_days,
+        'cutoff': cutoff.isoformat(),
+        'log_partitions_dropped': dropped,
+        'logs_deleted': logs_deleted,
+        'alerts_deleted': alerts_deleted,
+        'rollups_deleted': rollups_deleted,
+        'seconds': round(time.monotonic() - started, 3),
+    }
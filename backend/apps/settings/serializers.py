@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import SystemSettings
+from django.urls import reverse
+from .models import ExportJob, SystemSettings
 from apps.authentication.models import User
 
 
@@ -84,3 +85,33 @@ class UserCreateSerializer(serializers.ModelSerializer):
 class ChangePasswordSerializer(serializers.Serializer):
     """Serializer for changing a user's password (admin action)."""
     new_password = serializers.CharField(min_length=8, write_only=True)
+
+
+# ── Export Job Serializers ──
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Serializer for reporting export job status and progress."""
+    progress = serializers.FloatField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'kind', 'file_format', 'compression', 'start', 'end', 'status',
+            'progress', 'rows_total', 'rows_total_estimated', 'rows_written', 'parts_total', 'parts_done',
+            'size', 'error', 'download_url', 'created_at', 'started_at', 'finished_at', 'heartbeat_at',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        return reverse('export-job-download', args=[obj.pk])
+
+
+class ExportJobCreateSerializer(serializers.ModelSerializer):
+    """Serializer for queuing an export job; the date range is parsed by the view."""
+    class Meta:
+        model = ExportJob
+        fields = ['kind', 'file_format', 'compression']
+
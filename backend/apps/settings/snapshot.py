@@ -0,0 +1,200 @@
+"""
+Per-process snapshot of the ``SystemSettings`` row.
+
+Hot paths (rule evaluation, the streaming detectors, auto-blocking) read
+settings through ``get_settings()``, which returns an immutable
+``SettingsSnapshot`` kept in memory. Only the first call in a process
+queries the database.
+
+Every save bumps ``SystemSettings.version`` in the database. When the
+transaction commits, the saving process swaps its snapshot and publishes
+the new version on ``SETTINGS_PUBSUB_CHANNEL``; a rolled-back save changes
+nothing. Every other worker listens on a daemon thread and reloads the row
+when it hears a version different from its own, so a change reaches all
+gunicorn and ASGI workers within about a second. Pub/sub does not keep messages, so the
+listener also reloads each time it (re)subscribes.
+``SETTINGS_PUBSUB_BACKEND=memory`` delivers versions inside the process
+instead of through Redis (tests, single-process runs).
+"""
+import logging
+import threading
+
+import redis
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import SystemSettings
+
+logger = logging.getLogger(__name__)
+
+FIELDS = tuple(field.attname for field in SystemSettings._meta.concrete_fields)
+
+
+class SettingsSnapshot:
+    """Read-only copy of the settings row, with the model's attribute names."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, instance):
+        for name in FIELDS:
+            object.__setattr__(self, name, getattr(instance, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('SettingsSnapshot is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('SettingsSnapshot is read-only')
+
+    def __repr__(self):
+        return f'<SettingsSnapshot version={self.version}>'
+
+
+class MemoryBroker:
+    """Delivers published versions to this process's subscribers, synchronously."""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, version):
+        for callback in list(self.subscribers):
+            callback(version)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def close(self):
+        self.subscribers.clear()
+
+
+class RedisBroker:
+    """Publishes versions on a Redis channel; subscribers listen on a daemon thread."""
+
+    RETRY_SECONDS = 1.0
+    POLL_SECONDS = 1.0
+
+    def __init__(self, url, channel):
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._stop = threading.Event()
+
+    def publish(self, version):
+        try:
+            self.client.publish(self.channel, version)
+        except redis.RedisError:
+            logger.warning('Publishing settings version %d failed', version, exc_info=True)
+
+    def subscribe(self, callback):
+        thread = threading.Thread(target=self._listen, args=(callback,), name='settings-subscriber', daemon=True)
+        thread.start()
+
+    def _listen(self, callback):
+        while not self._stop.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Versions published while unsubscribed were lost
+                self._deliver(callback, None)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=self.POLL_SECONDS)
+                    if message is not None:
+                        self._deliver(callback, int(message['data']))
+            except redis.RedisError:
+                logger.warning('Settings subscription lost, retrying', exc_info=True)
+                self._stop.wait(self.RETRY_SECONDS)
+            finally:
+                pubsub.close()
+
+    def _deliver(self, callback, version):
+        try:
+            callback(version)
+        finally:
+            connection.close()
+
+    def close(self):
+        self._stop.set()
+
+
+class SettingsCache:
+    """Holds this process's snapshot and keeps it in step with ``broker``."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.snapshot = None
+        self._lock = threading.Lock()
+        broker.subscribe(self._on_version)
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self._lock:
+                if self.snapshot is None:
+                    self.snapshot = SettingsSnapshot(SystemSettings.load())
+                snapshot = self.snapshot
+        return snapshot
+
+    def update(self, instance):
+        self.snapshot = SettingsSnapshot(instance)
+
+    def offer(self, snapshot):
+        """Swap in ``snapshot`` unless a newer one is held already."""
+        with self._lock:
+            if self.snapshot is None or snapshot.version > self.snapshot.version:
+                self.snapshot = snapshot
+
+    def _on_version(self, version):
+        """Reload unless ``version`` is the one held (``None``: always)."""
+        current = self.snapshot
+        if version is not None and current is not None and current.version == version:
+            return
+        try:
+            self.update(SystemSettings.load())
+        except Exception:
+            logger.exception('Reloading system settings failed')
+
+
+_memory_broker = MemoryBroker()
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_broker():
+    """The broker for ``SETTINGS_PUBSUB_BACKEND``."""
+    if settings.SETTINGS_PUBSUB_BACKEND == 'memory':
+        return _memory_broker
+    return RedisBroker(settings.SETTINGS_PUBSUB_URL, settings.SETTINGS_PUBSUB_CHANNEL)
+
+
+def get_cache():
+    """This process's settings cache, subscribed on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SettingsCache(get_broker())
+    return _cache
+
+
+def get_settings():
+    """The current ``SettingsSnapshot``; see the module docstring."""
+    return get_cache().get()
+
+
+def reset_settings_cache():
+    """Forget the snapshot and unsubscribe (tests, or after changing the pub/sub settings)."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.broker.close()
+        _cache = None
+
+
+def settings_saved(sender, instance, **kwargs):
+    """post_save: once committed, swap this process's snapshot and tell the other workers."""
+    snapshot = SettingsSnapshot(instance)
+
+    def publish():
+        cache = get_cache()
+        cache.offer(snapshot)
+        cache.broker.publish(snapshot.version)
+
+    transaction.on_commit(publish)
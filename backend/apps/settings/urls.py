@@ -20,4 +20,7 @@ urlpatterns = [
     path('export/logs/', views.export_logs, name='export-logs'),
     path('export/alerts/', views.export_alerts, name='export-alerts'),
     path('export/report/', views.summary_report, name='summary-report'),
+    path('export/jobs/', views.export_jobs, name='export-jobs'),
+    path('export/jobs/<int:pk>/', views.export_job_detail, name='export-job-detail'),
+    path('export/jobs/<int:pk>/download/', views.export_job_download, name='export-job-download'),
 ]
@@ -1,9 +1,11 @@
-import csv
-from io import StringIO
+import os
 from datetime import datetime
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Sum
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated
@@ -11,10 +13,21 @@ from rest_framework.response import Response
 
 from apps.authentication.permissions import IsAdmin
 from apps.authentication.models import User
+from apps.logs import rollups
 from apps.logs.models import NetworkLog
 from apps.alerts.models import Alert
 
-from .models import SystemSettings
+from .export_jobs import delete_job_file, fail_stale_jobs, start_job
+from .exports import (
+    ALERT_EXPORT_FIELDS,
+    COMPRESSIONS,
+    FILE_FORMATS,
+    LOG_EXPORT_FIELDS,
+    export_content_type,
+    ranged_file_response,
+    streaming_export,
+)
+from .models import ExportJob, SystemSettings
 from .serializers import (
     AlertThresholdSerializer,
     NotificationSerializer,
@@ -23,6 +36,8 @@ from .serializers import (
     UserManagementSerializer,
     UserCreateSerializer,
     ChangePasswordSerializer,
+    ExportJobSerializer,
+    ExportJobCreateSerializer,
 )
 
 
@@ -125,64 +140,82 @@ class UserManagementViewSet(viewsets.ModelViewSet):
 # Export & Reports
 # ─────────────────────────────────────────────
 
-def _parse_date_range(request):
-    """Parse optional start_date / end_date query params."""
-    start = request.query_params.get('start_date')
-    end = request.query_params.get('end_date')
+def _parse_moment(value):
+    """Parse a start_date / end_date value (date or datetime) into an aware datetime."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        moment = datetime.combine(day, datetime.min.time())
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def _parse_date_range(params):
+    """
+    Parse optional start_date / end_date values from ``params`` (query params
+    or request data) into timestamp filters. Raises ValueError on bad dates.
+    """
+    start = params.get('start_date')
+    end = params.get('end_date')
     filters = {}
     if start:
-        filters['timestamp__gte'] = start
+        filters['timestamp__gte'] = _parse_moment(start)
     if end:
-        filters['timestamp__lte'] = end
+        filters['timestamp__lte'] = _parse_moment(end)
     return filters
 
 
+def _export_options(request):
+    """
+    Read ``file_format`` (csv or ndjson) and ``compression`` (gzip) query params.
+    (DRF reserves ``format`` for renderer selection.)
+    Raises ValueError on unsupported values.
+    """
+    file_format = request.query_params.get('file_format', 'csv')
+    compression = request.query_params.get('compression') or None
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f'Unsupported file_format: {file_format}')
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f'Unsupported compression: {compression}')
+    return file_format, compression
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_logs(request):
-    """Export network logs as CSV with optional date range."""
-    date_filters = _parse_date_range(request)
+    """Stream network logs as CSV or NDJSON (optionally gzipped) with optional date range."""
+    try:
+        file_format, compression = _export_options(request)
+        date_filters = _parse_date_range(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     logs = NetworkLog.objects.filter(**date_filters).order_by('-timestamp')
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="network_logs.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Timestamp', 'Source IP', 'Destination IP', 'Protocol', 'Packet Size', 'Action'])
-    for log in logs:
-        writer.writerow([log.timestamp, log.src_ip, log.dst_ip, log.proto, log.packet_size, log.action])
-
-    return response
+    return streaming_export(logs, LOG_EXPORT_FIELDS, 'network_logs', file_format, compression)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def export_alerts(request):
-    """Export alerts as CSV with optional date range."""
-    date_filters = _parse_date_range(request)
+    """Stream alerts as CSV or NDJSON (optionally gzipped) with optional date range."""
+    try:
+        file_format, compression = _export_options(request)
+        date_filters = _parse_date_range(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     alerts = Alert.objects.filter(**date_filters).order_by('-timestamp')
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="alerts.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Timestamp', 'Type', 'Severity', 'Source IP', 'Destination IP', 'Status', 'Message'])
-    for alert in alerts:
-        writer.writerow([
-            alert.timestamp, alert.alert_type, alert.severity,
-            alert.src_ip, alert.dst_ip, alert.status, alert.message,
-        ])
-
-    return response
+    return streaming_export(alerts, ALERT_EXPORT_FIELDS, 'alerts', file_format, compression)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def summary_report(request):
     """Generate a summary report with key metrics."""
-    date_filters = _parse_date_range(request)
+    try:
+        date_filters = _parse_date_range(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    total_logs = NetworkLog.objects.filter(**date_filters).count()
     total_alerts = Alert.objects.filter(**date_filters).count()
     open_alerts = Alert.objects.filter(status='open', **date_filters).count()
     resolved_alerts = Alert.objects.filter(status='resolved', **date_filters).count()
@@ -192,18 +225,19 @@ def summary_report(request):
     for sev in ['low', 'medium', 'high', 'critical']:
         severity_counts[sev] = Alert.objects.filter(severity=sev, **date_filters).count()
 
-    # Protocol breakdown
-    protocol_counts = {}
-    for proto in ['TCP', 'UDP', 'ICMP', 'HTTP', 'HTTPS']:
-        protocol_counts[proto] = NetworkLog.objects.filter(proto=proto, **date_filters).count()
-
-    # Action breakdown
-    action_counts = {}
-    for act in ['allow', 'block', 'drop']:
-        action_counts[act] = NetworkLog.objects.filter(action=act, **date_filters).count()
+    # Log totals and protocol/action breakdowns come from the traffic rollups
+    buckets = rollups.window(date_filters.get('timestamp__gte'), date_filters.get('timestamp__lte'))
+    protocol_counts = dict.fromkeys(['TCP', 'UDP', 'ICMP', 'HTTP', 'HTTPS'], 0)
+    action_counts = dict.fromkeys(['allow', 'block', 'drop'], 0)
+    for row in buckets.values('proto', 'action').annotate(total=Sum('count')):
+        protocol_counts[row['proto']] = protocol_counts.get(row['proto'], 0) + row['total']
+        action_counts[row['action']] = action_counts.get(row['action'], 0) + row['total']
+    total_logs = sum(action_counts.values())
 
     return Response({
         'total_logs': total_logs,
+        # Hour rollups outlive retention; totals then count purged logs too
+        'includes_purged_logs': rollups.includes_purged(buckets),
         'total_alerts': total_alerts,
         'open_alerts': open_alerts,
         'resolved_alerts': resolved_alerts,
@@ -212,3 +246,68 @@ def summary_report(request):
         'action_breakdown': action_counts,
         'generated_at': timezone.now().isoformat(),
     })
+
+
+def _visible_export_jobs(user):
+    """Admins see every export job, other users only their own."""
+    fail_stale_jobs()
+    jobs = ExportJob.objects.all()
+    if not (user.is_admin() or user.is_superuser):
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def export_jobs(request):
+    """List export jobs or queue a new one to be built in the background."""
+    if request.method == 'GET':
+        return Response(ExportJobSerializer(_visible_export_jobs(request.user)[:50], many=True).data)
+
+    serializer = ExportJobCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        date_filters = _parse_date_range(request.data)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    job = serializer.save(
+        created_by=request.user,
+        start=date_filters.get('timestamp__gte'),
+        end=date_filters.get('timestamp__lte'),
+    )
+    start_job(job)
+    return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def export_job_detail(request, pk):
+    """Get an export job's progress, or delete the job and its file."""
+    job = get_object_or_404(_visible_export_jobs(request.user), pk=pk)
+    if request.method == 'DELETE':
+        if job.status in ('queued', 'running'):
+            return Response({'error': 'Export job is still running'}, status=status.HTTP_409_CONFLICT)
+        delete_job_file(job)
+        job.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(ExportJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_job_download(request, pk):
+    """Download a finished export; supports Range / If-Range for resuming."""
+    job = get_object_or_404(_visible_export_jobs(request.user), pk=pk)
+    if job.status != 'done':
+        return Response({'error': 'Export job has not finished'}, status=status.HTTP_409_CONFLICT)
+    path = os.path.join(settings.MEDIA_ROOT, job.file)
+    if not os.path.exists(path):
+        return Response({'error': 'Export file is gone'}, status=status.HTTP_410_GONE)
+    return ranged_file_response(
+        request,
+        path,
+        os.path.basename(path),
+        export_content_type(job.file_format, job.compression),
+        etag=f'"export-{job.pk}-{job.size}-{int(job.finished_at.timestamp())}"',
+    )
+
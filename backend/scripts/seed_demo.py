@@ -16,6 +16,7 @@ django.setup()
 
 from apps.authentication.models import User
 from apps.logs.models import NetworkLog
+from apps.logs.rollups import backfill
 from apps.alerts.models import Alert
 from apps.firewall.models import FirewallRule
 
@@ -109,6 +110,8 @@ def seed_logs(admin_user):
             created += 1
     
     print(f"Created {created} network logs")
+    # Written around the ingestion path, so the dashboard rollups need a rebuild
+    backfill(base_time)
 
 
 def seed_alerts(admin_user):
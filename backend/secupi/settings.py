@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so request timings include every other middleware
+    'apps.dashboard.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -132,6 +134,10 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Paginated log lists and the log admin report PostgreSQL's row estimate instead of
+# running COUNT(*) once it reaches this many rows
+ESTIMATED_COUNT_THRESHOLD = config('ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(seconds=config('JWT_EXPIRATION_DELTA', default=86400, cast=int)),
@@ -164,6 +170,109 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache shared by all workers (Redis db 1; the channel layer uses db 0).
+# The test suite switches to local memory in tests/conftest.py.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=f"redis://{config('REDIS_HOST', default='redis')}:{config('REDIS_PORT', default=6379, cast=int)}/1"
+        ),
+    }
+}
+
+# Dashboard summary: seconds a computed payload is served, how long the previous payload
+# may be served while another worker recomputes, and the recompute lock timeout
+DASHBOARD_SUMMARY_TTL = config('DASHBOARD_SUMMARY_TTL', default=10, cast=int)
+DASHBOARD_SUMMARY_STALE_SECONDS = config('DASHBOARD_SUMMARY_STALE_SECONDS', default=300, cast=int)
+DASHBOARD_SUMMARY_LOCK_SECONDS = config('DASHBOARD_SUMMARY_LOCK_SECONDS', default=10, cast=int)
+
+# System settings snapshot: saves publish the new version on this channel and every worker
+# reloads its copy ('redis', or 'memory' for a single process; the test suite uses memory)
+SETTINGS_PUBSUB_BACKEND = config('SETTINGS_PUBSUB_BACKEND', default='redis')
+SETTINGS_PUBSUB_URL = config(
+    'SETTINGS_PUBSUB_URL',
+    default=f"redis://{config('REDIS_HOST', default='redis')}:{config('REDIS_PORT', default=6379, cast=int)}/0"
+)
+SETTINGS_PUBSUB_CHANNEL = config('SETTINGS_PUBSUB_CHANNEL', default='secupi:system-settings')
+
+# Prometheus scrape endpoint /api/metrics/; when set, scrapers must send "Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Log ingestion
+# 'orm' uses bulk INSERTs, 'copy' streams rows through PostgreSQL COPY FROM STDIN
+LOG_INGEST_BACKEND = config('LOG_INGEST_BACKEND', default='orm')
+LOG_INGEST_COPY_BATCH_SIZE = config('LOG_INGEST_COPY_BATCH_SIZE', default=5000, cast=int)
+LOG_INGEST_MAX_BATCH_SIZE = config('LOG_INGEST_MAX_BATCH_SIZE', default=5000, cast=int)
+LOG_INGEST_STREAM_BATCH_SIZE = config('LOG_INGEST_STREAM_BATCH_SIZE', default=500, cast=int)
+LOG_INGEST_STREAM_MAX_ERRORS = config('LOG_INGEST_STREAM_MAX_ERRORS', default=1000, cast=int)
+# Run ingested logs through the firewall rules and default_action, recording rule_action/matched_rule
+LOG_INGEST_EVALUATE_RULES = config('LOG_INGEST_EVALUATE_RULES', default=False, cast=bool)
+# Write-behind mode: queue validated logs per process, answer 202, flush in the background
+LOG_INGEST_WRITE_BEHIND = config('LOG_INGEST_WRITE_BEHIND', default=False, cast=bool)
+LOG_WRITE_BEHIND_QUEUE_SIZE = config('LOG_WRITE_BEHIND_QUEUE_SIZE', default=50000, cast=int)
+LOG_WRITE_BEHIND_BATCH_SIZE = config('LOG_WRITE_BEHIND_BATCH_SIZE', default=1000, cast=int)
+LOG_WRITE_BEHIND_FLUSH_MS = config('LOG_WRITE_BEHIND_FLUSH_MS', default=200, cast=int)
+# Failed batches are retried (pauses start at RETRY_MS and double), then appended to an NDJSON
+# file in DEAD_LETTER_DIR that `manage.py load_logs` can replay
+LOG_WRITE_BEHIND_RETRIES = config('LOG_WRITE_BEHIND_RETRIES', default=3, cast=int)
+LOG_WRITE_BEHIND_RETRY_MS = config('LOG_WRITE_BEHIND_RETRY_MS', default=500, cast=int)
+LOG_WRITE_BEHIND_DEAD_LETTER_DIR = config(
+    'LOG_WRITE_BEHIND_DEAD_LETTER_DIR', default=os.path.join(BASE_DIR, 'dead_letter')
+)
+
+# network_logs partitioning (PostgreSQL): 'day' or 'week' ranges, created PREMAKE periods ahead
+LOG_PARTITION_INTERVAL = config('LOG_PARTITION_INTERVAL', default='day')
+LOG_PARTITION_PREMAKE = config('LOG_PARTITION_PREMAKE', default=7, cast=int)
+LOG_PARTITION_INITIAL_DAYS = config('LOG_PARTITION_INITIAL_DAYS', default=90, cast=int)
+# Minutes between in-process partition maintenance runs (0 disables; use `manage.py partition_logs`)
+LOG_PARTITION_MAINTENANCE_MINUTES = config('LOG_PARTITION_MAINTENANCE_MINUTES', default=60, cast=int)
+
+# Retention purge (log_retention_days): batch size, pause between batches, and the
+# interval of the optional in-process job (0 disables; use `manage.py purge_expired`)
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=5000, cast=int)
+RETENTION_BATCH_SLEEP_SECONDS = config('RETENTION_BATCH_SLEEP_SECONDS', default=0.1, cast=float)
+RETENTION_PURGE_MINUTES = config('RETENTION_PURGE_MINUTES', default=0, cast=int)
+
+# CSV/NDJSON exports: rows fetched per server-side cursor round trip and bytes per streamed chunk
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+EXPORT_BUFFER_BYTES = config('EXPORT_BUFFER_BYTES', default=65536, cast=int)
+# Background export jobs: threads per worker process, each writing one slice of the date range
+EXPORT_JOB_WORKERS = config('EXPORT_JOB_WORKERS', default=4, cast=int)
+# Running export jobs without progress for this long are marked failed (their worker died)
+EXPORT_JOB_STALE_SECONDS = config('EXPORT_JOB_STALE_SECONDS', default=600, cast=int)
+
+# Firewall rule matcher: seconds between checks for changed rules (saves in the same
+# process apply immediately) and the largest batch /api/firewall/rules/evaluate/ accepts
+FIREWALL_MATCHER_RECHECK_SECONDS = config('FIREWALL_MATCHER_RECHECK_SECONDS', default=1.0, cast=float)
+FIREWALL_EVALUATE_MAX_BATCH_SIZE = config('FIREWALL_EVALUATE_MAX_BATCH_SIZE', default=10000, cast=int)
+# auto_block_suspicious_ip: seconds to collect the sources of high/critical alerts before blocking them
+AUTO_BLOCK_DEBOUNCE_SECONDS = config('AUTO_BLOCK_DEBOUNCE_SECONDS', default=5.0, cast=float)
+# Rule changes kept for device table deltas; devices further behind download the full table
+FIREWALL_TABLE_HISTORY = config('FIREWALL_TABLE_HISTORY', default=1000, cast=int)
+
+# Streaming detectors run on every ingested batch (port_scan_limit, monitoring_window_minutes);
+# the port scan and packet size detectors keep state for at most DETECTOR_MAX_SOURCES sources per process
+LOG_DETECTORS_ENABLED = config('LOG_DETECTORS_ENABLED', default=True, cast=bool)
+DETECTOR_MAX_SOURCES = config('DETECTOR_MAX_SOURCES', default=100000, cast=int)
+# Rate detector (suspicious_traffic_threshold): count-min sketch size, and how many
+# heavy-hitter sources it counts exactly. Memory is about 13 * WIDTH * DEPTH * 8 bytes.
+DETECTOR_SKETCH_WIDTH = config('DETECTOR_SKETCH_WIDTH', default=16384, cast=int)
+DETECTOR_SKETCH_DEPTH = config('DETECTOR_SKETCH_DEPTH', default=4, cast=int)
+DETECTOR_HEAVY_HITTERS = config('DETECTOR_HEAVY_HITTERS', default=1024, cast=int)
+# Alerts repeating (alert_type, src_ip, dst_ip) within the window fold into the first one
+# (0 disables); occurrence counters are written every FLUSH_SECONDS or FLUSH_COUNT repeats
+ALERT_DEDUP_WINDOW_SECONDS = config('ALERT_DEDUP_WINDOW_SECONDS', default=300, cast=int)
+ALERT_DEDUP_FLUSH_SECONDS = config('ALERT_DEDUP_FLUSH_SECONDS', default=2.0, cast=float)
+ALERT_DEDUP_FLUSH_COUNT = config('ALERT_DEDUP_FLUSH_COUNT', default=1000, cast=int)
+ALERT_DEDUP_MAX_KEYS = config('ALERT_DEDUP_MAX_KEYS', default=50000, cast=int)
+
+# WebSocket fan-out: clients may ask for coalesced frames with ?coalesce_ms=...&coalesce_max=...
+WS_COALESCE_DEFAULT_MS = config('WS_COALESCE_DEFAULT_MS', default=0, cast=int)
+WS_COALESCE_MAX_MS = config('WS_COALESCE_MAX_MS', default=5000, cast=int)
+WS_COALESCE_MAX_EVENTS = config('WS_COALESCE_MAX_EVENTS', default=500, cast=int)
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
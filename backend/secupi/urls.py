@@ -17,6 +17,7 @@ urlpatterns = [
     path('api/ml/', include('apps.ml.urls')),
     path('api/settings/', include('apps.settings.urls')),
     path('api/health/', dashboard_views.health, name='health'),
+    path('api/metrics/', dashboard_views.metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
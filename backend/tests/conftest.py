@@ -0,0 +1,36 @@
+import pytest
+from django.core.cache import cache
+from apps.alerts.dedup import reset_deduplicator
+from apps.alerts.detectors import reset_detectors
+from apps.firewall.autoblock import reset_auto_blocker
+from apps.settings.snapshot import reset_settings_cache
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """Run every test against a fresh local-memory cache instead of Redis."""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def memory_settings_pubsub(settings):
+    """Publish settings versions in-process; the snapshot of a rolled-back row must not leak."""
+    settings.SETTINGS_PUBSUB_BACKEND = 'memory'
+    reset_settings_cache()
+    yield
+    reset_settings_cache()
+
+
+@pytest.fixture(autouse=True)
+def fresh_detectors():
+    """Streaming detector, alert dedup and auto-block state is per process; start every test without any."""
+    reset_detectors()
+    reset_deduplicator()
+    reset_auto_blocker()
+    yield
+    reset_detectors()
+    reset_deduplicator()
+    reset_auto_blocker()
@@ -1,9 +1,19 @@
+import random
+import threading
 import pytest
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from datetime import timedelta
+from django.db import connection
 from django.utils import timezone
 from apps.alerts.models import Alert
+from apps.alerts import detectors
+from apps.alerts.dedup import get_deduplicator, record_alerts
+from apps.alerts.detectors import PacketSizeDetector, PortScanDetector, RateDetector
+from apps.logs.ingestion import save_logs, validate_logs
+from apps.logs.models import NetworkLog
+from apps.settings.models import SystemSettings
 
 User = get_user_model()
 
@@ -55,4 +65,307 @@ class TestAlertsAPI:
         assert alert.resolved_by == admin_user
 
 
+def _log(src_ip, dst_ip, port, seconds=0, start=None, packet_size=60):
+    start = start or timezone.now()
+    return NetworkLog(
+        timestamp=start + timedelta(seconds=seconds), src_ip=src_ip, dst_ip=dst_ip,
+        proto='TCP', packet_size=packet_size, action='allow', raw_json={'dst_port': port},
+    )
+
 
+class TestPortScanDetector:
+    system = SystemSettings(port_scan_limit=10, monitoring_window_minutes=1)
+    
+    def test_port_scan_alerts_once_per_window(self):
+        detector = PortScanDetector(max_sources=100)
+        start = timezone.now()
+        logs = [_log('203.0.113.5', '192.168.1.10', port, seconds=port, start=start) for port in range(1, 31)]
+        alerts = detector.observe(logs, self.system)
+        assert len(alerts) == 1
+        assert alerts[0].alert_type == 'port_scan'
+        assert alerts[0].dst_ip == '192.168.1.10'
+        assert alerts[0].metadata['ports'] == 10
+        # Quiet for a window, then a fresh scan alerts again
+        later = [_log('203.0.113.5', '192.168.1.10', port, seconds=70 + port, start=start) for port in range(1, 11)]
+        assert len(detector.observe(later, self.system)) == 1
+    
+    def test_host_sweep_and_slow_scan(self):
+        detector = PortScanDetector(max_sources=100)
+        start = timezone.now()
+        sweep = [_log('203.0.113.6', f'192.168.2.{host}', 445, start=start) for host in range(1, 11)]
+        alerts = detector.observe(sweep, self.system)
+        assert len(alerts) == 1
+        assert alerts[0].dst_ip is None
+        assert alerts[0].metadata['hosts_on_port'] == 10
+        # One new port every 10 seconds never has 10 ports inside a minute
+        slow = [_log('203.0.113.7', '192.168.1.10', port, seconds=port * 10, start=start) for port in range(1, 40)]
+        assert detector.observe(slow, self.system) == []
+    
+    def test_normal_traffic_does_not_alert(self):
+        detector = PortScanDetector(max_sources=100)
+        logs = [
+            _log(f'10.0.0.{host}', f'192.168.1.{host % 3}', port)
+            for host in range(50) for port in (53, 80, 443, 443, 8080)
+        ]
+        assert detector.observe(logs, self.system) == []
+        assert len(detector) == 50
+    
+    def test_idle_and_excess_sources_are_evicted(self):
+        detector = PortScanDetector(max_sources=5)
+        start = timezone.now()
+        detector.observe([_log(f'10.0.0.{host}', '192.168.1.1', 80, start=start) for host in range(20)], self.system)
+        assert list(detector.sources) == [f'10.0.0.{host}' for host in range(15, 20)]
+        detector.observe([_log('10.0.1.1', '192.168.1.1', 80, seconds=120, start=start)], self.system)
+        assert list(detector.sources) == ['10.0.1.1']
+    
+    @pytest.mark.django_db
+    def test_ingestion_raises_alerts(self, django_capture_on_commit_callbacks):
+        system = SystemSettings.load()
+        system.port_scan_limit = 5
+        with django_capture_on_commit_callbacks(execute=True):
+            system.save()
+        instances, _ = validate_logs([
+            {
+                'timestamp': timezone.now().isoformat(), 'src_ip': '203.0.113.9', 'dst_ip': '192.168.1.10',
+                'proto': 'TCP', 'packet_size': 60, 'action': 'allow', 'raw_json': {'dst_port': port},
+            }
+            for port in range(20, 30)
+        ])
+        save_logs(instances, broadcast=False)
+        alert = Alert.objects.get()
+        assert (alert.alert_type, alert.severity, alert.src_ip) == ('port_scan', 'high', '203.0.113.9')
+
+
+class TestRateDetector:
+    system = SystemSettings(suspicious_traffic_threshold=20, monitoring_window_minutes=1)
+    
+    def test_flood_alerts_once_per_window(self):
+        detector = RateDetector(max_sources=10, width=256, depth=4)
+        start = timezone.now()
+        flood = [_log('203.0.113.5', '192.168.1.1', 80, seconds=index / 10, start=start) for index in range(50)]
+        alerts = detector.observe(flood[:25], self.system) + detector.observe(flood[25:], self.system)
+        assert len(alerts) == 1
+        assert alerts[0].alert_type == 'suspicious_traffic'
+        assert alerts[0].severity == 'medium'
+        assert alerts[0].metadata['requests'] == 25
+        # Twice the limit within one batch is high severity
+        burst = [_log('203.0.113.6', '192.168.1.1', 80, start=start) for _ in range(40)]
+        assert [alert.severity for alert in detector.observe(burst, self.system)] == ['high']
+    
+    def test_window_slides_and_quiet_sources_do_not_alert(self):
+        detector = RateDetector(max_sources=10, width=256, depth=4)
+        start = timezone.now()
+        early = [_log('203.0.113.5', '192.168.1.1', 80, seconds=index, start=start) for index in range(15)]
+        late = [_log('203.0.113.5', '192.168.1.1', 80, seconds=90 + index, start=start) for index in range(15)]
+        many = [_log(f'10.0.{host // 256}.{host % 256}', '192.168.1.1', 80, start=start) for host in range(2000)]
+        assert detector.observe(early, self.system) == []
+        assert detector.observe(late, self.system) == []
+        assert detector.observe(many, self.system) == []
+    
+    def test_exact_table_is_bounded(self):
+        detector = RateDetector(max_sources=3, width=256, depth=4)
+        start = timezone.now()
+        logs = [_log(f'203.0.113.{host}', '192.168.1.1', 80, start=start) for host in range(10) for _ in range(12)]
+        detector.observe(logs, self.system)
+        assert len(detector) == 3
+    
+    @pytest.mark.django_db
+    def test_ingestion_raises_alerts(self, django_capture_on_commit_callbacks):
+        system = SystemSettings.load()
+        system.suspicious_traffic_threshold = 10
+        system.monitoring_window_minutes = 1
+        with django_capture_on_commit_callbacks(execute=True):
+            system.save()
+        instances, _ = validate_logs([
+            {
+                'timestamp': timezone.now().isoformat(), 'src_ip': '203.0.113.9', 'dst_ip': '192.168.1.10',
+                'proto': 'TCP', 'packet_size': 60, 'action': 'allow',
+            }
+            for _ in range(12)
+        ])
+        save_logs(instances, broadcast=False)
+        alert = Alert.objects.get()
+        assert (alert.alert_type, alert.src_ip) == ('suspicious_traffic', '203.0.113.9')
+
+
+class TestPacketSizeDetector:
+    system = SystemSettings(packet_size_threshold=9000, monitoring_window_minutes=1)
+    
+    @pytest.fixture(params=['numpy', 'python'])
+    def detector(self, request):
+        if request.param == 'numpy' and detectors.np is None:
+            pytest.skip('NumPy is not installed')
+        return PacketSizeDetector(max_sources=100, vectorized=request.param == 'numpy')
+    
+    def _batch(self, sizes, src_ip='10.0.0.5'):
+        return [_log(src_ip, '192.168.1.1', 443, packet_size=size) for size in sizes]
+    
+    def test_static_threshold_alerts_once_for_largest(self, detector):
+        logs = self._batch([100] * 40 + [9500, 12000, 9000])
+        alerts = detector.observe(logs, self.system)
+        assert len(alerts) == 1
+        assert (alerts[0].alert_type, alerts[0].severity) == ('suspicious_traffic', 'medium')
+        assert alerts[0].metadata['packet_size'] == 12000
+        assert alerts[0].metadata['outliers'] == 3
+        # Quiet for the rest of the window
+        assert detector.observe(self._batch([15000] * 40), self.system) == []
+    
+    def test_baseline_outliers(self, detector):
+        rng = random.Random(1)
+        detector.observe(self._batch([rng.randint(90, 110) for _ in range(60)]), self.system)
+        assert detector.observe(self._batch([rng.randint(90, 110) for _ in range(40)] + [130]), self.system) == []
+        alerts = detector.observe(self._batch([100] * 40 + [600]), self.system)
+        assert [(alert.severity, alert.metadata['packet_size']) for alert in alerts] == [('low', 600)]
+        # New sources have no baseline yet
+        assert detector.observe(self._batch([100] * 40 + [600], src_ip='10.0.0.6'), self.system) == []
+    
+    @pytest.mark.skipif(detectors.np is None, reason='NumPy is not installed')
+    def test_numpy_and_python_agree(self):
+        rng = random.Random(7)
+        vectorized = PacketSizeDetector(max_sources=50, vectorized=True)
+        plain = PacketSizeDetector(max_sources=50, vectorized=False)
+        start = timezone.now()
+        for batch in range(40):
+            logs = [
+                _log(f'10.0.0.{rng.randrange(60)}', '192.168.1.1', 443, seconds=batch * 5, start=start,
+                     packet_size=int(rng.lognormvariate(5, 0.4)) if rng.random() > 0.002 else 9500)
+                for _ in range(rng.choice((1, 20, 200)))
+            ]
+            summary = [
+                [(alert.src_ip, alert.severity, alert.metadata['packet_size']) for alert in alerts]
+                for alerts in (vectorized.observe(logs, self.system), plain.observe(logs, self.system))
+            ]
+            assert summary[0] == summary[1]
+        assert vectorized.slots == plain.slots
+        assert len(plain) == 50
+        for slot in plain.slots.values():
+            assert vectorized._mean[slot] == pytest.approx(plain._mean[slot])
+    
+    @pytest.mark.django_db
+    def test_ingestion_raises_alerts(self):
+        instances, _ = validate_logs([
+            {
+                'timestamp': timezone.now().isoformat(), 'src_ip': '203.0.113.9', 'dst_ip': '192.168.1.10',
+                'proto': 'UDP', 'packet_size': size, 'action': 'allow',
+            }
+            for size in (512, 64000)
+        ])
+        save_logs(instances, broadcast=False)
+        alert = Alert.objects.get()
+        assert (alert.alert_type, alert.dst_ip) == ('suspicious_traffic', '192.168.1.10')
+        assert alert.metadata['packet_size'] == 64000
+
+
+@pytest.mark.django_db
+class TestAlertDedup:
+    @pytest.fixture(autouse=True)
+    def batched_counters(self, settings):
+        settings.ALERT_DEDUP_WINDOW_SECONDS = 300
+        settings.ALERT_DEDUP_FLUSH_SECONDS = 60
+    
+    def _alert(self, seconds=0, dst_ip=None, start=None):
+        return Alert(
+            alert_type='port_scan', severity='high', src_ip='203.0.113.5', dst_ip=dst_ip,
+            message='scan', timestamp=(start or timezone.now()) + timedelta(seconds=seconds),
+        )
+    
+    def test_api_repeats_fold_into_one_alert(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        start = timezone.now()
+        statuses = []
+        for seconds in (0, 30, 90):
+            response = api_client.post('/api/alerts/', {
+                'alert_type': 'port_scan', 'severity': 'high', 'src_ip': '203.0.113.5',
+                'message': 'scan', 'timestamp': (start + timedelta(seconds=seconds)).isoformat(),
+            }, format='json')
+            statuses.append(response.status_code)
+        assert statuses == [status.HTTP_201_CREATED, status.HTTP_200_OK, status.HTTP_200_OK]
+        assert response.data['occurrences'] == 3
+        # Counters are written in batches
+        alert = Alert.objects.get()
+        assert alert.occurrences == 1
+        assert get_deduplicator().flush() == 1
+        alert.refresh_from_db()
+        assert alert.occurrences == 3
+        assert (alert.first_seen, alert.last_seen) == (start, start + timedelta(seconds=90))
+    
+    def test_key_and_window(self):
+        start = timezone.now()
+        targets = record_alerts([
+            self._alert(start=start),
+            self._alert(10, start=start),
+            self._alert(10, dst_ip='192.168.1.10', start=start),
+            self._alert(400, start=start),
+        ])
+        assert targets[1] is targets[0]
+        assert len({id(target) for target in targets}) == 3
+        # Repeats of an alert saved in the same batch are part of its insert
+        assert Alert.objects.get(pk=targets[0].pk).occurrences == 2
+        assert Alert.objects.count() == 3
+    
+    def test_raw_inserts_default_to_one_occurrence(self):
+        if connection.vendor != 'postgresql':
+            pytest.skip('the column default is set by a PostgreSQL-only migration')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO alerts (alert_type, severity, src_ip, status, message, timestamp, created_at) "
+                "VALUES ('ddos', 'low', '203.0.113.5', 'open', 'raw', now(), now())"
+            )
+        assert Alert.objects.get().occurrences == 1
+    
+    def test_folds_into_alerts_saved_by_other_workers(self, settings):
+        settings.ALERT_DEDUP_FLUSH_COUNT = 2
+        start = timezone.now()
+        earlier = Alert.objects.create(
+            alert_type='port_scan', severity='high', src_ip='203.0.113.5', message='scan',
+            timestamp=start, first_seen=start, last_seen=start,
+        )
+        record_alerts([self._alert(5, start=start)])
+        record_alerts([self._alert(6, start=start)])
+        earlier.refresh_from_db()
+        assert Alert.objects.count() == 1
+        assert earlier.occurrences == 3
+        assert earlier.last_seen == start + timedelta(seconds=6)
+    
+    def test_resolved_alerts_are_not_folded_into(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        start = timezone.now()
+        alert = record_alerts([self._alert(start=start)])[0]
+        api_client.patch(f'/api/alerts/{alert.id}/resolve/')
+        record_alerts([self._alert(5, start=start)])
+        assert Alert.objects.count() == 2
+    
+    def test_alerts_resolved_by_other_workers(self):
+        start = timezone.now()
+        alert = record_alerts([self._alert(start=start)])[0]
+        record_alerts([self._alert(1, start=start)])
+        get_deduplicator().flush()
+        # Resolved elsewhere: this worker still folds until its next flush
+        Alert.objects.filter(pk=alert.pk).update(status='resolved', resolved_at=start + timedelta(seconds=2))
+        record_alerts([self._alert(3, start=start), self._alert(4, start=start)])
+        assert get_deduplicator().flush() == 1
+        alert.refresh_from_db()
+        assert alert.occurrences == 2
+        reopened = Alert.objects.get(status='open')
+        assert (reopened.occurrences, reopened.first_seen) == (2, start + timedelta(seconds=3))
+        # Later repeats fold into the new alert
+        assert record_alerts([self._alert(5, start=start)])[0].pk == reopened.pk
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_repeats_are_all_counted(self):
+        start = timezone.now()
+        barrier = threading.Barrier(4)
+        
+        def worker():
+            barrier.wait()
+            for index in range(25):
+                record_alerts([self._alert(index, start=start)])
+            connection.close()
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        get_deduplicator().flush()
+        assert list(Alert.objects.values_list('occurrences', flat=True)) == [100]
@@ -0,0 +1,113 @@
+import pytest
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from apps.logs.consumers import LogConsumer, AlertConsumer
+from apps.logs.subscriptions import LogFilter
+
+
+@pytest.mark.asyncio
+class TestCoalescedFanOut:
+    async def test_uncoalesced_sends_one_frame_per_event(self):
+        communicator = WebsocketCommunicator(AlertConsumer.as_asgi(), "/ws/alerts/")
+        connected, _ = await communicator.connect()
+        assert connected
+        
+        channel_layer = get_channel_layer()
+        for alert_id in (1, 2):
+            await channel_layer.group_send('alerts', {'type': 'alert_message', 'message': {'id': alert_id}})
+        
+        first = await communicator.receive_json_from(timeout=1)
+        second = await communicator.receive_json_from(timeout=1)
+        assert first == {'type': 'alert', 'data': {'id': 1}}
+        assert second == {'type': 'alert', 'data': {'id': 2}}
+        await communicator.disconnect()
+    
+    async def test_coalesces_until_window_elapses(self):
+        communicator = WebsocketCommunicator(LogConsumer.as_asgi(), "/ws/logs/?coalesce_ms=50")
+        connected, _ = await communicator.connect()
+        assert connected
+        
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send('logs', {'type': 'log_message', 'message': {'id': 1}})
+        await channel_layer.group_send('logs', {'type': 'log_batch', 'messages': [{'id': 2}, {'id': 3}]})
+        
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame == {'type': 'logs', 'data': [{'id': 1}, {'id': 2}, {'id': 3}]}
+        assert await communicator.receive_nothing(timeout=0.1)
+        await communicator.disconnect()
+    
+    async def test_flushes_when_max_events_reached(self):
+        communicator = WebsocketCommunicator(
+            LogConsumer.as_asgi(), "/ws/logs/?coalesce_ms=5000&coalesce_max=2"
+        )
+        connected, _ = await communicator.connect()
+        assert connected
+        
+        channel_layer = get_channel_layer()
+        for log_id in (1, 2, 3):
+            await channel_layer.group_send('logs', {'type': 'log_message', 'message': {'id': log_id}})
+        
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame == {'type': 'logs', 'data': [{'id': 1}, {'id': 2}]}
+        assert await communicator.receive_nothing(timeout=0.1)
+        await communicator.disconnect()
+    
+    async def test_subscription_filters_events(self):
+        communicator = WebsocketCommunicator(LogConsumer.as_asgi(), "/ws/logs/")
+        connected, _ = await communicator.connect()
+        assert connected
+        
+        await communicator.send_json_to({
+            'type': 'subscribe',
+            'filters': {'proto': ['TCP', 'UDP'], 'cidr': '10.0.0.0/8', 'min_packet_size': 100},
+        })
+        reply = await communicator.receive_json_from(timeout=1)
+        assert reply['type'] == 'subscribed'
+        assert reply['data']['cidr'] == ['10.0.0.0/8']
+        
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send('logs', {'type': 'log_batch', 'messages': [
+            {'id': 1, 'src_ip': '10.1.2.3', 'dst_ip': '8.8.8.8', 'proto': 'TCP', 'packet_size': 500},
+            {'id': 2, 'src_ip': '192.168.1.5', 'dst_ip': '8.8.8.8', 'proto': 'TCP', 'packet_size': 500},
+            {'id': 3, 'src_ip': '8.8.4.4', 'dst_ip': '10.9.9.9', 'proto': 'ICMP', 'packet_size': 500},
+            {'id': 4, 'src_ip': '8.8.4.4', 'dst_ip': '10.9.9.9', 'proto': 'UDP', 'packet_size': 50},
+        ]})
+        frame = await communicator.receive_json_from(timeout=1)
+        assert [log['id'] for log in frame['data']] == [1]
+        
+        await communicator.send_json_to({'type': 'subscribe', 'filters': {'proto': 'BOGUS'}})
+        reply = await communicator.receive_json_from(timeout=1)
+        assert reply['type'] == 'error'
+        # Malformed frames get an error too, and the connection stays usable
+        await communicator.send_json_to({'type': 'subscribe', 'filters': {'proto': [{}]}})
+        reply = await communicator.receive_json_from(timeout=1)
+        assert reply['type'] == 'error'
+        await communicator.send_json_to({'type': 'unsubscribe'})
+        reply = await communicator.receive_json_from(timeout=1)
+        assert reply['type'] == 'subscribed'
+        await communicator.disconnect()
+
+
+class TestLogFilter:
+    def test_empty_values_are_ignored(self):
+        assert LogFilter.compile({'src_ip': '', 'proto': ''}).is_empty()
+    
+    def test_exact_ip_and_src_cidr(self):
+        log_filter = LogFilter.compile({'dst_ip': '8.8.8.8', 'src_cidr': ['192.168.0.0/16', 'fd00::/8']})
+        assert log_filter.matches({'src_ip': '192.168.1.5', 'dst_ip': '8.8.8.8'})
+        assert not log_filter.matches({'src_ip': '172.16.0.1', 'dst_ip': '8.8.8.8'})
+        assert not log_filter.matches({'src_ip': '192.168.1.5', 'dst_ip': '1.1.1.1'})
+    
+    def test_rejects_unknown_keys(self):
+        with pytest.raises(ValueError):
+            LogFilter.compile({'port': 22})
+    
+    @pytest.mark.parametrize('filters', [
+        {'proto': [{}]}, {'action': [['allow']]}, {'src_ip': 167772161}, {'dst_ip': {}}, {'cidr': [None]},
+    ])
+    def test_rejects_non_string_values(self, filters):
+        with pytest.raises(ValueError):
+            LogFilter.compile(filters)
+
+
+
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework import status
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.alerts.models import Alert
+from apps.dashboard import cache as summary_cache, metrics
+
+User = get_user_model()
+
+
+@pytest.fixture
+def api_client():
+    client = APIClient()
+    client.force_authenticate(user=User.objects.create_user(username='viewer', password='testpass123'))
+    return client
+
+
+def make_alert(status='open'):
+    return Alert.objects.create(
+        alert_type='port_scan', severity='high', src_ip='10.0.0.1', dst_ip='10.0.0.2',
+        message='scan', status=status, timestamp=timezone.now()
+    )
+
+
+@pytest.mark.django_db
+class TestSummaryCache:
+    def test_repeat_polls_hit_the_cache(self, api_client, django_assert_num_queries):
+        first = api_client.get('/api/dashboard/summary/')
+        assert first.status_code == status.HTTP_200_OK
+        with django_assert_num_queries(0):
+            second = api_client.get('/api/dashboard/summary/')
+        assert second.data == first.data
+    
+    def test_alert_writes_invalidate(self, api_client, django_capture_on_commit_callbacks):
+        assert api_client.get('/api/dashboard/summary/').data['active_alerts'] == 0
+        with django_capture_on_commit_callbacks(execute=True):
+            alert = make_alert()
+        assert api_client.get('/api/dashboard/summary/').data['active_alerts'] == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            alert.status = 'resolved'
+            alert.save()
+        assert api_client.get('/api/dashboard/summary/').data['active_alerts'] == 0
+
+
+class TestStampedeProtection:
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'value': len(calls)}
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(summary_cache.get_summary(compute)))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{'value': 1}] * 20
+    
+    def test_serves_stale_while_another_worker_recomputes(self):
+        cache.set(summary_cache.STALE_KEY, {'value': 'stale'})
+        cache.add(summary_cache.LOCK_KEY, True)
+        assert summary_cache.get_summary(lambda: pytest.fail('recomputed')) == {'value': 'stale'}
+    
+    def test_keeps_another_workers_lock_after_waiting(self, settings):
+        settings.DASHBOARD_SUMMARY_LOCK_SECONDS = 0.1
+        cache.add(summary_cache.LOCK_KEY, 'other-worker', 60)
+        assert summary_cache.get_summary(lambda: {'value': 'fresh'}) == {'value': 'fresh'}
+        assert cache.get(summary_cache.LOCK_KEY) == 'other-worker'
+    
+    def test_releases_own_lock(self):
+        assert summary_cache.get_summary(lambda: {'value': 'fresh'}) == {'value': 'fresh'}
+        assert cache.get(summary_cache.LOCK_KEY) is None
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_requests_are_timed_with_query_counts(self, api_client):
+        before = metrics.REQUEST_SECONDS.count('GET', 'dashboard-summary')
+        api_client.get('/api/dashboard/summary/')
+        assert metrics.REQUEST_SECONDS.count('GET', 'dashboard-summary') == before + 1
+        assert metrics.REQUESTS.value('GET', 'dashboard-summary', '200') >= 1
+        
+        body = APIClient().get('/api/metrics/').content.decode()
+        assert '# TYPE secupi_http_request_duration_seconds histogram' in body
+        assert 'secupi_http_request_db_queries_bucket{view="dashboard-summary",le="+Inf"}' in body
+    
+    def test_publish_timings(self, api_client):
+        before = metrics.PUBLISH_SECONDS.count('alerts')
+        api_client.force_authenticate(user=User.objects.create_user(username='ops', password='x', role='admin'))
+        response = api_client.post('/api/alerts/', {
+            'alert_type': 'port_scan', 'severity': 'high', 'src_ip': '10.0.0.1',
+            'message': 'scan', 'timestamp': timezone.now().isoformat(),
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert metrics.PUBLISH_SECONDS.count('alerts') == before + 1
+    
+    def test_token_required_when_configured(self, settings):
+        settings.METRICS_TOKEN = 'scrape-me'
+        client = APIClient()
+        assert client.get('/api/metrics/').status_code == status.HTTP_401_UNAUTHORIZED
+        response = client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me')
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('demo_seconds', 'Demo.', ('view',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, 'x')
+        samples = {name + labels: value for name, labels, value in histogram.samples()}
+        assert samples['demo_seconds_bucket{view="x",le="0.1"}'] == 1
+        assert samples['demo_seconds_bucket{view="x",le="1.0"}'] == 2
+        assert samples['demo_seconds_bucket{view="x",le="+Inf"}'] == 3
+        assert samples['demo_seconds_sum{view="x"}'] == 5.55
+
@@ -0,0 +1,328 @@
+import ipaddress
+import struct
+import threading
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.alerts.dedup import record_alerts
+from apps.alerts.models import Alert
+from apps.firewall.autoblock import block_addresses, get_auto_blocker
+from apps.firewall.models import FirewallRule, FirewallRuleChange
+from apps.firewall import device_table, matcher as rule_matcher
+from apps.settings.models import SystemSettings
+from apps.firewall.matcher import RuleMatcher, get_matcher
+
+User = get_user_model()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin_user():
+    return User.objects.create_user(
+        username='testadmin',
+        password='testpass123',
+        role='admin'
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_matcher():
+    """Rows rolled back between tests do not fire signals; force a re-check."""
+    rule_matcher.invalidate_matcher()
+    yield
+    rule_matcher.invalidate_matcher()
+
+
+def _rule(name, src='*', dst='*', proto='*', port='*', action='block', **kwargs):
+    return FirewallRule.objects.create(name=name, src=src, dst=dst, proto=proto, port=port, action=action, **kwargs)
+
+
+@pytest.mark.django_db
+class TestRuleMatcher:
+    def test_first_matching_rule_wins(self):
+        # Created last, so listed (and evaluated) first
+        broad = _rule('Block LAN', src='192.168.1.0/24')
+        narrow = _rule('Allow admin host', src='192.168.1.10', action='allow')
+        matcher = RuleMatcher(rule_matcher.active_rules())
+        assert matcher.match('192.168.1.10', '10.0.0.1', 'TCP', 22).id == narrow.id
+        assert matcher.match('192.168.1.11', '10.0.0.1', 'TCP', 22).id == broad.id
+        assert matcher.match('192.168.2.10', '10.0.0.1', 'TCP', 22) is None
+    
+    def test_protocol_and_port_intervals(self):
+        web = _rule('Web', dst='10.0.0.0/8', proto='TCP', port='80,443,8000-8080', action='allow')
+        dns = _rule('DNS', proto='UDP', port='53', action='allow')
+        matcher = RuleMatcher(rule_matcher.active_rules())
+        assert matcher.match('1.2.3.4', '10.1.1.1', 'TCP', 8080).id == web.id
+        assert matcher.match('1.2.3.4', '10.1.1.1', 'HTTPS', 443).id == web.id
+        assert matcher.match('1.2.3.4', '10.1.1.1', 'TCP', 8081) is None
+        assert matcher.match('1.2.3.4', '10.1.1.1', 'UDP', 80) is None
+        assert matcher.match('1.2.3.4', '8.8.8.8', 'UDP', 53).id == dns.id
+        # Without a port only "*" port rules can match
+        assert matcher.match('1.2.3.4', '8.8.8.8', 'UDP') is None
+    
+    def test_wildcards_ipv6_and_invalid_rules(self):
+        bad = _rule('Broken', src='not-an-ip')
+        v6 = _rule('Block v6 net', src='2001:db8::/32', proto='ICMP')
+        matcher = RuleMatcher(rule_matcher.active_rules())
+        assert matcher.skipped == [bad.id]
+        assert matcher.match('2001:db8::1', '::1', 'ICMP').id == v6.id
+        assert matcher.match('2001:db9::1', '::1', 'ICMP') is None
+        assert matcher.match('192.0.2.1', '::1', 'ICMP') is None
+        with pytest.raises(ValueError):
+            matcher.match('999.1.1.1', '10.0.0.1', 'TCP', 80)
+    
+    def test_match_many_agrees_with_match(self):
+        _rule('Web', dst='10.0.0.0/8', proto='TCP', port='80,443', action='allow')
+        _rule('Host', src='192.168.1.7')
+        _rule('Any UDP', proto='UDP', port='1000-2000', action='drop')
+        matcher = RuleMatcher(rule_matcher.active_rules())
+        tuples = [
+            (src, dst, proto, port)
+            for src in ('192.168.1.7', '192.168.1.8', '2001:db8::1')
+            for dst in ('10.1.1.1', '8.8.8.8')
+            for proto in ('TCP', 'HTTPS', 'UDP', 'OTHER')
+            for port in (None, 80, 1500)
+        ]
+        assert matcher.match_many(tuples) == [matcher.match(*item) for item in tuples]
+    
+    def test_get_matcher_rebuilds_when_rules_change(self):
+        rule = _rule('Block host', src='10.0.0.5')
+        first = get_matcher()
+        assert get_matcher() is first
+        assert first.match('10.0.0.5', '10.0.0.1', 'TCP', 80).id == rule.id
+        
+        rule.is_active = False
+        rule.save()
+        second = get_matcher()
+        assert second is not first
+        assert second.match('10.0.0.5', '10.0.0.1', 'TCP', 80) is None
+        
+        rule.delete()
+        assert get_matcher() is not second
+
+
+@pytest.mark.django_db
+class TestFirewallAPI:
+    def test_rejects_malformed_rules(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post('/api/firewall/rules/', {
+            'name': 'Bad', 'src': '10.0.0.0/33', 'dst': '*', 'proto': 'TCP', 'port': '70000', 'action': 'block',
+        }, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert set(response.data) == {'src', 'port'}
+    
+    def test_evaluate_batch(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        rule = _rule('Block SSH', dst='10.0.0.0/24', proto='TCP', port='22')
+        response = api_client.post('/api/firewall/rules/evaluate/', [
+            {'src': '192.168.1.5', 'dst': '10.0.0.7', 'proto': 'tcp', 'port': 22},
+            {'src': '192.168.1.5', 'dst': '10.0.0.7', 'proto': 'TCP', 'port': 23},
+            {'src': 'nope', 'dst': '10.0.0.7', 'proto': 'TCP'},
+        ], format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0] == {'rule': rule.id, 'name': 'Block SSH', 'action': 'block'}
+        assert response.data['results'][1]['rule'] is None
+        assert response.data['results'][2] is None
+        assert response.data['rejected'] == 1
+        assert response.data['errors'][0]['index'] == 2
+    
+    def test_evaluate_requires_admin(self, api_client):
+        response = api_client.post('/api/firewall/rules/evaluate/', [], format='json')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def _decode_table(body):
+    """Minimal device-side reader for the binary rule table."""
+    magic, fmt, kind, count, version, since = struct.unpack_from('>4sBBIQQ', body)
+    offset = 26
+    
+    def address():
+        nonlocal offset
+        family = body[offset]
+        offset += 1
+        if not family:
+            return '*'
+        length = body[offset]
+        size = (length + 7) // 8
+        packed = body[offset + 1:offset + 1 + size].ljust(4 if family == 4 else 16, b'\0')
+        offset += 1 + size
+        return f'{ipaddress.ip_address(packed)}/{length}'
+    
+    def rule():
+        nonlocal offset
+        rule_id, action, proto = struct.unpack_from('>IBB', body, offset)
+        offset += 6
+        src, dst = address(), address()
+        ports = [struct.unpack_from('>HH', body, offset + 1 + 4 * index) for index in range(body[offset])]
+        offset += 1 + 4 * len(ports)
+        return {'id': rule_id, 'action': action, 'proto': proto, 'src': src, 'dst': dst, 'ports': ports}
+    
+    records = []
+    for _ in range(count):
+        if kind == 0:
+            records.append(rule())
+            continue
+        op = body[offset]
+        offset += 1
+        if op == 1:
+            records.append(('upsert', rule()))
+        else:
+            records.append(('delete', struct.unpack_from('>I', body, offset)[0]))
+            offset += 4
+    assert magic == b'FWRT' and fmt == 1 and offset == len(body)
+    return {'kind': kind, 'version': version, 'since': since, 'records': records}
+
+
+@pytest.mark.django_db
+class TestDeviceRuleTable:
+    URL = '/api/firewall/device/rules/'
+    
+    def test_full_table_and_etag(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        ssh = _rule('Block SSH', src='10.1.0.0/16', proto='TCP', port='22,2222')
+        dns = _rule('Allow DNS', dst='2001:db8::53', proto='UDP', port='53', action='allow')
+        _rule('Disabled', is_active=False)
+        response = api_client.get(self.URL)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/octet-stream'
+        table = _decode_table(response.content)
+        assert table['kind'] == 0
+        assert str(table['version']) == response['X-Rule-Table-Version']
+        assert table['records'] == [
+            {'id': dns.id, 'action': 0, 'proto': 17, 'src': '*', 'dst': '2001:db8::53/128', 'ports': [(53, 53)]},
+            {'id': ssh.id, 'action': 1, 'proto': 6, 'src': '10.1.0.0/16', 'dst': '*', 'ports': [(22, 22), (2222, 2222)]},
+        ]
+        
+        response = api_client.get(self.URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_delta_since_version(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        kept = _rule('Kept', src='10.0.0.1')
+        disabled = _rule('Disabled later', src='10.0.0.2')
+        deleted = _rule('Deleted later', src='10.0.0.3')
+        version = int(api_client.get(self.URL)['X-Rule-Table-Version'])
+        
+        disabled.is_active = False
+        disabled.save()
+        deleted_id = deleted.id
+        deleted.delete()
+        added = _rule('Added', src='10.0.0.4', action='drop')
+        
+        response = api_client.get(self.URL, {'since': version})
+        table = _decode_table(response.content)
+        assert table['kind'] == 1
+        assert table['since'] == version
+        assert [(op, value['id'] if op == 'upsert' else value) for op, value in table['records']] == [
+            ('upsert', added.id), ('delete', deleted_id), ('delete', disabled.id),
+        ]
+        assert kept.id not in [value for op, value in table['records'] if op == 'delete']
+        
+        response = api_client.get(self.URL, {'since': table['version']})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_pruned_history_falls_back_to_full_table(self, api_client, admin_user, settings):
+        settings.FIREWALL_TABLE_HISTORY = 2
+        api_client.force_authenticate(user=admin_user)
+        _rule('First', src='10.0.0.1')
+        version = int(api_client.get(self.URL)['X-Rule-Table-Version'])
+        for index in range(3):
+            _rule(f'Later {index}', src=f'10.0.1.{index}')
+        table = _decode_table(api_client.get(self.URL, {'since': version}).content)
+        assert table['kind'] == 0
+        assert len(table['records']) == 4
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rule_table_versions_follow_commit_order():
+    if connection.vendor != 'postgresql':
+        pytest.skip('commit-ordered versions use a PostgreSQL advisory lock')
+    first_saved, release, second_done = threading.Event(), threading.Event(), threading.Event()
+    
+    def long_transaction():
+        try:
+            with transaction.atomic():
+                _rule('Auto-block 10.9.0.1/32', src='10.9.0.1')
+                first_saved.set()
+                release.wait(5)
+        finally:
+            connection.close()
+    
+    def admin_save():
+        try:
+            first_saved.wait(5)
+            _rule('Admin rule', src='10.9.0.2')
+            second_done.set()
+        finally:
+            connection.close()
+    
+    threads = [threading.Thread(target=long_transaction), threading.Thread(target=admin_save)]
+    for thread in threads:
+        thread.start()
+    assert first_saved.wait(5)
+    # The admin save must not take a version while the earlier change is uncommitted
+    assert not second_done.wait(0.5)
+    assert device_table.current_version() == 0
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert second_done.is_set()
+    changes = list(FirewallRuleChange.objects.order_by('id').values_list('rule_id', flat=True))
+    rules = dict(FirewallRule.objects.values_list('name', 'id'))
+    assert changes == [rules['Auto-block 10.9.0.1/32'], rules['Admin rule']]
+
+
+def _auto_blocked():
+    return sorted(FirewallRule.objects.filter(name__startswith='Auto-block ').values_list('src', flat=True))
+
+
+@pytest.mark.django_db
+class TestAutoBlock:
+    def test_merges_addresses_and_existing_rules_into_cidrs(self):
+        _rule('Auto-block 198.51.100.4/30', src='198.51.100.4/30')
+        report = block_addresses(['198.51.100.0', '198.51.100.1', '198.51.100.2', '198.51.100.3', '2001:db8::1'])
+        assert _auto_blocked() == ['198.51.100.0/29', '2001:db8::1/128']
+        assert report == {
+            'addresses': 5, 'skipped': 0, 'rules_before': 1, 'rules_after': 2,
+            'created': 1, 'updated': 1, 'deleted': 0, 'rules_saved': 4,
+        }
+        # Saved one by one, so the matcher and device table follow
+        assert get_matcher().match('198.51.100.6', '10.0.0.1', 'TCP', 80).name == 'Auto-block 198.51.100.0/29'
+        assert FirewallRuleChange.objects.count() == 3
+    
+    def test_skips_blocked_trusted_and_invalid_sources(self):
+        _rule('Block net', src='203.0.113.0/24', action='drop')
+        _rule('Trusted host', src='192.0.2.10', action='allow')
+        _rule('Allow web', proto='TCP', port='443', action='allow')
+        report = block_addresses(['203.0.113.9', '192.0.2.10', 'nope', '192.0.2.11'])
+        assert _auto_blocked() == ['192.0.2.11/32']
+        assert (report['addresses'], report['skipped']) == (1, 3)
+        assert block_addresses(['192.0.2.11'])['created'] == 0
+    
+    def test_high_severity_alerts_blocked_when_enabled(self, settings, django_capture_on_commit_callbacks):
+        settings.AUTO_BLOCK_DEBOUNCE_SECONDS = 60
+        system = SystemSettings.load()
+        now = timezone.now()
+        record_alerts([
+            Alert(alert_type='port_scan', severity='high', src_ip='198.51.100.7', message='scan', timestamp=now),
+            Alert(alert_type='port_scan', severity='low', src_ip='198.51.100.8', message='scan', timestamp=now),
+        ])
+        assert get_auto_blocker().pending == {'198.51.100.7'}
+        assert get_auto_blocker().flush() is None
+        assert _auto_blocked() == []
+        
+        system.auto_block_suspicious_ip = True
+        with django_capture_on_commit_callbacks(execute=True):
+            system.save()
+        record_alerts([
+            Alert(alert_type='ddos', severity='critical', src_ip='198.51.100.6', message='flood', timestamp=now),
+        ])
+        assert get_auto_blocker().flush()['rules_after'] == 1
+        assert _auto_blocked() == ['198.51.100.6/32']
@@ -1,9 +1,26 @@
 import pytest
+import json
+import threading
+from io import StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.utils import timezone
-from apps.logs.models import NetworkLog
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Count, Sum
+from apps.logs.models import NetworkLog, TrafficRollup
+from apps.logs.buffer import WriteBehindBuffer, dead_letter_logs
+from apps.logs import views as log_views
+from apps.logs import ingestion, partitions, rollups
+from apps.logs.ingestion import save_logs, validate_logs
+from apps.alerts.models import Alert
+from apps.dashboard import metrics
+from apps.firewall.autoblock import get_auto_blocker
+from apps.firewall.models import FirewallRule
+from apps.settings.models import SystemSettings
+from apps.settings.retention import purge_expired
 
 User = get_user_model()
 
@@ -77,6 +94,538 @@ class TestLogsAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data['results']) == 1
         assert response.data['results'][0]['proto'] == 'TCP'
+    
+    def test_batch_create_logs(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        now = timezone.now().isoformat()
+        logs = [
+            {'timestamp': now, 'src_ip': '192.168.1.50', 'dst_ip': '8.8.8.8',
+             'proto': 'TCP', 'packet_size': 512, 'action': 'allow'},
+            {'timestamp': now, 'src_ip': 'not-an-ip', 'dst_ip': '8.8.8.8',
+             'proto': 'TCP', 'packet_size': 512, 'action': 'allow'},
+            {'timestamp': now, 'src_ip': '192.168.1.51', 'dst_ip': '1.1.1.1',
+             'proto': 'UDP', 'packet_size': 128, 'action': 'block'},
+        ]
+        response = api_client.post('/api/logs/batch/', logs, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['created'] == 2
+        assert response.data['rejected'] == 1
+        assert response.data['errors'][0]['index'] == 1
+        assert 'src_ip' in response.data['errors'][0]['errors']
+        assert NetworkLog.objects.count() == 2
+    
+    def test_batch_rejects_non_array(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post('/api/logs/batch/', {'src_ip': '192.168.1.50'}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert NetworkLog.objects.count() == 0
+    
+    def test_stream_ndjson_logs(self, api_client, admin_user, settings):
+        settings.LOG_INGEST_STREAM_BATCH_SIZE = 2
+        api_client.force_authenticate(user=admin_user)
+        now = timezone.now().isoformat()
+        lines = [
+            json.dumps({'timestamp': now, 'src_ip': '192.168.1.50', 'dst_ip': '8.8.8.8',
+                        'proto': 'TCP', 'packet_size': 512, 'action': 'allow'}),
+            '{not json',
+            json.dumps({'timestamp': now, 'src_ip': '192.168.1.51', 'dst_ip': '8.8.8.8',
+                        'proto': 'BOGUS', 'packet_size': 512, 'action': 'allow'}),
+            '',
+            json.dumps({'timestamp': now, 'src_ip': '192.168.1.52', 'dst_ip': '1.1.1.1',
+                        'proto': 'UDP', 'packet_size': 64, 'action': 'drop'}),
+            json.dumps({'timestamp': now, 'src_ip': '192.168.1.53', 'dst_ip': '1.1.1.1',
+                        'proto': 'ICMP', 'packet_size': 64, 'action': 'allow'}),
+        ]
+        response = api_client.post(
+            '/api/logs/stream/', '\n'.join(lines), content_type='application/x-ndjson'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['accepted'] == 3
+        assert response.data['rejected'] == 2
+        assert [error['line'] for error in response.data['errors']] == [2, 3]
+        assert response.data['last_line'] == 6
+        assert NetworkLog.objects.count() == 3
+    
+    def test_stream_reports_committed_batches_when_a_save_fails(self, api_client, admin_user, settings, monkeypatch):
+        settings.LOG_INGEST_STREAM_BATCH_SIZE = 2
+        api_client.force_authenticate(user=admin_user)
+        now = timezone.now().isoformat()
+        lines = ['{not json'] + [
+            json.dumps({'timestamp': now, 'src_ip': f'192.168.1.{i}', 'dst_ip': '8.8.8.8',
+                        'proto': 'TCP', 'packet_size': 512, 'action': 'allow'})
+            for i in range(5)
+        ]
+        lines.insert(4, '{still not json')
+        calls = []
+        
+        def failing_save(instances):
+            calls.append(len(instances))
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return save_logs(instances)
+        
+        monkeypatch.setattr(ingestion, 'save_logs', failing_save)
+        response = api_client.post(
+            '/api/logs/stream/', '\n'.join(lines), content_type='application/x-ndjson'
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert (response.data['accepted'], response.data['rejected'], response.data['last_line']) == (2, 1, 3)
+        assert [error['line'] for error in response.data['errors']] == [1]
+        assert 'line 4' in response.data['error']
+        assert NetworkLog.objects.count() == 2
+    
+    def test_stream_read_failure_keeps_committed_lines(self):
+        now = timezone.now().isoformat()
+        
+        def body():
+            for i in range(3):
+                yield json.dumps({'timestamp': now, 'src_ip': f'192.168.1.{i}', 'dst_ip': '8.8.8.8',
+                                  'proto': 'TCP', 'packet_size': 512, 'action': 'allow'})
+            raise OSError('client went away')
+        
+        result = ingestion.ingest_ndjson(body(), batch_size=2)
+        assert (result['accepted'], result['last_line']) == (2, 2)
+        assert 'error' in result
+        assert NetworkLog.objects.count() == 2
+    
+    @pytest.mark.parametrize('backend', ['orm', 'copy'])
+    def test_load_logs_command(self, tmp_path, backend):
+        if backend == 'copy' and connection.vendor != 'postgresql':
+            pytest.skip('COPY requires PostgreSQL')
+        now = timezone.now().isoformat()
+        path = tmp_path / 'logs.ndjson'
+        path.write_text('\n'.join([
+            json.dumps({'timestamp': now, 'src_ip': '10.0.0.1', 'dst_ip': '10.0.0.2', 'proto': 'TCP',
+                        'packet_size': 60, 'action': 'allow', 'raw_json': {'iface': 'eth0'}}),
+            json.dumps({'timestamp': now, 'src_ip': '10.0.0.3', 'dst_ip': '10.0.0.4', 'proto': 'UDP',
+                        'packet_size': 90, 'action': 'drop'}),
+            json.dumps({'timestamp': now, 'src_ip': 'bad', 'dst_ip': '10.0.0.4', 'proto': 'UDP',
+                        'packet_size': 90, 'action': 'drop'}),
+        ]))
+        call_command('load_logs', str(path), backend=backend, batch_size=2)
+        assert NetworkLog.objects.count() == 2
+        log = NetworkLog.objects.get(src_ip='10.0.0.1')
+        assert log.raw_json == {'iface': 'eth0'}
+        assert log.created_at is not None
+        assert NetworkLog.objects.get(src_ip='10.0.0.3').raw_json is None
+    
+    def test_load_logs_runs_no_detectors(self, tmp_path, django_capture_on_commit_callbacks):
+        system = SystemSettings.load()
+        system.auto_block_suspicious_ip = True
+        with django_capture_on_commit_callbacks(execute=True):
+            system.save()
+        now = timezone.now()
+        path = tmp_path / 'scan.ndjson'
+        path.write_text('\n'.join(
+            json.dumps({'timestamp': (now + timedelta(milliseconds=port)).isoformat(), 'src_ip': '203.0.113.9',
+                        'dst_ip': '10.0.0.2', 'proto': 'TCP', 'packet_size': 60000, 'action': 'allow',
+                        'raw_json': {'dst_port': port}})
+            for port in range(1, 301)
+        ))
+        call_command('load_logs', str(path), backend='orm', batch_size=100)
+        assert NetworkLog.objects.count() == 300
+        assert not Alert.objects.exists()
+        assert not get_auto_blocker().pending
+        assert get_auto_blocker().flush() is None
+        assert not FirewallRule.objects.exists()
+        
+        call_command('load_logs', str(path), backend='orm', benchmark=True, stdout=StringIO())
+        assert NetworkLog.objects.count() == 300
+        assert not Alert.objects.exists()
+    
+    def test_create_log_write_behind(self, api_client, admin_user, settings, monkeypatch):
+        settings.LOG_INGEST_WRITE_BEHIND = True
+        written = []
+        buffer = WriteBehindBuffer(writer=written.extend, max_size=1)
+        monkeypatch.setattr(log_views, 'get_buffer', lambda: buffer)
+        api_client.force_authenticate(user=admin_user)
+        log_data = {
+            'timestamp': timezone.now().isoformat(),
+            'src_ip': '192.168.1.50',
+            'dst_ip': '8.8.8.8',
+            'proto': 'TCP',
+            'packet_size': 512,
+            'action': 'allow'
+        }
+        response = api_client.post('/api/logs/', log_data, format='json')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        response = api_client.post('/api/logs/', log_data, format='json')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        
+        buffer.close()
+        assert [log.src_ip for log in written] == ['192.168.1.50']
+        assert buffer.stats()['rejected'] == 1
+
+
+@pytest.mark.django_db
+class TestRuleEvaluation:
+    @pytest.fixture(autouse=True)
+    def evaluate_rules(self, settings):
+        settings.LOG_INGEST_EVALUATE_RULES = True
+        settings.FIREWALL_MATCHER_RECHECK_SECONDS = 0
+    
+    def _log(self, src_ip, dst_ip='10.0.0.1', proto='TCP', **extra):
+        return {
+            'timestamp': timezone.now().isoformat(), 'src_ip': src_ip, 'dst_ip': dst_ip,
+            'proto': proto, 'packet_size': 60, 'action': 'allow', **extra,
+        }
+    
+    @pytest.mark.parametrize('backend', ['orm', 'copy'])
+    def test_batch_records_rule_decisions(self, backend, django_capture_on_commit_callbacks):
+        if backend == 'copy' and connection.vendor != 'postgresql':
+            pytest.skip('COPY requires PostgreSQL')
+        ssh = FirewallRule.objects.create(
+            name='Block SSH', src='*', dst='10.0.0.0/24', proto='TCP', port='22', action='drop'
+        )
+        lan = FirewallRule.objects.create(
+            name='Allow LAN', src='192.168.1.0/24', dst='*', proto='*', port='*', action='allow'
+        )
+        settings_row = SystemSettings.load()
+        settings_row.default_action = 'deny'
+        with django_capture_on_commit_callbacks(execute=True):
+            settings_row.save()
+        
+        instances, _ = validate_logs([
+            self._log('192.168.1.5', raw_json={'dst_port': 22}),
+            self._log('172.16.0.9', raw_json={'dst_port': 22}),
+            self._log('172.16.0.9', raw_json={'dst_port': 80}),
+        ])
+        save_logs(instances, broadcast=False, backend=backend)
+        decisions = list(NetworkLog.objects.order_by('id').values_list('rule_action', 'matched_rule_id'))
+        # The newer LAN rule comes first; unmatched traffic falls back to "deny"
+        assert decisions == [('allow', lan.id), ('drop', ssh.id), ('block', None)]
+    
+    def test_single_create_records_default_action(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post('/api/logs/', self._log('10.9.9.9'), format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['rule_action'] == 'allow'
+        assert response.data['matched_rule'] is None
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    @pytest.fixture
+    def logs(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        base = timezone.now()
+        # Pairs of rows share a timestamp so ties are broken by id
+        return NetworkLog.objects.bulk_create([
+            NetworkLog(
+                timestamp=base - timedelta(seconds=i // 2), src_ip='10.0.0.1', dst_ip='10.0.0.2',
+                proto='TCP', packet_size=i, action='allow'
+            )
+            for i in range(25)
+        ])
+    
+    def test_walks_forward_and_back_without_gaps(self, api_client, logs):
+        expected = list(NetworkLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        pages = []
+        url = '/api/logs/?page_size=10'
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            pages.append([log['id'] for log in response.data['results']])
+            url = response.data['next']
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert sum(pages, []) == expected
+        
+        back = api_client.get(api_client.get(response.data['previous']).data['previous']).data
+        assert [log['id'] for log in back['results']] == pages[0]
+        assert back['previous'] is None
+    
+    def test_page_param_and_custom_ordering_fall_back(self, api_client, logs):
+        response = api_client.get('/api/logs/', {'page': 2})
+        assert response.data['count'] == 25
+        assert len(response.data['results']) == 5
+        response = api_client.get('/api/logs/', {'ordering': 'packet_size'})
+        assert response.data['count'] == 25
+        assert response.data['results'][0]['packet_size'] == 0
+    
+    def test_ascending_timestamp_order(self, api_client, logs):
+        first = api_client.get('/api/logs/', {'ordering': 'timestamp', 'page_size': 20}).data
+        second = api_client.get(first['next']).data
+        ids = [log['id'] for log in first['results'] + second['results']]
+        assert ids == list(NetworkLog.objects.order_by('timestamp', 'id').values_list('id', flat=True))
+    
+    def test_rejects_tampered_cursor(self, api_client, logs):
+        assert api_client.get('/api/logs/', {'cursor': 'not-a-cursor'}).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestEstimatedCounts:
+    @pytest.fixture(autouse=True)
+    def logs(self, api_client, admin_user):
+        if connection.vendor != 'postgresql':
+            pytest.skip('planner estimates are PostgreSQL only')
+        api_client.force_authenticate(user=admin_user)
+        NetworkLog.objects.bulk_create([
+            NetworkLog(
+                timestamp=timezone.now(), src_ip='10.0.0.1', dst_ip='10.0.0.2',
+                proto='UDP' if i % 2 else 'TCP', packet_size=i, action='allow'
+            )
+            for i in range(30)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE network_logs')
+    
+    def test_exact_below_threshold(self, api_client):
+        response = api_client.get('/api/logs/', {'page': 1, 'proto': 'TCP'})
+        assert response.data['count'] == 15
+        assert response.data['count_estimated'] is False
+    
+    def test_estimated_at_threshold(self, api_client, settings):
+        settings.ESTIMATED_COUNT_THRESHOLD = 10
+        response = api_client.get('/api/logs/', {'page': 1})
+        assert response.data['count_estimated'] is True
+        assert response.data['count'] == 30
+        assert len(response.data['results']) == 20
+        
+        filtered = api_client.get('/api/logs/', {'page': 1, 'proto': 'TCP'})
+        assert filtered.data['count_estimated'] is True
+        assert 5 <= filtered.data['count'] <= 30
+    
+    def test_admin_changelist_uses_estimates(self, client, admin_user, settings):
+        admin_user.is_staff = admin_user.is_superuser = True
+        admin_user.save()
+        client.force_login(admin_user)
+        settings.ESTIMATED_COUNT_THRESHOLD = 10
+        response = client.get('/admin/logs/networklog/')
+        assert response.status_code == 200
+        assert response.context['cl'].paginator.count_estimated
+        assert not response.context['cl'].show_full_result_count
+        assert 'planner estimate' in response.content.decode()
+        
+        settings.ESTIMATED_COUNT_THRESHOLD = 1000
+        response = client.get('/admin/logs/networklog/')
+        assert not response.context['cl'].paginator.count_estimated
+        assert 'planner estimate' not in response.content.decode()
+
+
+class TestWriteBehindBuffer:
+    def test_flushes_full_batches(self):
+        batches = []
+        buffer = WriteBehindBuffer(writer=batches.append, batch_size=3, flush_ms=5000).start()
+        assert buffer.offer([1, 2, 3, 4])
+        buffer.close()
+        assert batches == [[1, 2, 3], [4]]
+        stats = buffer.stats()
+        assert stats['written'] == 4
+        assert stats['queue_depth'] == 0
+    
+    def test_flushes_after_interval(self):
+        flushed = threading.Event()
+        buffer = WriteBehindBuffer(writer=lambda batch: flushed.set(), batch_size=100, flush_ms=20).start()
+        buffer.offer([1])
+        assert flushed.wait(2)
+        buffer.close()
+    
+    def test_rejects_when_full(self):
+        buffer = WriteBehindBuffer(writer=lambda batch: None, max_size=2)
+        assert buffer.offer([1, 2])
+        assert not buffer.offer([3])
+        assert buffer.stats()['queue_depth'] == 2
+        assert metrics.WRITE_BEHIND_QUEUE_DEPTH.value() == 2
+    
+    def test_retries_failed_batches(self):
+        attempts = []
+        
+        def flaky(batch):
+            attempts.append(list(batch))
+            if len(attempts) < 3:
+                raise RuntimeError('database went away')
+        
+        flushes = metrics.WRITE_BEHIND_FLUSH_SECONDS.count()
+        buffer = WriteBehindBuffer(writer=flaky, retries=3, retry_ms=1)
+        buffer.offer([1, 2])
+        buffer.close()
+        assert attempts == [[1, 2]] * 3
+        stats = buffer.stats()
+        assert (stats['written'], stats['retried'], stats['failed']) == (2, 4, 0)
+        assert metrics.WRITE_BEHIND_FLUSH_SECONDS.count() == flushes + 3
+        assert metrics.WRITE_BEHIND_QUEUE_DEPTH.value() == 0
+    
+    def test_dead_letters_batches_that_keep_failing(self):
+        dead = []
+        
+        def broken(batch):
+            raise RuntimeError('disk full')
+        
+        lost = metrics.WRITE_BEHIND_LOGS.value('lost')
+        buffer = WriteBehindBuffer(writer=broken, retries=1, retry_ms=1, dead_letter=dead.extend)
+        buffer.offer([1, 2])
+        buffer.close()
+        assert dead == [1, 2]
+        stats = buffer.stats()
+        assert (stats['retried'], stats['failed'], stats['dead_lettered'], stats['lost']) == (2, 2, 2, 0)
+        assert metrics.WRITE_BEHIND_LOGS.value('lost') == lost
+    
+    @pytest.mark.django_db
+    def test_dead_letter_file_can_be_replayed(self, settings, tmp_path):
+        settings.LOG_WRITE_BEHIND_DEAD_LETTER_DIR = str(tmp_path)
+        log = NetworkLog(
+            timestamp=timezone.now(), src_ip='10.0.0.1', dst_ip='10.0.0.2', proto='TCP',
+            packet_size=60, action='allow', raw_json={'dst_port': 22},
+        )
+        dead_letter_logs([log])
+        (path,) = tmp_path.iterdir()
+        call_command('load_logs', str(path))
+        saved = NetworkLog.objects.get()
+        assert (saved.timestamp, saved.src_ip, saved.raw_json) == (log.timestamp, '10.0.0.1', {'dst_port': 22})
+
+
+@pytest.mark.django_db
+class TestPartitions:
+    @pytest.fixture(autouse=True)
+    def require_partitioning(self):
+        if not partitions.is_partitioned():
+            pytest.skip('network_logs is only partitioned on PostgreSQL')
+    
+    def test_new_partition_adopts_rows_from_default(self):
+        future = datetime(2040, 3, 4, 12, tzinfo=dt_timezone.utc)
+        NetworkLog.objects.create(
+            timestamp=future, src_ip='10.0.0.1', dst_ip='10.0.0.2',
+            proto='TCP', packet_size=60, action='allow'
+        )
+        created = partitions.ensure_partitions(now=future, ahead=0, interval='day')
+        assert created == ['network_logs_p20400304']
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM network_logs_p20400304')
+            assert cursor.fetchone()[0] == 1
+        assert NetworkLog.objects.filter(timestamp=future).count() == 1
+    
+    def test_drop_expired_partitions(self):
+        old = datetime(2001, 1, 1, tzinfo=dt_timezone.utc)
+        partitions.create_partition(old, old + timedelta(days=1))
+        dropped, _, _ = partitions.drop_expired_partitions(old + timedelta(days=2))
+        assert 'network_logs_p20010101' in dropped
+        assert 'network_logs_p20010101' not in [name for name, _, _ in partitions.list_partitions()]
+    
+    def test_default_partition_deleted_in_batches(self):
+        old = datetime(1999, 1, 1, tzinfo=dt_timezone.utc)
+        NetworkLog.objects.bulk_create([
+            NetworkLog(timestamp=old + timedelta(days=i), src_ip='10.0.0.1', dst_ip='10.0.0.2',
+                       proto='TCP', packet_size=60, action='allow')
+            for i in range(6)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partitions.DEFAULT_PARTITION}')
+            assert cursor.fetchone()[0] == 6
+        _, _, deleted = partitions.drop_expired_partitions(old + timedelta(days=5), batch_size=2, sleep_seconds=0)
+        assert deleted == 5
+        assert list(NetworkLog.objects.values_list('timestamp', flat=True)) == [old + timedelta(days=5)]
+    
+    def test_new_partition_gets_time_series_indexes(self):
+        start = datetime(2041, 5, 6, tzinfo=dt_timezone.utc)
+        partitions.create_partition(start, start + timedelta(days=1))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = 'network_logs_p20410506'")
+            definitions = [row[0] for row in cursor.fetchall()]
+        assert any('USING brin ("timestamp")' in definition for definition in definitions)
+        assert any('(src_ip, "timestamp")' in definition for definition in definitions)
+        assert any('(proto, "timestamp")' in definition for definition in definitions)
 
 
+@pytest.mark.django_db
+class TestRollups:
+    def _post_logs(self, api_client, admin_user, timestamps):
+        api_client.force_authenticate(user=admin_user)
+        payload = [
+            {
+                'timestamp': moment.isoformat(),
+                'src_ip': '10.0.0.1',
+                'dst_ip': '10.0.0.2',
+                'proto': 'UDP' if index % 3 == 0 else 'TCP',
+                'packet_size': 100 + index,
+                'action': 'block' if index % 2 else 'allow',
+            }
+            for index, moment in enumerate(timestamps)
+        ]
+        response = api_client.post('/api/logs/batch/', payload, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+    
+    def _totals(self, queryset):
+        return {
+            (row['proto'], row['action']): (row['count'], row['bytes'])
+            for row in queryset.values('proto', 'action').annotate(count=Sum('count'), bytes=Sum('bytes'))
+        }
+    
+    def test_window_matches_raw_logs(self, api_client, admin_user):
+        now = timezone.now()
+        self._post_logs(api_client, admin_user, [now - timedelta(minutes=7 * i) for i in range(40)])
+        start = now - timedelta(hours=3, minutes=5)
+        expected = {
+            (row['proto'], row['action']): (row['count'], row['bytes'])
+            for row in NetworkLog.objects.filter(timestamp__gte=rollups.floor_minute(start))
+            .values('proto', 'action').annotate(count=Count('id'), bytes=Sum('packet_size'))
+        }
+        assert self._totals(rollups.window(start)) == expected
+        assert sum(count for count, _ in self._totals(rollups.window()).values()) == 40
+    
+    def test_backfill_rebuilds_buckets(self, api_client, admin_user):
+        now = timezone.now()
+        self._post_logs(api_client, admin_user, [now - timedelta(minutes=13 * i) for i in range(30)])
+        expected = self._totals(TrafficRollup.objects.all())
+        TrafficRollup.objects.all().delete()
+        call_command('backfill_rollups', stdout=StringIO())
+        assert self._totals(TrafficRollup.objects.all()) == expected
+    
+    def test_backfill_drops_buckets_of_deleted_logs(self, api_client, admin_user):
+        # One hour, so no deleted log is older than the oldest log left
+        base = rollups.floor_hour(timezone.now()) - timedelta(minutes=30)
+        self._post_logs(api_client, admin_user, [base + timedelta(minutes=i) for i in range(4)])
+        NetworkLog.objects.filter(proto='UDP').delete()
+        rollups.backfill()
+        assert set(TrafficRollup.objects.values_list('proto', flat=True)) == {'TCP'}
+        assert sum(count for count, _ in self._totals(rollups.window()).values()) == 2
+    
+    def test_summary_report_reads_rollups(self, api_client, admin_user):
+        now = timezone.now()
+        self._post_logs(api_client, admin_user, [now - timedelta(minutes=i) for i in range(6)])
+        # Rows written behind the rollups' back are counted after a backfill
+        NetworkLog.objects.create(
+            timestamp=now, src_ip='10.0.0.9', dst_ip='10.0.0.2', proto='ICMP', packet_size=64, action='drop'
+        )
+        response = api_client.get('/api/settings/export/report/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_logs'] == 6
+        rollups.backfill(now - timedelta(hours=1))
+        assert api_client.get('/api/settings/export/report/').data['total_logs'] == 7
+        assert response.data['protocol_breakdown'] == {'TCP': 4, 'UDP': 2, 'ICMP': 0, 'HTTP': 0, 'HTTPS': 0}
+        assert response.data['action_breakdown'] == {'allow': 3, 'block': 3, 'drop': 0}
+    
+    def test_api_updates_and_deletes_adjust_rollups(self, api_client, admin_user):
+        now = timezone.now()
+        self._post_logs(api_client, admin_user, [now - timedelta(minutes=i) for i in range(4)])
+        changed, deleted = NetworkLog.objects.order_by('id')[:2]
+        response = api_client.patch(f'/api/logs/{changed.id}/', {
+            'timestamp': changed.timestamp.isoformat(), 'proto': 'ICMP', 'packet_size': 9,
+        }, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert api_client.delete(f'/api/logs/{deleted.id}/').status_code == status.HTTP_204_NO_CONTENT
+        
+        expected = {
+            (row['proto'], row['action']): (row['count'], row['bytes'])
+            for row in NetworkLog.objects.values('proto', 'action').annotate(count=Count('id'), bytes=Sum('packet_size'))
+        }
+        for granularity in ('minute', 'hour'):
+            assert self._totals(TrafficRollup.objects.filter(granularity=granularity)) == expected
+        assert not TrafficRollup.objects.filter(count__lte=0).exists()
+    
+    def test_summary_report_flags_purged_logs(self, api_client, admin_user):
+        now = timezone.now()
+        self._post_logs(api_client, admin_user, [now - timedelta(days=3), now, now - timedelta(minutes=1)])
+        report = api_client.get('/api/settings/export/report/').data
+        assert (report['total_logs'], report['includes_purged_logs']) == (3, False)
+        purge_expired(retention_days=1, sleep_seconds=0)
+        report = api_client.get('/api/settings/export/report/').data
+        assert (report['total_logs'], report['includes_purged_logs']) == (3, True)
+        recent = api_client.get('/api/settings/export/report/', {'start_date': now.date().isoformat()}).data
+        assert recent['includes_purged_logs'] is False
+    
+    def test_summary_report_rejects_bad_dates(self, api_client, admin_user):
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get('/api/settings/export/report/', {'start_date': 'yesterday'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
@@ -0,0 +1,319 @@
+import gzip
+import json
+import time
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from apps.alerts.models import Alert
+from apps.logs import partitions, rollups
+from apps.logs.models import NetworkLog, TrafficRollup
+from apps.settings.models import ExportJob, SystemSettings
+from apps.settings import export_jobs
+from apps.settings.export_jobs import split_range
+from apps.settings.retention import purge_expired
+from apps.settings.snapshot import SettingsCache, get_broker, get_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+def make_log(age_days):
+    return NetworkLog.objects.create(
+        timestamp=timezone.now() - timedelta(days=age_days),
+        src_ip='192.168.1.50',
+        dst_ip='8.8.8.8',
+        proto='TCP',
+        packet_size=512,
+        action='allow'
+    )
+
+
+def make_alert(age_days, status):
+    return Alert.objects.create(
+        alert_type='port_scan',
+        severity='high',
+        src_ip='192.168.1.100',
+        message='Test alert',
+        timestamp=timezone.now() - timedelta(days=age_days),
+        status=status
+    )
+
+
+@pytest.mark.django_db
+class TestRetention:
+    @pytest.fixture(autouse=True)
+    def data(self):
+        settings_obj = SystemSettings.load()
+        settings_obj.log_retention_days = 30
+        settings_obj.save()
+        for age in (40, 35, 31, 1):
+            make_log(age)
+        make_alert(40, 'resolved')
+        make_alert(40, 'open')
+        make_alert(1, 'resolved')
+    
+    def test_dry_run_deletes_nothing(self):
+        report = purge_expired(dry_run=True)
+        assert report['logs_deleted'] == 3
+        assert report['alerts_deleted'] == 1
+        assert NetworkLog.objects.count() == 4
+        assert Alert.objects.count() == 3
+    
+    def test_purges_in_batches(self):
+        report = purge_expired(batch_size=2, sleep_seconds=0)
+        assert report['logs_deleted'] == 3
+        assert report['alerts_deleted'] == 1
+        assert NetworkLog.objects.count() == 1
+        assert list(Alert.objects.values_list('status', flat=True).order_by('timestamp')) == ['open', 'resolved']
+    
+    def test_counts_rows_in_dropped_partitions(self):
+        if connection.vendor != 'postgresql':
+            pytest.skip('Partitioning requires PostgreSQL')
+        start = (timezone.now() - timedelta(days=40)).replace(hour=0, minute=0, second=0, microsecond=0)
+        partitions.create_partition(start, start + timedelta(days=1))
+        assert purge_expired(dry_run=True)['logs_deleted'] == 3
+        report = purge_expired(batch_size=2, sleep_seconds=0)
+        assert report['log_partitions_dropped'] == [partitions.partition_name(start)]
+        assert report['logs_deleted'] == 3
+        assert NetworkLog.objects.count() == 1
+    
+    def test_minute_rollups_purged_in_batches(self):
+        rollups.record(NetworkLog.objects.all())
+        assert purge_expired(dry_run=True)['rollups_deleted'] == 3
+        report = purge_expired(batch_size=2, sleep_seconds=0)
+        assert report['rollups_deleted'] == 3
+        assert TrafficRollup.objects.filter(granularity='minute').count() == 1
+        assert TrafficRollup.objects.filter(granularity='hour').count() == 4
+    
+    def test_command_honours_days_override(self, capsys):
+        call_command('purge_expired', days=33, sleep=0)
+        assert NetworkLog.objects.count() == 2
+        assert 'Removed 2 log(s)' in capsys.readouterr().out
+
+
+@pytest.mark.django_db
+class TestStreamingExport:
+    @pytest.fixture
+    def client(self, settings):
+        # Small chunks so the tests cover multi-chunk streams
+        settings.EXPORT_CHUNK_SIZE = 2
+        settings.EXPORT_BUFFER_BYTES = 64
+        for age in (3, 2, 1):
+            make_log(age)
+        make_alert(1, 'open')
+        client = APIClient()
+        client.force_authenticate(user=get_user_model().objects.create_user(username='exporter', password='x'))
+        return client
+    
+    def test_csv_streams(self, client):
+        response = client.get('/api/settings/export/logs/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response['Content-Disposition'] == 'attachment; filename="network_logs.csv"'
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert lines[0] == 'Timestamp,Source IP,Destination IP,Protocol,Packet Size,Action'
+        assert len(lines) == 4
+    
+    def test_gzipped_ndjson(self, client):
+        response = client.get('/api/settings/export/alerts/', {'file_format': 'ndjson', 'compression': 'gzip'})
+        assert response['Content-Disposition'] == 'attachment; filename="alerts.ndjson.gz"'
+        records = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        assert [record['alert_type'] for record in records] == ['port_scan']
+        assert records[0]['status'] == 'open'
+    
+    def test_rejects_unknown_format(self, client):
+        response = client.get('/api/settings/export/logs/', {'file_format': 'xml'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+class TestExportJobs:
+    @pytest.fixture
+    def client(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.EXPORT_CHUNK_SIZE = 3
+        settings.EXPORT_JOB_WORKERS = 3
+        for age in range(10):
+            make_log(age)
+        client = APIClient()
+        client.force_authenticate(user=get_user_model().objects.create_user(username='exporter', password='x'))
+        return client
+    
+    def wait_for(self, client, job_id):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            job = client.get(f'/api/settings/export/jobs/{job_id}/').data
+            if job['status'] in ('done', 'failed'):
+                return job
+            time.sleep(0.05)
+        pytest.fail('export job did not finish')
+    
+    def test_builds_file_in_parallel_parts(self, client):
+        response = client.post('/api/settings/export/jobs/', {'kind': 'logs'}, format='json')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job = self.wait_for(client, response.data['id'])
+        assert job['status'] == 'done', job['error']
+        assert (job['rows_written'], job['rows_total'], job['parts_done']) == (10, 10, 3)
+        assert job['rows_total_estimated'] is False
+        assert job['progress'] == 1.0
+        
+        download = client.get(job['download_url'])
+        assert download.status_code == status.HTTP_200_OK
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        assert lines[0].startswith('Timestamp,')
+        timestamps = [line.split(',')[0] for line in lines[1:]]
+        assert len(timestamps) == 10
+        assert timestamps == sorted(timestamps, reverse=True)
+    
+    def test_resumes_with_range(self, client):
+        response = client.post('/api/settings/export/jobs/', {
+            'kind': 'logs', 'file_format': 'ndjson', 'compression': 'gzip', 'start_date': '2000-01-01',
+        }, format='json')
+        job = self.wait_for(client, response.data['id'])
+        full = client.get(job['download_url'])
+        body = b''.join(full.streaming_content)
+        assert len(gzip.decompress(body).splitlines()) == 10
+        
+        partial = client.get(job['download_url'], HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=full['ETag'])
+        assert partial.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert partial['Content-Range'] == f'bytes 10-{len(body) - 1}/{len(body)}'
+        assert b''.join(partial.streaming_content) == body[10:]
+        
+        stale = client.get(job['download_url'], HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"other"')
+        assert stale.status_code == status.HTTP_200_OK
+        unsatisfiable = client.get(job['download_url'], HTTP_RANGE=f'bytes={len(body)}-')
+        assert unsatisfiable.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    
+    def test_jobs_are_private(self, client):
+        response = client.post('/api/settings/export/jobs/', {'kind': 'alerts'}, format='json')
+        self.wait_for(client, response.data['id'])
+        other = APIClient()
+        other.force_authenticate(user=get_user_model().objects.create_user(username='other', password='x'))
+        assert other.get(f"/api/settings/export/jobs/{response.data['id']}/").status_code == status.HTTP_404_NOT_FOUND
+        assert other.get('/api/settings/export/jobs/').data == []
+    
+    def test_estimates_large_totals(self, client, settings):
+        if connection.vendor != 'postgresql':
+            pytest.skip('planner estimates are PostgreSQL only')
+        settings.ESTIMATED_COUNT_THRESHOLD = 1
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE network_logs')
+        response = client.post('/api/settings/export/jobs/', {'kind': 'logs'}, format='json')
+        job = self.wait_for(client, response.data['id'])
+        assert job['status'] == 'done', job['error']
+        assert job['rows_total_estimated'] is True
+        assert job['rows_written'] == 10
+    
+    def test_stale_running_jobs_fail(self, client, settings, tmp_path):
+        settings.EXPORT_JOB_STALE_SECONDS = 60
+        owner = get_user_model().objects.get(username='exporter')
+        stale = ExportJob.objects.create(
+            kind='logs', status='running', created_by=owner, file='exports/stale/network_logs.csv',
+            heartbeat_at=timezone.now() - timedelta(minutes=5),
+        )
+        (tmp_path / 'exports' / 'stale').mkdir(parents=True)
+        (tmp_path / 'exports' / 'stale' / 'network_logs.csv.part0').write_bytes(b'partial')
+        busy = ExportJob.objects.create(kind='logs', status='running', created_by=owner, heartbeat_at=timezone.now())
+        
+        job = client.get(f'/api/settings/export/jobs/{stale.pk}/').data
+        assert job['status'] == 'failed'
+        assert job['error'] == 'Export worker stopped responding'
+        assert not (tmp_path / 'exports' / 'stale').exists()
+        assert client.delete(f'/api/settings/export/jobs/{stale.pk}/').status_code == status.HTTP_204_NO_CONTENT
+        busy.refresh_from_db()
+        assert busy.status == 'running'
+    
+    def test_stale_queued_jobs_fail(self, client, settings):
+        settings.EXPORT_JOB_STALE_SECONDS = 60
+        owner = get_user_model().objects.get(username='exporter')
+        stuck = ExportJob.objects.create(kind='logs', created_by=owner)
+        ExportJob.objects.filter(pk=stuck.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        fresh = ExportJob.objects.create(kind='logs', created_by=owner)
+        
+        job = client.get(f'/api/settings/export/jobs/{stuck.pk}/').data
+        assert job['status'] == 'failed'
+        assert client.delete(f'/api/settings/export/jobs/{stuck.pk}/').status_code == status.HTTP_204_NO_CONTENT
+        fresh.refresh_from_db()
+        assert fresh.status == 'queued'
+    
+    def test_jobs_waiting_for_part_threads_stay_alive(self, client, settings, monkeypatch):
+        settings.EXPORT_JOB_STALE_SECONDS = 0.3
+        write_part = export_jobs._write_part
+        
+        def slow_write_part(*args):
+            # Like parts queued behind another job's: no progress for a while
+            time.sleep(1)
+            write_part(*args)
+        
+        monkeypatch.setattr(export_jobs, '_write_part', slow_write_part)
+        response = client.post('/api/settings/export/jobs/', {'kind': 'logs'}, format='json')
+        job = self.wait_for(client, response.data['id'])
+        assert job['status'] == 'done', job['error']
+        assert job['rows_written'] == 10
+    
+    def test_rejects_bad_dates(self, client):
+        response = client.post('/api/settings/export/jobs/', {'kind': 'logs', 'end_date': 'soon'}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not ExportJob.objects.exists()
+
+
+def test_split_range_is_contiguous_newest_first():
+    start = timezone.now()
+    slices = split_range(start, start + timedelta(hours=3), 3)
+    assert slices[0][1] == start + timedelta(hours=3)
+    assert slices[-1][0] == start
+    assert all(newer[0] == older[1] for newer, older in zip(slices, slices[1:]))
+    assert split_range(start, start, 4) == [(start, start)]
+
+
+@pytest.mark.django_db
+class TestSettingsSnapshot:
+    def test_reads_after_the_first_skip_the_database(self, django_assert_num_queries):
+        snapshot = get_settings()
+        assert snapshot.port_scan_limit == 20
+        with django_assert_num_queries(0):
+            assert get_settings() is snapshot
+        with pytest.raises(AttributeError):
+            snapshot.port_scan_limit = 1
+        with pytest.raises(AttributeError):
+            snapshot.extra = 1
+    
+    def test_save_bumps_version_and_reaches_other_workers(self, django_assert_num_queries,
+                                                          django_capture_on_commit_callbacks):
+        first = get_settings()
+        other = SettingsCache(get_broker())
+        assert other.get().version == first.version
+        
+        settings_obj = SystemSettings.load()
+        settings_obj.port_scan_limit = 7
+        with django_capture_on_commit_callbacks(execute=True):
+            settings_obj.save()
+            # Nothing changes before the commit
+            assert get_settings().port_scan_limit == 20
+            assert other.get().port_scan_limit == 20
+        assert settings_obj.version == first.version + 1
+        with django_assert_num_queries(0):
+            assert get_settings().port_scan_limit == 7
+            assert get_settings().version == first.version + 1
+        with django_assert_num_queries(0):
+            assert other.get().port_scan_limit == 7
+            assert other.get().version == first.version + 1
+    
+    def test_stale_instances_still_get_new_versions(self, django_capture_on_commit_callbacks):
+        first, second = SystemSettings.load(), SystemSettings.load()
+        first.port_scan_limit = 7
+        second.packet_size_threshold = 500
+        with django_capture_on_commit_callbacks(execute=True):
+            first.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            second.save()
+        assert second.version == first.version + 1
+        assert get_settings().version == second.version
+        assert get_settings().packet_size_threshold == 500
+        
+        with django_capture_on_commit_callbacks(execute=False):
+            first.save()
+        # Never committed
+        assert get_settings().version == second.version
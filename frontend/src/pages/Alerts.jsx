@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react'
 import { useAuth } from '../contexts/AuthContext'
 import { format } from 'date-fns'
-import api from '../services/api'
+import api, { cursorFrom } from '../services/api'
 import Table from '../components/Table'
 import Modal from '../components/Modal'
 import FilterBar from '../components/FilterBar'
@@ -14,7 +14,9 @@ const Alerts = () => {
   const [selectedAlert, setSelectedAlert] = useState(null)
   const [loading, setLoading] = useState(true)
   const [page, setPage] = useState(1)
-  const [totalPages, setTotalPages] = useState(1)
+  const [cursor, setCursor] = useState(null)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [prevCursor, setPrevCursor] = useState(null)
   const [filters, setFilters] = useState({
     alert_type: '',
     severity: '',
@@ -34,18 +36,19 @@ const Alerts = () => {
     return () => {
       unsubscribe()
     }
-  }, [page, filters])
+  }, [cursor, filters])
 
   const fetchAlerts = async () => {
     try {
       setLoading(true)
       const params = new URLSearchParams({
-        page: page.toString(),
+        ...(cursor ? { cursor } : {}),
         ...Object.fromEntries(Object.entries(filters).filter(([_, v]) => v)),
       })
       const response = await api.get(`/alerts/?${params}`)
       setAlerts(response.data.results)
-      setTotalPages(Math.ceil(response.data.count / 20))
+      setNextCursor(cursorFrom(response.data.next))
+      setPrevCursor(cursorFrom(response.data.previous))
     } catch (error) {
       console.error('Error fetching alerts:', error)
     } finally {
@@ -67,6 +70,7 @@ const Alerts = () => {
 
   const handleFilterChange = (key, value) => {
     setFilters((prev) => ({ ...prev, [key]: value }))
+    setCursor(null)
     setPage(1)
   }
 
@@ -179,18 +183,24 @@ const Alerts = () => {
 
           <div className="mt-4 flex justify-between items-center">
             <button
-              onClick={() => setPage((p) => Math.max(1, p - 1))}
+              onClick={() => {
+                setCursor(prevCursor)
+                setPage((p) => Math.max(1, p - 1))
+              }}
               disabled={page === 1}
               className="px-4 py-2 bg-gray-200 rounded-md disabled:opacity-50"
             >
               Previous
             </button>
             <span className="text-sm text-gray-600">
-              Page {page} of {totalPages}
+              Page {page}
             </span>
             <button
-              onClick={() => setPage((p) => Math.min(totalPages, p + 1))}
-              disabled={page === totalPages}
+              onClick={() => {
+                setCursor(nextCursor)
+                setPage((p) => p + 1)
+              }}
+              disabled={!nextCursor}
               className="px-4 py-2 bg-gray-200 rounded-md disabled:opacity-50"
             >
               Next
@@ -234,6 +244,12 @@ const Alerts = () => {
               <strong>Timestamp:</strong>{' '}
               {format(new Date(selectedAlert.timestamp), 'yyyy-MM-dd HH:mm:ss')}
             </div>
+            {selectedAlert.occurrences > 1 && (
+              <div>
+                <strong>Occurrences:</strong> {selectedAlert.occurrences} (last seen{' '}
+                {format(new Date(selectedAlert.last_seen), 'yyyy-MM-dd HH:mm:ss')})
+              </div>
+            )}
             {selectedAlert.metadata && (
               <div>
                 <strong>Metadata:</strong>
@@ -1,25 +1,63 @@
 import { useEffect, useState } from 'react'
 import { format } from 'date-fns'
-import api from '../services/api'
+import api, { cursorFrom } from '../services/api'
 import Table from '../components/Table'
 import FilterBar from '../components/FilterBar'
 import wsService from '../services/websocket'
 
+// Wait for the user to stop typing before re-subscribing and re-fetching
+const FILTER_DEBOUNCE_MS = 400
+
+const IPV4 = /^(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(\.(25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}$/
+
+// The URL parser validates IPv6 literals
+const isIpv6 = (value) => {
+  if (!value.includes(':')) return false
+  try {
+    new URL(`http://[${value}]/`)
+    return true
+  } catch {
+    return false
+  }
+}
+
+const isIpAddress = (value) => IPV4.test(value) || isIpv6(value)
+
+// Filters the server accepts: partial IP addresses are left out until complete
+const completeFilters = (filters) =>
+  Object.fromEntries(
+    Object.entries(filters).filter(
+      ([key, value]) => value && (!['src_ip', 'dst_ip'].includes(key) || isIpAddress(value))
+    )
+  )
+
 const LiveFeed = () => {
   const [logs, setLogs] = useState([])
   const [loading, setLoading] = useState(true)
   const [page, setPage] = useState(1)
-  const [totalPages, setTotalPages] = useState(1)
+  const [cursor, setCursor] = useState(null)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [prevCursor, setPrevCursor] = useState(null)
   const [filters, setFilters] = useState({
     src_ip: '',
     dst_ip: '',
     proto: '',
     action: '',
   })
+  const [appliedFilters, setAppliedFilters] = useState({})
+
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      const next = completeFilters(filters)
+      setAppliedFilters((prev) => (JSON.stringify(prev) === JSON.stringify(next) ? prev : next))
+    }, FILTER_DEBOUNCE_MS)
+    return () => clearTimeout(timer)
+  }, [filters])
 
   useEffect(() => {
     fetchLogs()
     wsService.connectLogs()
+    wsService.subscribeLogs(appliedFilters)
 
     const unsubscribe = wsService.onLog((data) => {
       if (data.type === 'log') {
@@ -30,18 +68,19 @@ const LiveFeed = () => {
     return () => {
       unsubscribe()
     }
-  }, [page, filters])
+  }, [cursor, appliedFilters])
 
   const fetchLogs = async () => {
     try {
       setLoading(true)
       const params = new URLSearchParams({
-        page: page.toString(),
-        ...Object.fromEntries(Object.entries(filters).filter(([_, v]) => v)),
+        ...(cursor ? { cursor } : {}),
+        ...appliedFilters,
       })
       const response = await api.get(`/logs/?${params}`)
       setLogs(response.data.results)
-      setTotalPages(Math.ceil(response.data.count / 20))
+      setNextCursor(cursorFrom(response.data.next))
+      setPrevCursor(cursorFrom(response.data.previous))
     } catch (error) {
       console.error('Error fetching logs:', error)
     } finally {
@@ -51,6 +90,7 @@ const LiveFeed = () => {
 
   const handleFilterChange = (key, value) => {
     setFilters((prev) => ({ ...prev, [key]: value }))
+    setCursor(null)
     setPage(1)
   }
 
@@ -135,18 +175,24 @@ const LiveFeed = () => {
 
           <div className="mt-4 flex justify-between items-center">
             <button
-              onClick={() => setPage((p) => Math.max(1, p - 1))}
+              onClick={() => {
+                setCursor(prevCursor)
+                setPage((p) => Math.max(1, p - 1))
+              }}
               disabled={page === 1}
               className="px-4 py-2 bg-gray-200 rounded-md disabled:opacity-50"
             >
               Previous
             </button>
             <span className="text-sm text-gray-600">
-              Page {page} of {totalPages}
+              Page {page}
             </span>
             <button
-              onClick={() => setPage((p) => Math.min(totalPages, p + 1))}
-              disabled={page === totalPages}
+              onClick={() => {
+                setCursor(nextCursor)
+                setPage((p) => p + 1)
+              }}
+              disabled={!nextCursor}
               className="px-4 py-2 bg-gray-200 rounded-md disabled:opacity-50"
             >
               Next
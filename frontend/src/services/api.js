@@ -56,6 +56,9 @@ api.interceptors.response.use(
   }
 )
 
+// Extract the opaque cursor from a keyset-paginated `next` / `previous` link
+export const cursorFrom = (link) => (link ? new URL(link).searchParams.get('cursor') : null)
+
 export default api
 
 
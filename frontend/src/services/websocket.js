@@ -1,4 +1,12 @@
 const WS_URL = import.meta.env.VITE_WS_URL || 'ws://localhost:8000'
+// Ask the server to coalesce events into one array frame per window (0 disables)
+const COALESCE_MS = Number(import.meta.env.VITE_WS_COALESCE_MS ?? 250)
+
+// Batched frames ({type: 'logs', data: [...]}) are handed out one event at a time
+const unbatch = (data, batchType, itemType) =>
+  data.type === batchType ? data.data.map((item) => ({ type: itemType, data: item })) : [data]
+
+const socketUrl = (path) => (COALESCE_MS > 0 ? `${WS_URL}${path}?coalesce_ms=${COALESCE_MS}` : `${WS_URL}${path}`)
 
 class WebSocketService {
   constructor() {
@@ -6,6 +14,7 @@ class WebSocketService {
     this.alertSocket = null
     this.logCallbacks = []
     this.alertCallbacks = []
+    this.logFilters = {}
   }
 
   connectLogs() {
@@ -13,15 +22,16 @@ class WebSocketService {
       return
     }
 
-    this.logSocket = new WebSocket(`${WS_URL}/ws/logs/`)
+    this.logSocket = new WebSocket(socketUrl('/ws/logs/'))
 
     this.logSocket.onopen = () => {
       console.log('Logs WebSocket connected')
+      this.sendLogFilters()
     }
 
     this.logSocket.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-      this.logCallbacks.forEach((callback) => callback(data))
+      const messages = unbatch(JSON.parse(event.data), 'logs', 'log')
+      messages.forEach((message) => this.logCallbacks.forEach((callback) => callback(message)))
     }
 
     this.logSocket.onerror = (error) => {
@@ -40,15 +50,15 @@ class WebSocketService {
       return
     }
 
-    this.alertSocket = new WebSocket(`${WS_URL}/ws/alerts/`)
+    this.alertSocket = new WebSocket(socketUrl('/ws/alerts/'))
 
     this.alertSocket.onopen = () => {
       console.log('Alerts WebSocket connected')
     }
 
     this.alertSocket.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-      this.alertCallbacks.forEach((callback) => callback(data))
+      const messages = unbatch(JSON.parse(event.data), 'alerts', 'alert')
+      messages.forEach((message) => this.alertCallbacks.forEach((callback) => callback(message)))
     }
 
     this.alertSocket.onerror = (error) => {
@@ -62,6 +72,18 @@ class WebSocketService {
     }
   }
 
+  // Let the server drop logs the current view would filter out anyway
+  subscribeLogs(filters) {
+    this.logFilters = Object.fromEntries(Object.entries(filters).filter(([_, v]) => v))
+    this.sendLogFilters()
+  }
+
+  sendLogFilters() {
+    if (this.logSocket?.readyState === WebSocket.OPEN) {
+      this.logSocket.send(JSON.stringify({ type: 'subscribe', filters: this.logFilters }))
+    }
+  }
+
   onLog(callback) {
     this.logCallbacks.push(callback)
     return () => {
@@ -87,6 +109,7 @@ class WebSocketService {
     }
     this.logCallbacks = []
     this.alertCallbacks = []
+    this.logFilters = {}
   }
 }
 